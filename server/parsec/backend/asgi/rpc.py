@@ -2,9 +2,11 @@
 
 from __future__ import annotations
 
-from base64 import b64decode, b64encode
+import gzip
+from base64 import b64decode
 from contextlib import asynccontextmanager, contextmanager
 from enum import Enum
+from functools import partial
 from typing import Any, AsyncIterable, AsyncIterator, Iterator, NoReturn, Type
 
 import trio
@@ -36,6 +38,7 @@ from parsec.backend.client_context import (
     AuthenticatedClientContext,
     InvitedClientContext,
 )
+from parsec.backend.events import SSE_KEEPALIVE_FRAME
 from parsec.backend.invite import (
     CloseInviteConnection,
     Invitation,
@@ -83,13 +86,63 @@ ANONYMOUS_ORGANIZATION_BOOTSTRAP_CMD_ALL_API_REQS = tuple(
 rpc_bp = Blueprint("anonymous_api", __name__)
 
 
-def _rpc_rep(rep: Any, api_version: ApiVersion) -> Response:
+# Responses are gzip compressed if the client accepts it (see `Accept-Encoding` header)
+# and the response is big enough to benefit from it
+RPC_REP_COMPRESSION_MIN_SIZE = 1024
+RPC_REP_COMPRESSION_LEVEL = 6
+# Compressing is CPU intensive, so it is done in a thread past this size
+RPC_REP_COMPRESSION_IN_THREAD_MIN_SIZE = 64 * 1024
+# Those commands' responses are mostly made of encrypted data, hence not compressible
+RPC_REP_COMPRESSION_EXCLUDED_CMDS = frozenset(
+    {
+        "block_read",
+        "message_get",
+        "vlob_maintenance_get_reencryption_batch",
+        "vlob_read",
+    }
+)
+
+
+def _client_accepts_gzip() -> bool:
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, *params = coding.split(";")
+        if name.strip().lower() != "gzip":
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                # `gzip;q=0` means the client explicitly refuses gzip
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+async def _rpc_rep(rep: Any, api_version: ApiVersion, cmd: str) -> Response:
+    raw_rep = rep.dump()
+    headers = {"Api-Version": str(api_version)}
+
+    if (
+        len(raw_rep) >= RPC_REP_COMPRESSION_MIN_SIZE
+        and cmd not in RPC_REP_COMPRESSION_EXCLUDED_CMDS
+        and _client_accepts_gzip()
+    ):
+        compress = partial(gzip.compress, compresslevel=RPC_REP_COMPRESSION_LEVEL)
+        if len(raw_rep) >= RPC_REP_COMPRESSION_IN_THREAD_MIN_SIZE:
+            raw_rep = await trio.to_thread.run_sync(compress, raw_rep)
+        else:
+            raw_rep = compress(raw_rep)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+
     return Response(
-        response=rep.dump(),
+        response=raw_rep,
         # Unlike REST, RPC doesn't use status to encode operational result
         status=200,
         content_type=CONTENT_TYPE_MSGPACK,
-        headers={"Api-Version": str(api_version)},
+        headers=headers,
     )
 
 
@@ -153,6 +206,7 @@ async def _do_handshake(
     User | None,
     Device | None,
     Invitation | None,
+    bytes | None,
 ]:
     # The anonymous RPC API existed before the `Api-Version`/`Content-Type` fields
     # check where introduced, hence we have this workaround to provide backward compatibility
@@ -218,6 +272,7 @@ async def _do_handshake(
     if not check_authentication:
         user = None
         device = None
+        body = None
 
     else:
         try:
@@ -240,7 +295,10 @@ async def _do_handshake(
         except ValueError:
             _handshake_abort(CustomHttpStatus.BadAuthenticationInfo.value, api_version=api_version)
 
-        body: bytes = await request.get_data()
+        # Body is only read once the headers are known to be valid, and is returned
+        # so that we don't have to keep a copy of it in the request cache (the caller
+        # needs it anyway to process the command)
+        body = await request.get_data(cache=False)
         try:
             user, device = await backend.user.get_user_with_device(organization_id, device_id)
         except UserNotFoundError:
@@ -278,7 +336,16 @@ async def _do_handshake(
         except InvitationError:
             _handshake_abort(CustomHttpStatus.BadAuthenticationInfo.value, api_version=api_version)
 
-    return api_version, client_api_version, organization_id, organization, user, device, invitation
+    return (
+        api_version,
+        client_api_version,
+        organization_id,
+        organization,
+        user,
+        device,
+        invitation,
+        body,
+    )
 
 
 @rpc_bp.route("/anonymous/<raw_organization_id>", methods=["GET", "POST"])
@@ -289,7 +356,16 @@ async def anonymous_api(raw_organization_id: str) -> Response:
         request.method == "POST" and backend.config.organization_spontaneous_bootstrap
     )
 
-    api_version, client_api_version, organization_id, organization, _, _, _ = await _do_handshake(
+    (
+        api_version,
+        client_api_version,
+        organization_id,
+        organization,
+        _,
+        _,
+        _,
+        _,
+    ) = await _do_handshake(
         raw_organization_id=raw_organization_id,
         backend=backend,
         allow_missing_organization=allow_missing_organization,
@@ -340,14 +416,14 @@ async def anonymous_api(raw_organization_id: str) -> Response:
         print("rpc didn't handle this exception:", type(exc))
         raise exc
 
-    return _rpc_rep(rep, api_version)
+    return await _rpc_rep(rep, api_version, cmd_func._api_info["cmd"])  # type: ignore[attr-defined]
 
 
 @rpc_bp.route("/invited/<raw_organization_id>", methods=["POST"])
 async def invited_api(raw_organization_id: str) -> Response:
     backend: BackendApp = g.backend
 
-    api_version, client_api_version, organization_id, _, _, _, invitation = await _do_handshake(
+    api_version, client_api_version, organization_id, _, _, _, invitation, _ = await _do_handshake(
         raw_organization_id=raw_organization_id,
         backend=backend,
         allow_missing_organization=False,
@@ -388,14 +464,24 @@ async def invited_api(raw_organization_id: str) -> Response:
         print("rpc didn't handle this exception:", type(exc))
         raise exc
 
-    return _rpc_rep(rep, api_version)
+    return await _rpc_rep(rep, api_version, cmd_func._api_info["cmd"])  # type: ignore[attr-defined]
 
 
 @rpc_bp.route("/authenticated/<raw_organization_id>", methods=["POST"])
 async def authenticated_api(raw_organization_id: str) -> Response:
     backend: BackendApp = g.backend
 
-    api_version, client_api_version, organization_id, _, user, device, _ = await _do_handshake(
+    # The same body buffer is used for signature verification and command deserialization
+    (
+        api_version,
+        client_api_version,
+        organization_id,
+        _,
+        user,
+        device,
+        _,
+        body,
+    ) = await _do_handshake(
         raw_organization_id=raw_organization_id,
         backend=backend,
         allow_missing_organization=False,
@@ -406,10 +492,9 @@ async def authenticated_api(raw_organization_id: str) -> Response:
     )
     assert isinstance(user, User)
     assert isinstance(device, Device)
+    assert body is not None
 
     # Unpack verified body
-    body: bytes = await request.get_data(cache=False)
-
     try:
         req = AUTHENTICATED_CMDS_LOAD_FN[api_version.version](body)
     except ProtocolError:
@@ -438,7 +523,7 @@ async def authenticated_api(raw_organization_id: str) -> Response:
         print("rpc didn't handle this exception:", type(exc))
         raise exc
 
-    return _rpc_rep(rep, api_version)
+    return await _rpc_rep(rep, api_version, cmd_func._api_info["cmd"])  # type: ignore[attr-defined]
 
 
 # SSE in Quart-Trio is a bit more complicated than expected:
@@ -532,23 +617,22 @@ class SSEResponseIterableBody(ResponseBody):
                     # While not strictly needed, we send a keepalive event (i.e. an event
                     # with no name and any comment, see https://html.spec.whatwg.org/multipage/server-sent-events.html#authoring-notes
                     # ) right away so that the client knows it is correctly connected without delay.
-                    await self._sse_payload_sender.send(b":keepalive\n\n")
+                    await self._sse_payload_sender.send(SSE_KEEPALIVE_FRAME)
 
                     next_event_cb = await backend.events.sse_api_events_listen(
                         client_ctx, last_event_id
                     )
-                    while True:
-                        next_event = None
-                        with trio.move_on_after(backend.config.sse_keepalive) as scope:
+                    # Keepalive are not handled here but by a scheduler shared among
+                    # all the SSE connections, this way an idle connection costs no timer
+                    keepalive_scheduler = backend.events.sse_keepalive_scheduler
+                    keepalive_scheduler.register(self._sse_payload_sender)
+                    try:
+                        while True:
                             try:
                                 next_event = await next_event_cb()
                             except StopAsyncIteration:
                                 return
 
-                        if scope.cancelled_caught:
-                            await self._sse_payload_sender.send(b":keepalive\n\n")
-
-                        else:
                             if next_event is None:
                                 # We have missed some events, most likely because the last event id
                                 # provided by the client is too old. In this case we have to
@@ -556,15 +640,13 @@ class SSEResponseIterableBody(ResponseBody):
                                 await self._sse_payload_sender.send(b"event:missed_events\n\n")
 
                             else:
-                                (event_id, rep) = next_event
-                                sse_payload = (
-                                    b"data:"
-                                    + b64encode(rep.dump())
-                                    + b"\nid:"
-                                    + event_id.encode("ascii")
-                                    + b"\n\n"
-                                )
-                                await self._sse_payload_sender.send(sse_payload)
+                                # Frame is shared with all the clients receiving this event
+                                await self._sse_payload_sender.send(next_event)
+
+                            keepalive_scheduler.mark_active(self._sse_payload_sender)
+
+                    finally:
+                        keepalive_scheduler.unregister(self._sse_payload_sender)
 
         assert client_ctx.cancel_scope is not None
         with client_ctx.cancel_scope:
@@ -618,7 +700,7 @@ class SSEResponseIterableBody(ResponseBody):
 async def authenticated_events_api(raw_organization_id: str) -> Response:
     backend: BackendApp = g.backend
 
-    api_version, client_api_version, organization_id, _, user, device, _ = await _do_handshake(
+    api_version, client_api_version, organization_id, _, user, device, _, _ = await _do_handshake(
         raw_organization_id=raw_organization_id,
         backend=backend,
         allow_missing_organization=False,
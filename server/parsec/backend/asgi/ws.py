@@ -32,12 +32,20 @@ from parsec.backend.handshake import do_handshake
 from parsec.backend.invite import CloseInviteConnection
 from parsec.backend.utils import CancelledByNewCmd, run_with_cancel_on_client_sending_new_cmd
 from parsec.serde import packb
+from parsec.utils import open_service_nursery
 
 Ctx = TypeVar("Ctx", bound=BaseClientContext)
 R = dict[str, object]
 
 logger = get_logger()
 
+# In pipelined mode (opted in by connecting with the `pipelined` query parameter),
+# each message is prefixed by a request ID chosen by the client. Commands are then
+# processed concurrently and each reply is prefixed by the ID of its request (hence
+# replies can be received in a different order than the requests).
+WS_PIPELINED_REQUEST_ID_SIZE = 8
+WS_PIPELINED_MAX_CONCURRENT_CMDS = 8
+
 
 ws_bp = Blueprint("ws_api", __name__)
 
@@ -67,6 +75,11 @@ async def handle_ws() -> None:
         f"Connection established (client/server API version: {client_ctx.client_api_version}/{client_ctx.api_version})"
     )
 
+    if "pipelined" in websocket.args:
+        loop_fn = _handle_client_websocket_pipelined_loop
+    else:
+        loop_fn = _handle_client_websocket_loop
+
     # 2) Setup events listener according to client type
 
     if isinstance(client_ctx, AuthenticatedClientContext):
@@ -108,7 +121,7 @@ async def handle_ws() -> None:
 
                 # 3) Serve commands
                 load_fn = AUTHENTICATED_CMDS_LOAD_FN[client_ctx.api_version.version]
-                await _handle_client_websocket_loop(backend, load_fn, websocket, client_ctx)
+                await loop_fn(backend, load_fn, websocket, client_ctx)
 
     else:
         assert isinstance(client_ctx, InvitedClientContext)
@@ -143,7 +156,7 @@ async def handle_ws() -> None:
 
                     # 3) Serve commands
                     load_fn = INVITED_CMDS_LOAD_FN[client_ctx.api_version.version]
-                    await _handle_client_websocket_loop(backend, load_fn, websocket, client_ctx)
+                    await loop_fn(backend, load_fn, websocket, client_ctx)
 
         except CloseInviteConnection:
             # If the invitation has been deleted after the invited handshake,
@@ -166,6 +179,36 @@ async def handle_ws() -> None:
                 )
 
 
+async def _process_cmd(
+    backend: BackendApp,
+    load_req_fn: Callable[[bytes], Any],
+    client_ctx: Ctx,
+    raw_req: Union[None, bytes, str],
+    run_cancellable_cmd: Callable[..., Awaitable[Any]],
+) -> bytes:
+    # Commands that are cancelled when the client sends a new request in non-pipelined
+    # mode (e.g. `events_listen` which can block indefinitely) are run through
+    # `run_cancellable_cmd`, which can raise `CancelledByNewCmd` on cancellation
+    try:
+        # `WebSocket` can return both bytes or utf8-string messages, we only accept the former
+        if not isinstance(raw_req, bytes):
+            raise ProtocolError
+        req = load_req_fn(raw_req)
+
+    except ProtocolError:
+        return packb({"status": "invalid_msg_format", "reason": "Invalid message format"})
+
+    cmd_func = cast(Callable[[Any, Any], Awaitable[Any]], backend.apis[type(req)])
+    if cmd_func._api_info["cancel_on_client_sending_new_cmd"]:  # type: ignore[attr-defined]
+        rep = await run_cancellable_cmd(cmd_func, client_ctx, req)
+    else:
+        rep = await cmd_func(client_ctx, req)
+
+    # TODO: cmd/response status should be in snakecase...
+    client_ctx.logger.info("Request", cmd=type(req).__name__, status=type(rep).__name__)
+    return rep.dump()
+
+
 async def _handle_client_websocket_loop(
     backend: BackendApp,
     load_req_fn: Callable[[bytes], Any],
@@ -178,37 +221,19 @@ async def _handle_client_websocket_loop(
         # while processing a command
         raw_req = raw_req or await websocket.receive()
         try:
-            # `WebSocket` can return both bytes or utf8-string messages, we only accept the former
-            if not isinstance(raw_req, bytes):
-                raise ProtocolError
-            req = load_req_fn(raw_req)
-
-        except ProtocolError:
-            raw_rep = packb({"status": "invalid_msg_format", "reason": "Invalid message format"})
-
-        else:
-            cmd_func = cast(Callable[[Any, Any], Awaitable[Any]], backend.apis[type(req)])
-
-            try:
-                if cmd_func._api_info[  # type: ignore[attr-defined]
-                    "cancel_on_client_sending_new_cmd"
-                ]:
-                    rep = await run_with_cancel_on_client_sending_new_cmd(
-                        websocket, cmd_func, client_ctx, req
-                    )
-                else:
-                    rep = await cmd_func(client_ctx, req)
-
-                raw_rep = rep.dump()
-
-            except CancelledByNewCmd as exc:
-                # Long command handling such as message_get can be cancelled
-                # when the peer send a new request
-                raw_req = exc.new_raw_req
-                continue
+            raw_rep = await _process_cmd(
+                backend,
+                load_req_fn,
+                client_ctx,
+                raw_req,
+                partial(run_with_cancel_on_client_sending_new_cmd, websocket),
+            )
 
-            # TODO: cmd/response status should be in snakecase...
-            client_ctx.logger.info("Request", cmd=type(req).__name__, status=type(rep).__name__)
+        except CancelledByNewCmd as exc:
+            # Long command handling such as message_get can be cancelled
+            # when the peer send a new request
+            raw_req = exc.new_raw_req
+            continue
 
         try:
             await websocket.send(raw_rep)
@@ -217,3 +242,56 @@ async def _handle_client_websocket_loop(
             # This used to be the behavior with wsproto < 1.2.0
             pass
         raw_req = None
+
+
+async def _handle_client_websocket_pipelined_loop(
+    backend: BackendApp,
+    load_req_fn: Callable[[bytes], Any],
+    websocket: Websocket,
+    client_ctx: Ctx,
+) -> NoReturn:
+    cmds_semaphore = trio.Semaphore(WS_PIPELINED_MAX_CONCURRENT_CMDS)
+    send_lock = trio.Lock()
+
+    async def _process_pipelined_cmd(request_id: bytes, raw_req: Union[None, bytes, str]) -> None:
+        holds_slot = True
+
+        async def _run_cancellable_cmd(
+            cmd_func: Callable[[Any, Any], Awaitable[Any]], client_ctx: Ctx, req: Any
+        ) -> Any:
+            # Unlike in non-pipelined mode, request IDs allow a command such as
+            # `events_listen` to keep running while other requests are processed,
+            # until it completes or the connection is closed. Given it can block
+            # indefinitely, it doesn't count against the concurrency limit.
+            nonlocal holds_slot
+            cmds_semaphore.release()
+            holds_slot = False
+            return await cmd_func(client_ctx, req)
+
+        try:
+            raw_rep = await _process_cmd(
+                backend, load_req_fn, client_ctx, raw_req, _run_cancellable_cmd
+            )
+            async with send_lock:
+                try:
+                    await websocket.send(request_id + raw_rep)
+                except LocalProtocolError:
+                    # Ignore exception if the websocket is closed
+                    pass
+        finally:
+            if holds_slot:
+                cmds_semaphore.release()
+
+    async with open_service_nursery() as nursery:
+        while True:
+            raw_req: Union[None, bytes, str] = await websocket.receive()
+            # Stop reading new requests while the concurrency limit is reached
+            await cmds_semaphore.acquire()
+            if isinstance(raw_req, bytes) and len(raw_req) >= WS_PIPELINED_REQUEST_ID_SIZE:
+                request_id = raw_req[:WS_PIPELINED_REQUEST_ID_SIZE]
+                raw_req = raw_req[WS_PIPELINED_REQUEST_ID_SIZE:]
+            else:
+                # Invalid message, the reply is going to be an error anyway
+                request_id = bytes(WS_PIPELINED_REQUEST_ID_SIZE)
+                raw_req = None
+            nursery.start_soon(_process_pipelined_cmd, request_id, raw_req)
@@ -168,6 +168,17 @@ organization_id, device_id, device_label (can be null), human_email (can be null
     default=True,
     type=bool,
 )
+@click.option(
+    "--memory-snapshot",
+    envvar="PARSEC_MEMORY_SNAPSHOT",
+    metavar="FILE",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="""Memory backend only (i.e. `--db=MOCKED`), restore the backend state from FILE
+at startup (if it exists) and save it to FILE on shutdown.
+
+The snapshot file is a pickle, so only use one you have created yourself !
+""",
+)
 @click.option(
     "--backend-addr",
     envvar="PARSEC_BACKEND_ADDR",
@@ -299,6 +310,7 @@ def run_cmd(
     organization_bootstrap_webhook: str,
     organization_initial_active_users_limit: int,
     organization_initial_user_profile_outsider_allowed: bool,
+    memory_snapshot: Path | None,
     backend_addr: BackendAddr,
     email_host: str,
     email_port: int,
@@ -321,6 +333,9 @@ def run_cmd(
     # Start a local backend
 
     with cli_exception_handler(debug):
+        if memory_snapshot and db.upper() != "MOCKED":
+            raise ValueError("--memory-snapshot can only be used with --db=MOCKED")
+
         email_config: EmailConfig
         if email_host == "MOCKED":
             tmpdir = tempfile.mkdtemp(prefix="tmp-email-folder-")
@@ -360,6 +375,7 @@ def run_cmd(
             if organization_initial_active_users_limit is not None
             else ActiveUsersLimit.NO_LIMIT,
             organization_initial_user_profile_outsider_allowed=organization_initial_user_profile_outsider_allowed,
+            memory_snapshot_path=memory_snapshot,
         )
 
         click.echo(
@@ -526,24 +526,26 @@ async def _human_accesses(
         user_component = PGUserComponent(event_bus=dbh.event_bus, dbh=dbh)
         realm_component = PGRealmComponent(dbh)
 
-        users, _ = await user_component.dump_users(organization_id=organization)
-        if user_filter:
-            # Now is a good time to filter out
-            filter_split = user_filter.split()
-            filtered_users = []
-            for user in users:
+        # Users and roles are fetched by batches and filtered right away, this
+        # way only the relevant ones are kept in memory
+        filter_split = user_filter.split()
+        users: List[User] = []
+        async for users_batch in user_component.iter_users(organization_id=organization):
+            for user in users_batch:
                 txt = f"{user.human_handle.str if user.human_handle else ''} {user.user_id.str}".lower()
                 if len([True for sq in filter_split if sq in txt]) == len(filter_split):
-                    filtered_users.append(user)
-            users = filtered_users
+                    users.append(user)
 
-        realms_granted_roles = await realm_component.dump_realms_granted_roles(
+        per_user_granted_roles: Dict[UserID, List[RealmGrantedRole]] = {
+            user.user_id: [] for user in users
+        }
+        async for granted_roles_batch in realm_component.iter_realms_granted_roles(
             organization_id=organization
-        )
-        per_user_granted_roles: Dict[UserID, List[RealmGrantedRole]] = {}
-        for granted_role in realms_granted_roles:
-            user_granted_roles = per_user_granted_roles.setdefault(granted_role.user_id, [])
-            user_granted_roles.append(granted_role)
+        ):
+            for granted_role in granted_roles_batch:
+                user_granted_roles = per_user_granted_roles.get(granted_role.user_id)
+                if user_granted_roles is not None:
+                    user_granted_roles.append(granted_role)
 
         humans: Dict[
             HumanHandle | None, List[Tuple[User, Dict[RealmID, List[RealmGrantedRole]]]]
@@ -789,6 +791,13 @@ def export_realm(
     required=False,
     help="Extract at a specific date; format year-month-day",
 )
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes used to decrypt and write the files' blocks",
+)
 # Add --debug
 @debug_config_options
 def extract_realm_export(
@@ -796,12 +805,13 @@ def extract_realm_export(
     input: Path,
     output: Path,
     filter_date: datetime | None,
+    jobs: int,
     debug: bool,
 ) -> int:
     with cli_exception_handler(debug):
         # Finally a command that is not async !
-        # This is because here we do only a single thing at a time and sqlite3 provide
-        # a synchronous api anyway
+        # This is because sqlite3 provides a synchronous api anyway, blocks decryption
+        # can still be spread across multiple processes with `--jobs`
         decryption_key = SequesterPrivateKeyDer.load_pem(service_decryption_key.read_text())
 
         # Convert filter_date from click.Datetime to parsec.Datetime
@@ -812,7 +822,11 @@ def extract_realm_export(
             date = DateTime.now()
         ret = 0
         for fs_path, event_type, event_msg in extract_workspace(
-            output=output, export_db=input, decryption_key=decryption_key, filter_on_date=date
+            output=output,
+            export_db=input,
+            decryption_key=decryption_key,
+            filter_on_date=date,
+            jobs=jobs,
         ):
             if event_type == RealmExportProgress.EXTRACT_IN_PROGRESS:
                 fs_path_display = click.style(str(fs_path), fg="yellow")
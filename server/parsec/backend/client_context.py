@@ -1,8 +1,9 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Set
+from typing import TYPE_CHECKING, Iterable, Tuple
 from uuid import uuid4
+from weakref import WeakValueDictionary
 
 import trio
 from structlog import BoundLogger, get_logger
@@ -24,20 +25,142 @@ from parsec._parsec import (
 from parsec.backend.invite import Invitation
 from parsec.event_bus import EventBusConnectionContext
 
+if TYPE_CHECKING:
+    from parsec.backend.events import ClientEventsOverflow
+
 logger = get_logger()
 
 AUTHENTICATED_CLIENT_CHANNEL_SIZE = 100
 
 
+class RealmIDSet(frozenset[RealmID]):
+    """
+    Immutable set of realm IDs, see `intern_realm_ids`.
+    """
+
+
+_interned_realm_ids: WeakValueDictionary[frozenset[RealmID], RealmIDSet] = WeakValueDictionary()
+_EMPTY_REALM_IDS = RealmIDSet()
+
+
+def intern_realm_ids(realm_ids: Iterable[RealmID]) -> frozenset[RealmID]:
+    """
+    Most connections of a given organization share the same realms (typically the
+    multiple devices of a user, or the users of a small team), so we keep a single
+    set instance for each distinct list of realms.
+    """
+    key = frozenset(realm_ids)
+    if not key:
+        return _EMPTY_REALM_IDS
+    try:
+        return _interned_realm_ids[key]
+    except KeyError:
+        realms = _interned_realm_ids[key] = RealmIDSet(key)
+        return realms
+
+
+class AuthenticatedClientIdentity:
+    """
+    Immutable part of an authenticated client context, shared among the
+    connections of a given device.
+    """
+
+    __slots__ = (
+        "organization_id",
+        "device_id",
+        "human_handle",
+        "device_label",
+        "public_key",
+        "verify_key",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        organization_id: OrganizationID,
+        device_id: DeviceID,
+        human_handle: HumanHandle | None,
+        device_label: DeviceLabel | None,
+        public_key: PublicKey,
+        verify_key: VerifyKey,
+    ):
+        self.organization_id = organization_id
+        self.device_id = device_id
+        self.human_handle = human_handle
+        self.device_label = device_label
+        self.public_key = public_key
+        self.verify_key = verify_key
+
+    def is_same(
+        self,
+        human_handle: HumanHandle | None,
+        device_label: DeviceLabel | None,
+        public_key: PublicKey,
+        verify_key: VerifyKey,
+    ) -> bool:
+        # Organization ID and device ID are compared as part of the cache key. Note
+        # the other fields are immutable for a given device, however testing may
+        # recreate an organization with the same IDs.
+        return (
+            self.human_handle == human_handle
+            and self.device_label == device_label
+            and self.public_key.encode() == public_key.encode()
+            and self.verify_key.encode() == verify_key.encode()
+        )
+
+
+_identities: WeakValueDictionary[
+    Tuple[OrganizationID, DeviceID], AuthenticatedClientIdentity
+] = WeakValueDictionary()
+
+
+def get_client_identity(
+    organization_id: OrganizationID,
+    device_id: DeviceID,
+    human_handle: HumanHandle | None,
+    device_label: DeviceLabel | None,
+    public_key: PublicKey,
+    verify_key: VerifyKey,
+) -> AuthenticatedClientIdentity:
+    identity = _identities.get((organization_id, device_id))
+    if identity is None or not identity.is_same(human_handle, device_label, public_key, verify_key):
+        identity = AuthenticatedClientIdentity(
+            organization_id=organization_id,
+            device_id=device_id,
+            human_handle=human_handle,
+            device_label=device_label,
+            public_key=public_key,
+            verify_key=verify_key,
+        )
+        _identities[(organization_id, device_id)] = identity
+    return identity
+
+
 class BaseClientContext:
-    __slots__ = ("conn_id", "api_version", "client_api_version", "cancel_scope")
-    logger: BoundLogger
+    __slots__ = ("_conn_id", "api_version", "client_api_version", "cancel_scope", "_logger")
 
     def __init__(self, api_version: ApiVersion, client_api_version: ApiVersion):
         self.api_version = api_version
         self.client_api_version = client_api_version
-        self.conn_id = uuid4().hex
+        self._conn_id: str | None = None
         self.cancel_scope: trio.CancelScope | None = None
+        self._logger: BoundLogger | None = None
+
+    @property
+    def conn_id(self) -> str:
+        # Only needed for logging, so no need to generate it for idle connections
+        if self._conn_id is None:
+            self._conn_id = uuid4().hex
+        return self._conn_id
+
+    @property
+    def logger(self) -> BoundLogger:
+        if self._logger is None:
+            self._logger = self._bind_logger()
+        return self._logger
+
+    def _bind_logger(self) -> BoundLogger:
+        raise NotImplementedError
 
     def close_connection_asap(self) -> None:
         if self.cancel_scope is not None:
@@ -46,19 +169,14 @@ class BaseClientContext:
 
 class AuthenticatedClientContext(BaseClientContext):
     __slots__ = (
-        "organization_id",
-        "device_id",
-        "human_handle",
-        "device_label",
+        "identity",
         "profile",
-        "public_key",
-        "verify_key",
         "event_bus_ctx",
-        "send_events_channel",
-        "receive_events_channel",
+        "_send_events_channel",
+        "_receive_events_channel",
+        "events_overflow",
         "realms",
         "events_subscribed",
-        "logger",
     )
 
     def __init__(
@@ -75,30 +193,82 @@ class AuthenticatedClientContext(BaseClientContext):
     ):
         super().__init__(api_version, client_api_version)
 
-        self.logger = logger.bind(
-            conn_id=self.conn_id,
-            organization_id=organization_id.str,
-            device_id=device_id.str,
+        self.identity = get_client_identity(
+            organization_id=organization_id,
+            device_id=device_id,
+            human_handle=human_handle,
+            device_label=device_label,
+            public_key=public_key,
+            verify_key=verify_key,
         )
-
-        self.organization_id = organization_id
         self.profile = profile
-        self.device_id = device_id
-        self.human_handle = human_handle
-        self.device_label = device_label
-        self.public_key = public_key
-        self.verify_key = verify_key
 
         self.event_bus_ctx: EventBusConnectionContext
-        self.send_events_channel, self.receive_events_channel = trio.open_memory_channel[
+        # Channel is only needed once the client has subscribed to the events
+        self._send_events_channel: trio.MemorySendChannel[tuple[str, BackendEvent]] | None = None
+        self._receive_events_channel: trio.MemoryReceiveChannel[
             tuple[str, BackendEvent]
-        ](AUTHENTICATED_CLIENT_CHANNEL_SIZE)
-        self.realms: Set[RealmID] = set()
+        ] | None = None
+        self.events_overflow: ClientEventsOverflow | None = None
+        self.realms: frozenset[RealmID] = _EMPTY_REALM_IDS
         self.events_subscribed = False
 
     def __repr__(self) -> str:
         return f"AuthenticatedClientContext(org={self.organization_id.str}, device={self.device_id.str})"
 
+    def _bind_logger(self) -> BoundLogger:
+        return logger.bind(
+            conn_id=self.conn_id,
+            organization_id=self.organization_id.str,
+            device_id=self.device_id.str,
+        )
+
+    def _open_events_channel(self) -> None:
+        (
+            self._send_events_channel,
+            self._receive_events_channel,
+        ) = trio.open_memory_channel[
+            tuple[str, BackendEvent]
+        ](AUTHENTICATED_CLIENT_CHANNEL_SIZE)
+
+    @property
+    def send_events_channel(self) -> trio.MemorySendChannel[tuple[str, BackendEvent]]:
+        if self._send_events_channel is None:
+            self._open_events_channel()
+            assert self._send_events_channel is not None
+        return self._send_events_channel
+
+    @property
+    def receive_events_channel(self) -> trio.MemoryReceiveChannel[tuple[str, BackendEvent]]:
+        if self._receive_events_channel is None:
+            self._open_events_channel()
+            assert self._receive_events_channel is not None
+        return self._receive_events_channel
+
+    @property
+    def organization_id(self) -> OrganizationID:
+        return self.identity.organization_id
+
+    @property
+    def device_id(self) -> DeviceID:
+        return self.identity.device_id
+
+    @property
+    def human_handle(self) -> HumanHandle | None:
+        return self.identity.human_handle
+
+    @property
+    def device_label(self) -> DeviceLabel | None:
+        return self.identity.device_label
+
+    @property
+    def public_key(self) -> PublicKey:
+        return self.identity.public_key
+
+    @property
+    def verify_key(self) -> VerifyKey:
+        return self.identity.verify_key
+
     @property
     def user_id(self) -> UserID:
         return self.device_id.user_id
@@ -117,7 +287,7 @@ class AuthenticatedClientContext(BaseClientContext):
 
 
 class InvitedClientContext(BaseClientContext):
-    __slots__ = ("organization_id", "invitation", "logger")
+    __slots__ = ("organization_id", "invitation")
 
     def __init__(
         self,
@@ -128,21 +298,22 @@ class InvitedClientContext(BaseClientContext):
     ):
         super().__init__(api_version, client_api_version)
 
-        self.logger = logger.bind(
-            conn_id=self.conn_id,
-            organization_id=organization_id.str,
-            invitation_token=invitation.token,
-        )
-
         self.organization_id = organization_id
         self.invitation = invitation
 
+    def _bind_logger(self) -> BoundLogger:
+        return logger.bind(
+            conn_id=self.conn_id,
+            organization_id=self.organization_id.str,
+            invitation_token=self.invitation.token,
+        )
+
     def __repr__(self) -> str:
         return f"InvitedClientContext(org={self.organization_id.str}, invitation={self.invitation})"
 
 
 class AnonymousClientContext(BaseClientContext):
-    __slots__ = ("organization_id", "logger")
+    __slots__ = ("organization_id",)
 
     def __init__(
         self,
@@ -152,9 +323,10 @@ class AnonymousClientContext(BaseClientContext):
     ) -> None:
         super().__init__(api_version, client_api_version)
 
-        self.logger = logger.bind(conn_id=self.conn_id, organization_id=organization_id.str)
-
         self.organization_id = organization_id
 
+    def _bind_logger(self) -> BoundLogger:
+        return logger.bind(conn_id=self.conn_id, organization_id=self.organization_id.str)
+
     def __repr__(self) -> str:
         return f"InvitedClientContext(org={self.organization_id.str})"
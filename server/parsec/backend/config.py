@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+from pathlib import Path
 from typing import List, Tuple, Union
 
 import attr
@@ -122,6 +123,9 @@ class BackendConfig:
     organization_initial_active_users_limit: ActiveUsersLimit = ActiveUsersLimit.NO_LIMIT
     organization_initial_user_profile_outsider_allowed: bool = True
 
+    # Memory backend only, restore state from this file at startup and save it on shutdown
+    memory_snapshot_path: Path | None = None
+
     @property
     def db_type(self) -> str:
         if self.db_url.upper() == "MOCKED":
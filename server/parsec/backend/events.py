@@ -1,7 +1,10 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from collections import deque
+import math
+import sys
+from base64 import b64encode
+from collections import OrderedDict, deque
 from typing import Awaitable, Callable, Type
 
 import trio
@@ -20,13 +23,23 @@ from parsec._parsec import (
     authenticated_cmds,
 )
 from parsec.api.protocol.types import UserProfile
-from parsec.backend.client_context import AuthenticatedClientContext
+from parsec.backend.client_context import AuthenticatedClientContext, intern_realm_ids
 from parsec.backend.realm import BaseRealmComponent
 from parsec.backend.utils import api, api_ws_cancel_on_client_sending_new_cmd
 
 # TODO: make this configurable ?
 BACKEND_EVENTS_LOCAL_CACHE_SIZE = 1024
 
+# Max number of events kept on top of the client's events channel when the client
+# is too slow to consume them. Past this point the client gets disconnected.
+CLIENT_EVENTS_OVERFLOW_MAX_SIZE = 1024
+
+SSE_KEEPALIVE_FRAME = b":keepalive\n\n"
+# Idle SSE connections are sent their keepalive up to this fraction of the keepalive
+# period early, so that connections becoming idle at roughly the same time are
+# handled in a single tick
+SSE_KEEPALIVE_BATCH_WINDOW_RATIO = 0.1
+
 
 def internal_to_api_v2_v3_events(
     event: BackendEvent,
@@ -110,6 +123,19 @@ def internal_to_api_events(
         return event_listen_cmd_mod.APIEventPkiEnrollmentUpdated()
 
 
+def internal_to_sse_frame(event_id: str, event: BackendEvent) -> bytes | None:
+    unit = internal_to_api_events(event)
+    if not unit:
+        return None
+    return (
+        b"data:"
+        + b64encode(authenticated_cmds.latest.events_listen.RepOk(unit).dump())
+        + b"\nid:"
+        + event_id.encode("ascii")
+        + b"\n\n"
+    )
+
+
 def _is_event_for_our_client(
     client_ctx: AuthenticatedClientContext,
     event: BackendEvent,
@@ -155,9 +181,135 @@ def _is_event_for_our_client(
         return client_ctx.profile == UserProfile.ADMIN
 
 
+class ClientEventsOverflow:
+    """
+    Events that couldn't fit into the events channel of a slow client.
+
+    Instead of disconnecting the client (which would then reconnect and resync
+    everything, making things worse), events are buffered here while superseded
+    events are discarded: only the last ping and the last vlobs update of each realm
+    are kept (the client is going to poll the realm's changes since its own checkpoint
+    anyway).
+    """
+
+    __slots__ = ("_events",)
+
+    def __init__(self) -> None:
+        self._events: OrderedDict[object, tuple[str, BackendEvent]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def push(self, event_id: str, event: BackendEvent) -> bool:
+        """
+        Return `True` if the event superseded a previously buffered event.
+        """
+        key: object
+        if isinstance(event, BackendEventRealmVlobsUpdated):
+            key = (BackendEventRealmVlobsUpdated, event.realm_id)
+        elif isinstance(event, BackendEventPinged):
+            key = BackendEventPinged
+        else:
+            key = event_id
+        superseded = self._events.pop(key, None) is not None
+        self._events[key] = (event_id, event)
+        return superseded
+
+    def refill(self, channel: trio.MemorySendChannel[tuple[str, BackendEvent]]) -> None:
+        while self._events:
+            key, item = next(iter(self._events.items()))
+            try:
+                channel.send_nowait(item)
+            except trio.WouldBlock:
+                return
+            del self._events[key]
+
+
+class SSEKeepaliveScheduler:
+    """
+    Send keepalive frames to the idle SSE connections.
+
+    Instead of each SSE connection having its own timer, the connections are kept
+    ordered by last activity and a single task wakes up when the oldest one has been
+    idle for too long, then sends a keepalive to all the connections that are (or are
+    about to be) idle.
+    """
+
+    def __init__(self, keepalive: float):
+        self.keepalive = keepalive
+        self._batch_window = keepalive * SSE_KEEPALIVE_BATCH_WINDOW_RATIO
+        # Connections' payload sender with their last activity, the oldest first
+        self._connections: OrderedDict[trio.MemorySendChannel[bytes], float] = OrderedDict()
+        self._connections_changed = trio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.keepalive != math.inf
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "connections": len(self._connections),
+            "connections_bookkeeping_bytes": sys.getsizeof(self._connections),
+        }
+
+    def register(self, sender: trio.MemorySendChannel[bytes]) -> None:
+        if not self.enabled:
+            return
+        self._connections[sender] = trio.current_time()
+        if len(self._connections) == 1:
+            self._connections_changed.set()
+
+    def unregister(self, sender: trio.MemorySendChannel[bytes]) -> None:
+        self._connections.pop(sender, None)
+
+    def mark_active(self, sender: trio.MemorySendChannel[bytes]) -> None:
+        """
+        To be called each time a payload is sent on the connection.
+        """
+        if sender in self._connections:
+            self._connections[sender] = trio.current_time()
+            self._connections.move_to_end(sender)
+
+    def _send_keepalives(self) -> None:
+        now = trio.current_time()
+        idle_since = now + self._batch_window - self.keepalive
+        while self._connections:
+            sender, last_activity = next(iter(self._connections.items()))
+            if last_activity > idle_since:
+                break
+            try:
+                sender.send_nowait(SSE_KEEPALIVE_FRAME)
+            except trio.WouldBlock:
+                # Connection is busy sending a payload, so no need for a keepalive
+                pass
+            except (trio.BrokenResourceError, trio.ClosedResourceError):
+                del self._connections[sender]
+                continue
+            self._connections[sender] = now
+            self._connections.move_to_end(sender)
+
+    async def run(self) -> None:
+        if not self.enabled:
+            return
+        while True:
+            if not self._connections:
+                self._connections_changed = trio.Event()
+                await self._connections_changed.wait()
+                continue
+            oldest_activity = next(iter(self._connections.values()))
+            # The oldest connection may become active in the meantime, in which
+            # case `_send_keepalives` has nothing to do and we just wait for the
+            # new oldest connection
+            await trio.sleep_until(oldest_activity + self.keepalive)
+            self._send_keepalives()
+
+
 class EventsComponent:
     def __init__(
-        self, realm_component: BaseRealmComponent, send_event: Callable[..., Awaitable[None]]
+        self,
+        realm_component: BaseRealmComponent,
+        send_event: Callable[..., Awaitable[None]],
+        sse_keepalive: float = math.inf,
     ):
         self._realm_component = realm_component
         # Keep in cache the last dispatched events so that we can handle SSE reconnection
@@ -165,11 +317,33 @@ class EventsComponent:
         self._events_cache: deque[tuple[str, BackendEvent]] = deque(
             maxlen=BACKEND_EVENTS_LOCAL_CACHE_SIZE
         )
+        # An event is usually dispatched to many SSE clients, so we serialize it only
+        # once. Note SSE is only available for the latest API version, hence the event
+        # ID is enough to identify a frame.
+        self._sse_frames_cache: OrderedDict[str, bytes | None] = OrderedDict()
+        self.sse_keepalive_scheduler = SSEKeepaliveScheduler(sse_keepalive)
+        # Events discarded instead of disconnecting slow clients
+        self.events_overflow_stats = {"coalesced": 0, "dropped": 0, "disconnected": 0}
         self.send = send_event
 
     def add_event_to_cache(self, event_id: str, event: BackendEvent) -> None:
         self._events_cache.append((event_id, event))
 
+    def get_sse_frame(self, event_id: str, event: BackendEvent) -> bytes | None:
+        """
+        Return the SSE frame to send for this event, or `None` if the event is
+        not part of the API.
+        """
+        try:
+            return self._sse_frames_cache[event_id]
+        except KeyError:
+            pass
+        frame = internal_to_sse_frame(event_id, event)
+        self._sse_frames_cache[event_id] = frame
+        if len(self._sse_frames_cache) > BACKEND_EVENTS_LOCAL_CACHE_SIZE:
+            self._sse_frames_cache.popitem(last=False)
+        return frame
+
     def _get_client_missed_events_since(
         self, client_ctx: AuthenticatedClientContext, last_event_id: str
     ) -> deque[tuple[str, BackendEvent] | None]:
@@ -195,6 +369,48 @@ class EventsComponent:
             await self.connect_events(client_ctx)
         return authenticated_cmds.v3.events_subscribe.RepOk()
 
+    def _push_client_event(
+        self, client_ctx: AuthenticatedClientContext, event_id: str, event: BackendEvent
+    ) -> None:
+        overflow = client_ctx.events_overflow
+        if overflow is None:
+            try:
+                client_ctx.send_events_channel.send_nowait((event_id, event))
+                return
+            except trio.WouldBlock:
+                overflow = client_ctx.events_overflow = ClientEventsOverflow()
+
+        if overflow.push(event_id, event):
+            if isinstance(event, BackendEventPinged):
+                self.events_overflow_stats["dropped"] += 1
+            else:
+                self.events_overflow_stats["coalesced"] += 1
+
+        elif len(overflow) > CLIENT_EVENTS_OVERFLOW_MAX_SIZE:
+            self.events_overflow_stats["disconnected"] += 1
+            client_ctx.close_connection_asap()
+
+    def _refill_client_events(self, client_ctx: AuthenticatedClientContext) -> None:
+        overflow = client_ctx.events_overflow
+        if overflow is not None:
+            overflow.refill(client_ctx.send_events_channel)
+            if not overflow:
+                client_ctx.events_overflow = None
+
+    async def _receive_client_event(
+        self, client_ctx: AuthenticatedClientContext
+    ) -> tuple[str, BackendEvent]:
+        item = await client_ctx.receive_events_channel.receive()
+        self._refill_client_events(client_ctx)
+        return item
+
+    def _receive_client_event_nowait(
+        self, client_ctx: AuthenticatedClientContext
+    ) -> tuple[str, BackendEvent]:
+        item = client_ctx.receive_events_channel.receive_nowait()
+        self._refill_client_events(client_ctx)
+        return item
+
     async def connect_events(
         self, client_ctx: AuthenticatedClientContext, last_event_id: str | None = None
     ) -> deque[tuple[str, BackendEvent] | None]:
@@ -207,14 +423,11 @@ class EventsComponent:
                 # Keep up to date the list of realms the user should be notified of
                 if isinstance(payload, BackendEventRealmRolesUpdated):
                     if payload.role is None:
-                        client_ctx.realms.discard(payload.realm_id)
+                        client_ctx.realms = intern_realm_ids(client_ctx.realms - {payload.realm_id})
                     else:
-                        client_ctx.realms.add(payload.realm_id)
+                        client_ctx.realms = intern_realm_ids(client_ctx.realms | {payload.realm_id})
 
-                try:
-                    client_ctx.send_events_channel.send_nowait((event_id, payload))
-                except trio.WouldBlock:
-                    client_ctx.close_connection_asap()
+                self._push_client_event(client_ctx, event_id, payload)
 
         # Command should be idempotent
         if client_ctx.events_subscribed:
@@ -277,7 +490,7 @@ class EventsComponent:
         realms_for_user = await self._realm_component.get_realms_for_user(
             client_ctx.organization_id, client_ctx.user_id
         )
-        client_ctx.realms = set(realms_for_user.keys())
+        client_ctx.realms = intern_realm_ids(realms_for_user.keys())
         client_ctx.events_subscribed = True
 
         return new_events
@@ -291,11 +504,11 @@ class EventsComponent:
     ) -> authenticated_cmds.v3.events_listen.Rep:
         while True:
             if req.wait:
-                _, event = await client_ctx.receive_events_channel.receive()
+                _, event = await self._receive_client_event(client_ctx)
 
             else:
                 try:
-                    _, event = client_ctx.receive_events_channel.receive_nowait()
+                    _, event = self._receive_client_event_nowait(client_ctx)
                 except trio.WouldBlock:
                     return authenticated_cmds.v3.events_listen.RepNoEvents()
 
@@ -317,14 +530,15 @@ class EventsComponent:
 
     async def sse_api_events_listen(
         self, client_ctx: AuthenticatedClientContext, last_event_id: str | None
-    ) -> Callable[[], Awaitable[tuple[str, authenticated_cmds.latest.events_listen.Rep] | None]]:
+    ) -> Callable[[], Awaitable[bytes | None]]:
+        """
+        Return a callback providing the next SSE frame to send to the client.
+        """
         missed_events = await self.connect_events(client_ctx, last_event_id)
         if missed_events is None:
             missed_events = deque((None,))
 
-        async def _next_event_cb() -> tuple[
-            str, authenticated_cmds.latest.events_listen.Rep
-        ] | None:
+        async def _next_event_cb() -> bytes | None:
             while True:
                 # First return the events the client has missed since it last deconnection
 
@@ -335,24 +549,21 @@ class EventsComponent:
                         return None
                     else:
                         missed_event_id, missed_event_payload = missed_event
-                        unit = internal_to_api_events(missed_event_payload)
-                        if not unit:
+                        frame = self.get_sse_frame(missed_event_id, missed_event_payload)
+                        if not frame:
                             continue
 
-                        return (
-                            missed_event_id,
-                            authenticated_cmds.latest.events_listen.RepOk(unit),
-                        )
+                        return frame
 
                 # Then switch back to the current events
 
-                (event_id, event) = await client_ctx.receive_events_channel.receive()
+                (event_id, event) = await self._receive_client_event(client_ctx)
 
-                unit = internal_to_api_events(event)
-                if not unit:
+                frame = self.get_sse_frame(event_id, event)
+                if not frame:
                     # Ignore the current event
                     continue
 
-                return (event_id, authenticated_cmds.latest.events_listen.RepOk(unit))
+                return frame
 
         return _next_event_cb
@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+from collections import defaultdict
 from copy import deepcopy
 from typing import TYPE_CHECKING, Any, Dict, Tuple
 
@@ -32,7 +33,9 @@ class BlockMeta:
 
 class MemoryBlockComponent(BaseBlockComponent):
     def __init__(self) -> None:
-        self._blockmetas: dict[Tuple[OrganizationID, BlockID], BlockMeta] = {}
+        # Metadata are partitioned per organization, so that organization-wide
+        # operations don't have to go through the other organizations' blocks
+        self._blockmetas: Dict[OrganizationID, Dict[BlockID, BlockMeta]] = defaultdict(dict)
         self._blockstore_component: MemoryBlockStoreComponent | None = None
         self._realm_component: MemoryRealmComponent | None = None
 
@@ -100,7 +103,7 @@ class MemoryBlockComponent(BaseBlockComponent):
         assert self._blockstore_component is not None
 
         try:
-            blockmeta = self._blockmetas[(organization_id, block_id)]
+            blockmeta = self._blockmetas[organization_id][block_id]
 
         except KeyError:
             raise BlockNotFoundError()
@@ -122,28 +125,18 @@ class MemoryBlockComponent(BaseBlockComponent):
 
         created_on = created_on or DateTime.now()
         self._check_realm_write_access(organization_id, realm_id, author.user_id)
-        if (organization_id, block_id) in self._blockmetas:
+        if block_id in self._blockmetas[organization_id]:
             raise BlockAlreadyExistsError()
 
         await self._blockstore_component.create(organization_id, block_id, block)
 
-        self._blockmetas[(organization_id, block_id)] = BlockMeta(realm_id, len(block), created_on)
+        self._blockmetas[organization_id][block_id] = BlockMeta(realm_id, len(block), created_on)
 
     def test_duplicate_organization(self, id: OrganizationID, new_id: OrganizationID) -> None:
-        self._blockmetas.update(
-            {
-                (new_id, block_id): deepcopy(block_meta)
-                for (candidate_org_id, block_id), block_meta in self._blockmetas.items()
-                if candidate_org_id == id
-            }
-        )
+        self._blockmetas[new_id] = deepcopy(self._blockmetas[id])
 
     def test_drop_organization(self, id: OrganizationID) -> None:
-        self._blockmetas = {
-            (candidate_org_id, block_id): block_meta
-            for (candidate_org_id, block_id), block_meta in self._blockmetas.items()
-            if candidate_org_id != id
-        }
+        self._blockmetas.pop(id, None)
 
 
 class MemoryBlockStoreComponent(BaseBlockStoreComponent):
@@ -7,6 +7,7 @@ from typing import Any, AsyncGenerator, Tuple
 from uuid import uuid4
 
 import trio
+from structlog import get_logger
 
 from parsec.backend.blockstore import blockstore_factory
 from parsec.backend.config import BackendConfig
@@ -19,12 +20,19 @@ from parsec.backend.memory.ping import MemoryPingComponent
 from parsec.backend.memory.pki import MemoryPkiEnrollmentComponent
 from parsec.backend.memory.realm import MemoryRealmComponent
 from parsec.backend.memory.sequester import MemorySequesterComponent
+from parsec.backend.memory.snapshot import (
+    MemorySnapshotError,
+    load_memory_snapshot_file,
+    save_memory_snapshot_file,
+)
 from parsec.backend.memory.user import MemoryUserComponent
 from parsec.backend.memory.vlob import MemoryVlobComponent
 from parsec.backend.webhooks import WebhooksComponent
 from parsec.event_bus import EventBus
 from parsec.utils import open_service_nursery
 
+logger = get_logger()
+
 
 @asynccontextmanager
 async def components_factory(  # type: ignore[misc]
@@ -50,7 +58,7 @@ async def components_factory(  # type: ignore[misc]
     sequester = MemorySequesterComponent()
     block = MemoryBlockComponent()
     blockstore = blockstore_factory(config.blockstore_config)
-    events = EventsComponent(realm, send_event=_send_event)
+    events = EventsComponent(realm, send_event=_send_event, sse_keepalive=config.sse_keepalive)
 
     components = {
         "events": events,
@@ -72,6 +80,9 @@ async def components_factory(  # type: ignore[misc]
         if method is not None:
             method(**components)
 
+    if config.memory_snapshot_path is not None and config.memory_snapshot_path.exists():
+        load_memory_snapshot_file(components, config.memory_snapshot_path)
+
     async def _dispatch_event() -> None:
         async for (event_id, event) in receive_events_channel:
             await trio.sleep(0)
@@ -80,8 +91,27 @@ async def components_factory(  # type: ignore[misc]
 
     async with open_service_nursery() as nursery:
         nursery.start_soon(_dispatch_event)
+        nursery.start_soon(events.sse_keepalive_scheduler.run)
+        save_snapshot = config.memory_snapshot_path is not None
         try:
             yield components
 
+        except Exception:
+            # The server has crashed, don't overwrite the previous snapshot with
+            # a possibly inconsistent state (note cancellation is a regular shutdown)
+            save_snapshot = False
+            raise
+
         finally:
             nursery.cancel_scope.cancel()
+            if save_snapshot:
+                assert config.memory_snapshot_path is not None
+                try:
+                    save_memory_snapshot_file(components, config.memory_snapshot_path)
+                except (MemorySnapshotError, OSError) as exc:
+                    # Don't prevent the rest of the teardown
+                    logger.warning(
+                        "Cannot save memory snapshot",
+                        path=str(config.memory_snapshot_path),
+                        exc_info=exc,
+                    )
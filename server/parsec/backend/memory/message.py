@@ -3,6 +3,7 @@ from __future__ import annotations
 
 from collections import defaultdict
 from copy import deepcopy
+from functools import partial
 from typing import Any, Callable, Coroutine, List, Tuple
 
 from parsec._parsec import (
@@ -19,9 +20,10 @@ from parsec.backend.message import BaseMessageComponent
 class MemoryMessageComponent(BaseMessageComponent):
     def __init__(self, send_event: Callable[..., Coroutine[Any, Any, None]]) -> None:
         self._send_event = send_event
+        # No lambda as default factory given it cannot be pickled in memory snapshot
         self._organizations: dict[
             OrganizationID, dict[UserID, List[Tuple[DeviceID, DateTime, bytes, int]]]
-        ] = defaultdict(lambda: defaultdict(list))
+        ] = defaultdict(partial(defaultdict, list))
         self._user_component: MemoryUserComponent
 
     def register_components(self, user: MemoryUserComponent, **other_components: Any) -> None:
@@ -17,6 +17,7 @@ from parsec._parsec import (
     UsersPerProfileDetailItem,
     VerifyKey,
 )
+from parsec.backend.memory.user import SEQUESTER_AUTHORITY_CERTIFICATE_PRIORITY
 from parsec.backend.organization import (
     BaseOrganizationComponent,
     Organization,
@@ -143,6 +144,13 @@ class MemoryOrganizationComponent(BaseOrganizationComponent):
                 ].evolve(
                     sequester_authority=sequester_authority, sequester_services_certificates=()
                 )
+                self._user_component.add_certificate(
+                    id,
+                    # Authority certificate is always signed at bootstrap time
+                    bootstrapped_on or user.created_on,
+                    sequester_authority.certificate,
+                    priority=SEQUESTER_AUTHORITY_CERTIFICATE_PRIORITY,
+                )
 
     async def stats(
         self,
@@ -160,13 +168,12 @@ class MemoryOrganizationComponent(BaseOrganizationComponent):
             raise OrganizationNotFoundError
 
         metadata_size = 0
-        for (vlob_organization_id, _), vlob in self._vlob_component._vlobs.items():
-            if vlob_organization_id == id:
-                metadata_size += sum(len(blob) for (blob, _, ts, _) in vlob.data if ts <= at)
+        for vlob in self._vlob_component._vlobs[id].values():
+            metadata_size += vlob.size_at(at)
 
         data_size = 0
-        for (vlob_organization_id, _), blockmeta in self._block_component._blockmetas.items():
-            if vlob_organization_id == id and (blockmeta.created_on <= at):
+        for blockmeta in self._block_component._blockmetas[id].values():
+            if blockmeta.created_on <= at:
                 data_size += blockmeta.size
 
         users = 0
@@ -182,8 +189,8 @@ class MemoryOrganizationComponent(BaseOrganizationComponent):
                     active_users += 1
 
         realms = 0
-        for (organization_id, _), realm in self._realm_component._realms.items():
-            if organization_id == id and realm.created_on <= at:
+        for realm in self._realm_component._realms[id].values():
+            if realm.created_on <= at:
                 realms += 1
 
         users_per_profile_detail = tuple(
@@ -1,8 +1,9 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+from collections import defaultdict
 from copy import deepcopy
-from typing import TYPE_CHECKING, Any, Callable, Coroutine, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Coroutine, Dict, List, Tuple
 
 import attr
 
@@ -51,27 +52,48 @@ class Realm:
     checkpoint: int = attr.ib(default=0)
     granted_roles: List[RealmGrantedRole] = attr.ib(factory=list)
     last_role_change_per_user: Dict[UserID, DateTime] = attr.ib(factory=dict)
+    # Views on `granted_roles`, kept up to date by `add_granted_role` so that
+    # access checks don't have to go through the whole roles history
+    _created_on: DateTime | None = attr.ib(default=None, init=False)
+    _roles: Dict[UserID, RealmRole] = attr.ib(factory=dict, init=False)
+    _last_role_per_user: Dict[UserID, RealmGrantedRole] = attr.ib(factory=dict, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        granted_roles = self.granted_roles
+        self.granted_roles = []
+        for granted_role in granted_roles:
+            self.add_granted_role(granted_role)
+
+    def add_granted_role(self, granted_role: RealmGrantedRole) -> None:
+        self.granted_roles.append(granted_role)
+
+        if self._created_on is None or granted_role.granted_on < self._created_on:
+            self._created_on = granted_role.granted_on
+
+        user_id = granted_role.user_id
+        last_role = self._last_role_per_user.get(user_id)
+        if last_role is not None and last_role.granted_on > granted_role.granted_on:
+            # Older than the current role (should not occur given role timestamps
+            # are strictly increasing for a given user), so nothing else changes
+            return
+        self._last_role_per_user[user_id] = granted_role
+        if granted_role.role is None:
+            self._roles.pop(user_id, None)
+        else:
+            self._roles[user_id] = granted_role.role
 
     @property
     def created_on(self) -> DateTime:
-        return min(r.granted_on for r in self.granted_roles)
+        assert self._created_on is not None
+        return self._created_on
 
     @property
     def roles(self) -> Dict[UserID, RealmRole]:
-        roles: Dict[UserID, RealmRole] = {}
-        for x in sorted(self.granted_roles, key=lambda x: x.granted_on):
-            if x.role is None:
-                roles.pop(x.user_id, None)
-            else:
-                roles[x.user_id] = x.role
-        return roles
+        # Note the returned dict is not a copy and must not be modified
+        return self._roles
 
     def get_last_role(self, user_id: UserID) -> RealmGrantedRole | None:
-        filtered_roles = [role for role in self.granted_roles if role.user_id == user_id]
-        try:
-            return max(filtered_roles, key=lambda role: role.granted_on)
-        except ValueError:
-            return None
+        return self._last_role_per_user.get(user_id)
 
 
 class MemoryRealmComponent(BaseRealmComponent):
@@ -81,7 +103,9 @@ class MemoryRealmComponent(BaseRealmComponent):
         self._message_component: MemoryMessageComponent | None = None
         self._vlob_component: MemoryVlobComponent | None = None
         self._block_component: MemoryBlockComponent | None = None
-        self._realms: Dict[Tuple[OrganizationID, RealmID], Realm] = {}
+        # Realms are partitioned per organization, so that organization-wide
+        # operations don't have to go through the other organizations' realms
+        self._realms: Dict[OrganizationID, Dict[RealmID, Realm]] = defaultdict(dict)
         self._maintenance_reencryption_is_finished_hook = None
 
     def register_components(
@@ -99,7 +123,7 @@ class MemoryRealmComponent(BaseRealmComponent):
 
     def _get_realm(self, organization_id: OrganizationID, realm_id: RealmID) -> Realm:
         try:
-            return self._realms[(organization_id, realm_id)]
+            return self._realms[organization_id][realm_id]
         except KeyError:
             raise RealmNotFoundError(f"Realm `{realm_id.hex}` doesn't exist")
 
@@ -111,9 +135,12 @@ class MemoryRealmComponent(BaseRealmComponent):
         assert self_granted_role.granted_by.user_id == self_granted_role.user_id
         assert self_granted_role.role == RealmRole.OWNER
 
-        key = (organization_id, self_granted_role.realm_id)
-        if key not in self._realms:
-            self._realms[key] = Realm(granted_roles=[self_granted_role])
+        org_realms = self._realms[organization_id]
+        if self_granted_role.realm_id not in org_realms:
+            org_realms[self_granted_role.realm_id] = Realm(granted_roles=[self_granted_role])
+            self._user_component.add_certificate(
+                organization_id, self_granted_role.granted_on, self_granted_role.certificate
+            )
 
             await self._user_component.notify_certificates_update(
                 organization_id=organization_id,
@@ -152,12 +179,12 @@ class MemoryRealmComponent(BaseRealmComponent):
 
         blocks_size = 0
         vlobs_size = 0
-        for value in self._block_component._blockmetas.values():
+        for value in self._block_component._blockmetas[organization_id].values():
             if value.realm_id == realm_id:
                 blocks_size += value.size
-        for value in self._vlob_component._vlobs.values():
+        for value in self._vlob_component._vlobs[organization_id].values():
             if value.realm_id == realm_id:
-                vlobs_size += sum(len(blob) for (blob, _, _, _) in value.data)
+                vlobs_size += value.size
 
         return RealmStats(blocks_size=blocks_size, vlobs_size=vlobs_size)
 
@@ -165,13 +192,7 @@ class MemoryRealmComponent(BaseRealmComponent):
         self, organization_id: OrganizationID, realm_id: RealmID
     ) -> Dict[UserID, RealmRole]:
         realm = self._get_realm(organization_id, realm_id)
-        roles: Dict[UserID, RealmRole] = {}
-        for x in realm.granted_roles:
-            if x.role is None:
-                roles.pop(x.user_id, None)
-            else:
-                roles[x.user_id] = x.role
-        return roles
+        return dict(realm.roles)
 
     async def get_role_certificates(
         self, organization_id: OrganizationID, author: DeviceID, realm_id: RealmID
@@ -254,7 +275,10 @@ class MemoryRealmComponent(BaseRealmComponent):
                 raise RealmRoleRequireGreaterTimestampError(realm_last_role_change)
 
         # Update role and record last change timestamp for this user
-        realm.granted_roles.append(new_role)
+        realm.add_granted_role(new_role)
+        self._user_component.add_certificate(
+            organization_id, new_role.granted_on, new_role.certificate
+        )
         author_user_id = new_role.granted_by.user_id
         current_value = realm.last_role_change_per_user.get(author_user_id)
         realm.last_role_change_per_user[author_user_id] = (
@@ -308,7 +332,8 @@ class MemoryRealmComponent(BaseRealmComponent):
             raise RealmEncryptionRevisionError("Invalid encryption revision")
         now = DateTime.now()
         not_revoked_roles = set()
-        for user_id in realm.roles.keys():
+        # Copy given roles may change while we are awaiting
+        for user_id in list(realm.roles.keys()):
             user = await self._user_component.get_user(organization_id, user_id)
             if not user.revoked_on or user.revoked_on > now:
                 not_revoked_roles.add(user_id)
@@ -382,9 +407,7 @@ class MemoryRealmComponent(BaseRealmComponent):
         self, organization_id: OrganizationID, user: UserID
     ) -> Dict[RealmID, RealmRole]:
         user_realms = {}
-        for (realm_org_id, realm_id), realm in self._realms.items():
-            if realm_org_id != organization_id:
-                continue
+        for realm_id, realm in self._realms[organization_id].items():
             try:
                 user_realms[realm_id] = realm.roles[user]
             except KeyError:
@@ -395,25 +418,20 @@ class MemoryRealmComponent(BaseRealmComponent):
         self, organization_id: OrganizationID
     ) -> List[RealmGrantedRole]:
         granted_roles = []
-        for (realm_org_id, _), realm in self._realms.items():
-            if realm_org_id != organization_id:
-                continue
+        for realm in self._realms[organization_id].values():
             granted_roles += realm.granted_roles
 
         return granted_roles
 
+    async def iter_realms_granted_roles(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[RealmGrantedRole]]:
+        granted_roles = await self.dump_realms_granted_roles(organization_id)
+        for i in range(0, len(granted_roles), batch_size):
+            yield granted_roles[i : i + batch_size]
+
     def test_duplicate_organization(self, id: OrganizationID, new_id: OrganizationID) -> None:
-        self._realms.update(
-            {
-                (new_id, realm_id): deepcopy(realm)
-                for (candidate_org_id, realm_id), realm in self._realms.items()
-                if candidate_org_id == id
-            }
-        )
+        self._realms[new_id] = deepcopy(self._realms[id])
 
     def test_drop_organization(self, id: OrganizationID) -> None:
-        self._realms = {
-            (candidate_org_id, realm_id): realm
-            for (candidate_org_id, realm_id), realm in self._realms.items()
-            if candidate_org_id != id
-        }
+        self._realms.pop(id, None)
@@ -30,12 +30,14 @@ from parsec.backend.sequester import (
 
 if TYPE_CHECKING:
     from parsec.backend.memory.organization import MemoryOrganizationComponent
+    from parsec.backend.memory.user import MemoryUserComponent
     from parsec.backend.memory.vlob import MemoryVlobComponent
 
 
 class MemorySequesterComponent(BaseSequesterComponent):
     def __init__(self) -> None:
         self._organization_component: MemoryOrganizationComponent | None = None
+        self._user_component: MemoryUserComponent | None = None
         self._vlob_component: MemoryVlobComponent | None = None
         self._services: Dict[
             OrganizationID, Dict[SequesterServiceID, BaseSequesterService]
@@ -44,10 +46,12 @@ class MemorySequesterComponent(BaseSequesterComponent):
     def register_components(
         self,
         organization: MemoryOrganizationComponent,
+        user: MemoryUserComponent,
         vlob: MemoryVlobComponent,
         **other_components: Any,
     ) -> None:
         self._organization_component = organization
+        self._user_component = user
         self._vlob_component = vlob
 
     def _enabled_services(self, organization_id: OrganizationID) -> List[BaseSequesterService]:
@@ -73,6 +77,7 @@ class MemorySequesterComponent(BaseSequesterComponent):
         service: BaseSequesterService,
     ) -> None:
         assert self._organization_component is not None
+        assert self._user_component is not None
 
         try:
             organization = self._organization_component._organizations[organization_id]
@@ -102,6 +107,9 @@ class MemorySequesterComponent(BaseSequesterComponent):
         if service.service_id in org_services:
             raise SequesterServiceAlreadyExists
         org_services[service.service_id] = service
+        self._user_component.add_certificate(
+            organization_id, service.created_on, service.service_certificate
+        )
         # Also don't forget to update Organization structure in organization component
         self._refresh_services_in_organization_component(organization_id)
 
@@ -179,8 +187,8 @@ class MemorySequesterComponent(BaseSequesterComponent):
                 f"Service type {service.service_type} is not compatible with export"
             )
         # Do the actual dump
-        for (vlob_org, vlob_id), vlob in self._vlob_component._vlobs.items():
-            if vlob_org != organization_id or vlob.realm_id != realm_id:
+        for vlob_id, vlob in self._vlob_component._vlobs[organization_id].items():
+            if vlob.realm_id != realm_id:
                 continue
             assert vlob.sequestered_data is not None
             for version, sequestered_version in enumerate(vlob.sequestered_data, start=1):
@@ -0,0 +1,157 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import os
+import pickle
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Tuple
+
+from parsec._parsec import (
+    ActiveUsersLimit,
+    BlockID,
+    DateTime,
+    DeviceID,
+    DeviceLabel,
+    DeviceName,
+    EnrollmentID,
+    HumanHandle,
+    InvitationStatus,
+    InvitationToken,
+    InvitationType,
+    OrganizationID,
+    PublicKey,
+    RealmID,
+    RealmRole,
+    SequesterServiceID,
+    SequesterVerifyKeyDer,
+    UserID,
+    UserProfile,
+    VerifyKey,
+    VlobID,
+)
+from parsec._version import __version__ as parsec_version
+from parsec.backend.invite import InvitationDeletedReason
+from parsec.backend.memory.block import MemoryBlockStoreComponent
+from parsec.backend.realm import MaintenanceType
+
+# Attributes holding the state of each memory component, everything else
+# (locks, registered components, event callbacks...) is rebuilt at startup
+COMPONENTS_STATE_ATTRIBUTES: Dict[str, Tuple[str, ...]] = {
+    "organization": ("_organizations",),
+    "user": ("_organizations",),
+    "invite": ("_organizations",),
+    "message": ("_organizations",),
+    "realm": ("_realms",),
+    "vlob": ("_vlobs", "_per_realm_changes"),
+    "block": ("_blockmetas",),
+    "blockstore": ("_blocks",),
+    "pki": ("_enrollments",),
+    "sequester": ("_services",),
+}
+
+
+class MemorySnapshotError(Exception):
+    pass
+
+
+# Types from the Rust bindings don't support pickle, so they are stored as their
+# plain serialized form alongside their type name.
+_SNAPSHOT_TYPES: Dict[str, Tuple[type, Callable[[Any], Any], Callable[[Any], Any]]] = {
+    cls.__name__: (cls, dump, load)
+    for cls, dump, load in [
+        (OrganizationID, lambda x: x.str, OrganizationID),
+        (UserID, lambda x: x.str, UserID),
+        (DeviceName, lambda x: x.str, DeviceName),
+        (DeviceID, lambda x: x.str, DeviceID),
+        (DeviceLabel, lambda x: x.str, DeviceLabel),
+        (HumanHandle, lambda x: (x.email, x.label), lambda x: HumanHandle(*x)),
+        (RealmID, lambda x: x.bytes, RealmID.from_bytes),
+        (VlobID, lambda x: x.bytes, VlobID.from_bytes),
+        (BlockID, lambda x: x.bytes, BlockID.from_bytes),
+        (SequesterServiceID, lambda x: x.bytes, SequesterServiceID.from_bytes),
+        (EnrollmentID, lambda x: x.bytes, EnrollmentID.from_bytes),
+        (InvitationToken, lambda x: x.bytes, InvitationToken.from_bytes),
+        (
+            DateTime,
+            lambda x: (x.year, x.month, x.day, x.hour, x.minute, x.second, x.microsecond),
+            lambda x: DateTime(*x),
+        ),
+        (RealmRole, lambda x: x.str, RealmRole.from_str),
+        (UserProfile, lambda x: x.str, UserProfile.from_str),
+        (InvitationStatus, lambda x: x.str, InvitationStatus.from_str),
+        (InvitationType, lambda x: x.str, InvitationType.from_str),
+        (InvitationDeletedReason, lambda x: x.str, InvitationDeletedReason.from_str),
+        (MaintenanceType, lambda x: x.str, MaintenanceType.from_str),
+        (ActiveUsersLimit, lambda x: x.to_int(), ActiveUsersLimit.FromOptionalInt),
+        (VerifyKey, lambda x: x.encode(), VerifyKey),
+        (PublicKey, lambda x: x.encode(), PublicKey),
+        (SequesterVerifyKeyDer, lambda x: x.dump(), SequesterVerifyKeyDer),
+    ]
+}
+
+
+def _load_snapshot_type(type_name: str, dumped: Any) -> Any:
+    return _SNAPSHOT_TYPES[type_name][2](dumped)
+
+
+def _make_reducer(type_name: str, dump: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    return lambda obj: (_load_snapshot_type, (type_name, dump(obj)))
+
+
+_SNAPSHOT_DISPATCH_TABLE = {
+    cls: _make_reducer(type_name, dump) for type_name, (cls, dump, _) in _SNAPSHOT_TYPES.items()
+}
+
+
+def dump_memory_snapshot(components: Dict[str, Any], output: BinaryIO) -> None:
+    state = {}
+    for component_name, attributes in COMPONENTS_STATE_ATTRIBUTES.items():
+        component = components[component_name]
+        # Only the memory blockstore can be snapshotted (e.g. RAID blockstore is not)
+        if component_name == "blockstore" and not isinstance(component, MemoryBlockStoreComponent):
+            continue
+        state[component_name] = {
+            attribute: getattr(component, attribute) for attribute in attributes
+        }
+
+    pickler = pickle.Pickler(output, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _SNAPSHOT_DISPATCH_TABLE
+    try:
+        pickler.dump({"parsec_version": parsec_version, "components": state})
+    except (pickle.PicklingError, TypeError, AttributeError) as exc:
+        raise MemorySnapshotError(f"Cannot snapshot memory backend state: {exc}") from exc
+
+
+def load_memory_snapshot(components: Dict[str, Any], input: BinaryIO) -> None:
+    """
+    Snapshot is a pickle, so it must only be loaded from a trusted source !
+    """
+    try:
+        snapshot = pickle.load(input)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as exc:
+        raise MemorySnapshotError(f"Invalid memory backend snapshot: {exc}") from exc
+
+    # Pickled objects are tied to the classes of the code base that created them
+    if snapshot.get("parsec_version") != parsec_version:
+        raise MemorySnapshotError(
+            f"Snapshot has been created by Parsec {snapshot.get('parsec_version')},"
+            f" cannot load it with Parsec {parsec_version}"
+        )
+
+    for component_name, attributes in snapshot["components"].items():
+        component = components[component_name]
+        for attribute, value in attributes.items():
+            setattr(component, attribute, value)
+
+
+def save_memory_snapshot_file(components: Dict[str, Any], path: Path) -> None:
+    # Write in a temporary file first so a crash doesn't corrupt the previous snapshot
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "wb") as fd:
+        dump_memory_snapshot(components, fd)
+    os.replace(tmp_path, path)
+
+
+def load_memory_snapshot_file(components: Dict[str, Any], path: Path) -> None:
+    with open(path, "rb") as fd:
+        load_memory_snapshot(components, fd)
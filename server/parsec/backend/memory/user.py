@@ -1,9 +1,20 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+from bisect import bisect
 from collections import defaultdict
 from copy import deepcopy
-from typing import TYPE_CHECKING, Any, Callable, Coroutine, Dict, Iterable, List, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    List,
+    Tuple,
+)
 
 import attr
 
@@ -38,11 +49,57 @@ if TYPE_CHECKING:
     from parsec.backend.memory.sequester import MemorySequesterComponent
 
 
+# Certificates with the same timestamp are ordered by priority (lower first)
+# Multiple certificates can have the same timestamp if they have been created
+# together: so far this is only the case for organization bootstrap and user creation.
+# In such cases the certificates should also be ordered by their types (e.g.
+# `UserCertificate` must always be before `DeviceCertificate`)
+SEQUESTER_AUTHORITY_CERTIFICATE_PRIORITY = 0  # Max prio
+USER_CERTIFICATE_PRIORITY = 1
+DEFAULT_CERTIFICATE_PRIORITY = 2
+
+
+@attr.s(slots=True)
+class CertificatesIndex:
+    """
+    Append-only index of the certificates of an organization, in the order they
+    are provided to the clients (i.e. by timestamp then priority).
+    """
+
+    # Sort keys are (timestamp, priority, sequence number)
+    keys: List[Tuple[DateTime, int, int]] = attr.ib(factory=list)
+    certificates: List[bytes] = attr.ib(factory=list)
+    redacted_certificates: List[bytes] = attr.ib(factory=list)
+
+    def add(
+        self,
+        timestamp: DateTime,
+        priority: int,
+        certificate: bytes,
+        redacted_certificate: bytes | None = None,
+    ) -> None:
+        key = (timestamp, priority, len(self.keys))
+        # Certificates are created in chronological order, so this is most of
+        # the time a simple append
+        position = bisect(self.keys, key)
+        self.keys.insert(position, key)
+        self.certificates.insert(position, certificate)
+        self.redacted_certificates.insert(position, redacted_certificate or certificate)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, offset: int, redacted: bool) -> List[bytes]:
+        certificates = self.redacted_certificates if redacted else self.certificates
+        return certificates[offset:]
+
+
 @attr.s
 class OrganizationStore:
     human_handle_to_user_id: Dict[HumanHandle, UserID] = attr.ib(factory=dict)
     users: Dict[UserID, User] = attr.ib(factory=dict)
     devices: Dict[UserID, Dict[DeviceName, Device]] = attr.ib(factory=lambda: defaultdict(dict))
+    certificates: CertificatesIndex = attr.ib(factory=CertificatesIndex)
 
 
 class MemoryUserComponent(BaseUserComponent):
@@ -67,20 +124,19 @@ class MemoryUserComponent(BaseUserComponent):
         self._sequester_component = sequester
 
     def get_current_certificate_index(self, organization_id: OrganizationID) -> int:
-        org = self._organizations[organization_id]
-
-        index = len(org.devices)
-
-        for user in org.users.values():
-            index += 2 if user.revoked_user_certificate else 1
-
-        for (realm_orgid, _), realm in self._realm_component._realms.items():
-            if realm_orgid != organization_id:
-                continue
-            for granted_role in realm.granted_roles:
-                index += len((granted_role.granted_on, granted_role.certificate))
+        return len(self._organizations[organization_id].certificates)
 
-        return index
+    def add_certificate(
+        self,
+        organization_id: OrganizationID,
+        timestamp: DateTime,
+        certificate: bytes,
+        redacted_certificate: bytes | None = None,
+        priority: int = DEFAULT_CERTIFICATE_PRIORITY,
+    ) -> None:
+        self._organizations[organization_id].certificates.add(
+            timestamp, priority, certificate, redacted_certificate
+        )
 
     async def notify_certificates_update(
         self,
@@ -118,6 +174,18 @@ class MemoryUserComponent(BaseUserComponent):
         org.devices[first_device.user_id][first_device.device_name] = first_device
         if user.human_handle:
             org.human_handle_to_user_id[user.human_handle] = user.user_id
+        org.certificates.add(
+            user.created_on,
+            USER_CERTIFICATE_PRIORITY,
+            user.user_certificate,
+            user.redacted_user_certificate,
+        )
+        org.certificates.add(
+            first_device.created_on,
+            DEFAULT_CERTIFICATE_PRIORITY,
+            first_device.device_certificate,
+            first_device.redacted_device_certificate,
+        )
 
         await self.notify_certificates_update(
             organization_id=organization_id,
@@ -141,6 +209,12 @@ class MemoryUserComponent(BaseUserComponent):
             raise UserAlreadyExistsError(f"Device `{device.device_id.str}` already exists")
 
         user_devices[device.device_name] = device
+        org.certificates.add(
+            device.created_on,
+            DEFAULT_CERTIFICATE_PRIORITY,
+            device.device_certificate,
+            device.redacted_device_certificate,
+        )
 
         await self.notify_certificates_update(
             organization_id=organization_id,
@@ -339,7 +413,9 @@ class MemoryUserComponent(BaseUserComponent):
         per_page: int = 100,
         omit_revoked: bool = False,
         omit_non_human: bool = False,
+        estimate_total: bool = False,
     ) -> Tuple[List[HumanFindResultItem], int]:
+        # Computing the exact total is cheap here, so `estimate_total` is ignored
         return self._find_humans(
             organization_id=organization_id,
             query=query,
@@ -376,6 +452,7 @@ class MemoryUserComponent(BaseUserComponent):
         )
         if user.human_handle:
             del org.human_handle_to_user_id[user.human_handle]
+        org.certificates.add(revoked_on, DEFAULT_CERTIFICATE_PRIORITY, revoked_user_certificate)
 
         await self.notify_certificates_update(
             organization_id=organization_id,
@@ -462,72 +539,29 @@ class MemoryUserComponent(BaseUserComponent):
             devices += user_devices.values()
         return list(org.users.values()), devices
 
+    async def iter_users(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[User]]:
+        users = list(self._organizations[organization_id].users.values())
+        for i in range(0, len(users), batch_size):
+            yield users[i : i + batch_size]
+
+    async def iter_devices(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[Device]]:
+        devices: List[Device] = []
+        for user_devices in self._organizations[organization_id].devices.values():
+            devices += user_devices.values()
+        for i in range(0, len(devices), batch_size):
+            yield devices[i : i + batch_size]
+
     async def get_certificates(
         self, organization_id: OrganizationID, offset: int, redacted: bool
     ) -> list[bytes]:
         """
         Raises: Nothing !
         """
-        certificates = []
-
-        # Certificates with the same timestamp will be ordered by priority (lower first)
-        # Multiple certificates can have the same timestamp if they have been created
-        # together: so far this is only the case for organization bootstrap and user creation.
-        # In such cases the events should also be ordered by they event types (e.g.
-        # `UserCertificate` must always be before `DeviceCertificate`)
-        SEQUESTER_AUTHORITY_PRIORITY = 0  # Max prio
-        USER_PRIORITY = 1
-        DEFAULT_PRIORITY = 2
-
-        # 1) Add sequester authority certificate
-        org = self._organization_component._organizations[organization_id]
-
-        # 2) Add sequester service certificates
-        if org.sequester_authority:
-            certificates.append(
-                (
-                    org.bootstrapped_on,
-                    SEQUESTER_AUTHORITY_PRIORITY,
-                    org.sequester_authority.certificate,
-                )
-            )
-            for service in self._sequester_component._services[organization_id].values():
-                certificates.append(
-                    (service.created_on, DEFAULT_PRIORITY, service.service_certificate)
-                )
-
-        # 3) Add user & revoked user certificates
-        org = self._organizations[organization_id]
-        for user in org.users.values():
-            certif = user.redacted_user_certificate if redacted else user.user_certificate
-            certificates.append((user.created_on, USER_PRIORITY, certif))
-            if user.revoked_user_certificate:
-                assert user.revoked_on is not None
-                certificates.append(
-                    (user.revoked_on, DEFAULT_PRIORITY, user.revoked_user_certificate)
-                )
-
-        # 4) Add device certificates
-        for devices in org.devices.values():
-            for device in devices.values():
-                certif = (
-                    device.redacted_device_certificate if redacted else device.device_certificate
-                )
-                certificates.append((device.created_on, DEFAULT_PRIORITY, certif))
-
-        # 5) Add realm role certificates
-        for (realm_orgid, _), realm in self._realm_component._realms.items():
-            if realm_orgid != organization_id:
-                continue
-            for granted_role in realm.granted_roles:
-                certificates.append(
-                    (granted_role.granted_on, DEFAULT_PRIORITY, granted_role.certificate)
-                )
-
-        # Sort certificates by timestamp... and also type (see priority) !
-        certificates.sort()
-
-        return [certif for _, _, certif in certificates[offset:]]
+        return self._organizations[organization_id].certificates.get(offset, redacted)
 
     def test_duplicate_organization(self, id: OrganizationID, new_id: OrganizationID) -> None:
         self._organizations[new_id] = deepcopy(self._organizations[id])
@@ -1,10 +1,13 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from collections import defaultdict
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
 from copy import deepcopy
 from dataclasses import dataclass
 from dataclasses import field as dataclass_field
+from functools import partial
+from itertools import islice
 from typing import TYPE_CHECKING, AbstractSet, Any, Callable, Coroutine, Dict, List, Tuple
 
 from parsec._parsec import (
@@ -54,17 +57,52 @@ class Vlob:
     realm_id: RealmID
     data: VlobData
     sequestered_data: SequesteredVlobData | None
+    # Versions' timestamps are increasing, so they can be bisected to find the
+    # version at a given time. Blobs' sizes are cumulated for the same reason.
+    _timestamps: List[DateTime] = dataclass_field(init=False, repr=False)
+    _cumulative_sizes: List[int] = dataclass_field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._timestamps = []
+        self._cumulative_sizes = []
+        for blob, _, timestamp, _ in self.data:
+            self._index_version(blob, timestamp)
+
+    def _index_version(self, blob: bytes, timestamp: DateTime) -> None:
+        self._timestamps.append(timestamp)
+        previous_size = self._cumulative_sizes[-1] if self._cumulative_sizes else 0
+        self._cumulative_sizes.append(previous_size + len(blob))
 
     @property
     def current_version(self) -> int:
         return len(self.data)
 
+    @property
+    def size(self) -> int:
+        return self._cumulative_sizes[-1] if self._cumulative_sizes else 0
+
+    def append(
+        self, blob: bytes, author: DeviceID, timestamp: DateTime, certificate_index: int
+    ) -> None:
+        self.data.append((blob, author, timestamp, certificate_index))
+        self._index_version(blob, timestamp)
+
+    def version_at(self, timestamp: DateTime) -> int:
+        # Last version created at or before `timestamp`, 0 if none
+        return bisect_right(self._timestamps, timestamp)
+
+    def size_at(self, timestamp: DateTime) -> int:
+        version = self.version_at(timestamp)
+        return self._cumulative_sizes[version - 1] if version else 0
+
 
 class Reencryption:
     def __init__(self, realm_id: RealmID, vlobs: Dict[VlobID, Vlob]):
         self.realm_id = realm_id
         self._original_vlobs = vlobs
-        self._todo: Dict[Tuple[VlobID, int], bytes] = {}
+        # `OrderedDict` is used as a work queue: unlike `dict`, iterating over it
+        # doesn't have to skip the (numerous) slots of the already removed items
+        self._todo: OrderedDict[Tuple[VlobID, int], bytes] = OrderedDict()
         self._done: Dict[Tuple[VlobID, int], bytes] = {}
         for vlob_id, vlob in vlobs.items():
             for index, (data, _, _, _) in enumerate(vlob.data):
@@ -75,23 +113,15 @@ class Reencryption:
     def get_reencrypted_vlobs(self) -> Dict[VlobID, Vlob]:
         assert self.is_finished()
         vlobs = {}
-        for (vlob_id, version), data in sorted(self._done.items()):
-            try:
-                (_, author, timestamp, certificate_index) = self._original_vlobs[vlob_id].data[
-                    version - 1
-                ]
-
-            except KeyError:
-                raise VlobNotFoundError()
-
-            if vlob_id not in vlobs:
-                # Force `sequestered_data` field to `None` as it is not used here
-                vlobs[vlob_id] = Vlob(
-                    self.realm_id, [(data, author, timestamp, certificate_index)], None
+        for vlob_id, original_vlob in self._original_vlobs.items():
+            data = [
+                (self._done[(vlob_id, version)], author, timestamp, certificate_index)
+                for version, (_, author, timestamp, certificate_index) in enumerate(
+                    original_vlob.data, 1
                 )
-            else:
-                vlobs[vlob_id].data.append((data, author, timestamp, certificate_index))
-            assert len(vlobs[vlob_id].data) == version
+            ]
+            # Force `sequestered_data` field to `None` as it is not used here
+            vlobs[vlob_id] = Vlob(self.realm_id, data, None)
 
         return vlobs
 
@@ -99,22 +129,19 @@ class Reencryption:
         return not self._todo
 
     def get_batch(self, size: int) -> List[Tuple[VlobID, int, bytes]]:
-        batch = []
-        for (vlob_id, version), data in self._todo.items():
-            if (vlob_id, version) in self._done:
-                continue
-            batch.append((vlob_id, version, data))
-        return batch[:size]
+        # Items are removed from `_todo` once done, so the batch is simply its head
+        return [
+            (vlob_id, version, data)
+            for (vlob_id, version), data in islice(self._todo.items(), size)
+        ]
 
     def save_batch(self, batch: List[Tuple[VlobID, int, bytes]]) -> Tuple[int, int]:
         for vlob_id, version, data in batch:
             key = (vlob_id, version)
-            if key in self._done:
-                continue
             try:
                 del self._todo[key]
             except KeyError:
-                # Unknown item, just ignore it just like we do in PostgreSQL
+                # Unknown or already done item, just ignore it just like we do in PostgreSQL
                 continue
             self._done[key] = data
 
@@ -136,9 +163,12 @@ class MemoryVlobComponent(BaseVlobComponent):
         self._user_component: MemoryUserComponent | None = None
         self._realm_component: MemoryRealmComponent | None = None
         self._sequester_component: MemorySequesterComponent | None = None
-        self._vlobs: Dict[Tuple[OrganizationID, VlobID], Vlob] = {}
-        self._per_realm_changes: Dict[Tuple[OrganizationID, RealmID], Changes] = defaultdict(
-            Changes
+        # Data is partitioned per organization, so that organization-wide
+        # operations don't have to go through the other organizations' data
+        self._vlobs: Dict[OrganizationID, Dict[VlobID, Vlob]] = defaultdict(dict)
+        self._per_realm_changes: Dict[OrganizationID, Dict[RealmID, Changes]] = defaultdict(
+            # No lambda as default factory given it cannot be pickled in memory snapshot
+            partial(defaultdict, Changes)
         )
 
     def register_components(
@@ -157,36 +187,62 @@ class MemoryVlobComponent(BaseVlobComponent):
     def _maintenance_reencryption_start_hook(
         self, organization_id: OrganizationID, realm_id: RealmID, encryption_revision: int
     ) -> None:
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         assert not changes.reencryption
         realm_vlobs = {
             vlob_id: vlob
-            for (org_id, vlob_id), vlob in self._vlobs.items()
-            if org_id == organization_id and vlob.realm_id == realm_id
+            for vlob_id, vlob in self._vlobs[organization_id].items()
+            if vlob.realm_id == realm_id
         }
         changes.reencryption = Reencryption(realm_id, realm_vlobs)
 
     def _maintenance_reencryption_is_finished_hook(
         self, organization_id: OrganizationID, realm_id: RealmID, encryption_revision: int
     ) -> bool:
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         assert changes.reencryption
         if not changes.reencryption.is_finished():
             return False
 
         realm_vlobs = changes.reencryption.get_reencrypted_vlobs()
-        for vlob_id, vlob in realm_vlobs.items():
-            self._vlobs[(organization_id, vlob_id)] = vlob
+        self._vlobs[organization_id].update(realm_vlobs)
         changes.reencryption = None
         return True
 
     def _get_vlob(self, organization_id: OrganizationID, vlob_id: VlobID) -> Vlob:
         try:
-            return self._vlobs[(organization_id, vlob_id)]
+            return self._vlobs[organization_id][vlob_id]
 
         except KeyError:
             raise VlobNotFoundError(f"Vlob `{vlob_id.hex}` doesn't exist")
 
+    def _read_vlob_version(
+        self, vlob: Vlob, realm: "Realm", version: int | None, timestamp: DateTime | None
+    ) -> Tuple[int, bytes, DeviceID, DateTime, DateTime, int]:
+        if version is None:
+            if timestamp is None:
+                version = vlob.current_version
+            else:
+                version = vlob.version_at(timestamp)
+                if not version:
+                    raise VlobVersionError()
+        try:
+            vlob_data, vlob_device_id, vlob_timestamp, certificate_index = vlob.data[version - 1]
+            last_role = realm.get_last_role(vlob_device_id.user_id)
+            # Given the vlob exists, the author must have had a role
+            assert last_role is not None
+            return (
+                version,
+                vlob_data,
+                vlob_device_id,
+                vlob_timestamp,
+                last_role.granted_on,
+                certificate_index,
+            )
+
+        except IndexError:
+            raise VlobVersionError()
+
     def _check_sequestered_organization(
         self,
         organization_id: OrganizationID,
@@ -394,7 +450,7 @@ class MemoryVlobComponent(BaseVlobComponent):
     def _get_last_vlob_update(
         self, organization_id: OrganizationID, realm_id: RealmID, user_id: UserID
     ) -> DateTime | None:
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         return changes.last_vlob_update_per_user.get(user_id)
 
     async def _update_changes(
@@ -406,7 +462,7 @@ class MemoryVlobComponent(BaseVlobComponent):
         timestamp: DateTime,
         src_version: int = 1,
     ) -> None:
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         changes.checkpoint += 1
         changes.changes[src_id] = (author, changes.checkpoint, src_version)
 
@@ -454,13 +510,13 @@ class MemoryVlobComponent(BaseVlobComponent):
         if extracted_sequestered_data is not None:
             sequestered_data = [extracted_sequestered_data]
 
-        key = (organization_id, vlob_id)
-        if key in self._vlobs:
+        org_vlobs = self._vlobs[organization_id]
+        if vlob_id in org_vlobs:
             raise VlobAlreadyExistsError()
 
         certificate_index = self._user_component.get_current_certificate_index(organization_id)
 
-        self._vlobs[key] = Vlob(
+        org_vlobs[vlob_id] = Vlob(
             realm_id, [(blob, author, timestamp, certificate_index)], sequestered_data
         )
 
@@ -481,32 +537,27 @@ class MemoryVlobComponent(BaseVlobComponent):
             organization_id, vlob.realm_id, author.user_id, encryption_revision, timestamp
         )
 
-        if version is None:
-            if timestamp is None:
-                version = vlob.current_version
-            else:
-                for i in range(vlob.current_version, 0, -1):
-                    if vlob.data[i - 1][2] <= timestamp:
-                        version = i
-                        break
-                else:
-                    raise VlobVersionError()
-        try:
-            vlob_data, vlob_device_id, vlob_timestamp, certificate_index = vlob.data[version - 1]
-            last_role = realm.get_last_role(vlob_device_id.user_id)
-            # Given the vlob exists, the author must have had a role
-            assert last_role is not None
-            return (
-                version,
-                vlob_data,
-                vlob_device_id,
-                vlob_timestamp,
-                last_role.granted_on,
-                certificate_index,
-            )
+        return self._read_vlob_version(vlob, realm, version, timestamp)
 
-        except IndexError:
-            raise VlobVersionError()
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: RealmID,
+        encryption_revision: int,
+        items: List[Tuple[VlobID, int | None, DateTime | None]],
+    ) -> List[Tuple[int, bytes, DeviceID, DateTime, DateTime, int]]:
+        realm = self._check_realm_read_access(
+            organization_id, realm_id, author.user_id, encryption_revision, None
+        )
+
+        results = []
+        for vlob_id, version, timestamp in items:
+            vlob = self._get_vlob(organization_id, vlob_id)
+            if vlob.realm_id != realm_id:
+                raise VlobNotFoundError(f"Vlob `{vlob_id.hex}` doesn't exist")
+            results.append(self._read_vlob_version(vlob, realm, version, timestamp))
+        return results
 
     async def update(
         self,
@@ -543,7 +594,7 @@ class MemoryVlobComponent(BaseVlobComponent):
 
         certificate_index = self._user_component.get_current_certificate_index(organization_id)
 
-        vlob.data.append((blob, author, timestamp, certificate_index))
+        vlob.append(blob, author, timestamp, certificate_index)
         if sequestered_data is not None:  # /!\ We want to accept empty dicts !
             assert vlob.sequestered_data is not None
             vlob.sequestered_data.append(sequestered_data)
@@ -552,12 +603,85 @@ class MemoryVlobComponent(BaseVlobComponent):
             organization_id, author, vlob.realm_id, vlob_id, timestamp, version
         )
 
+    async def write_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: RealmID,
+        encryption_revision: int,
+        timestamp: DateTime,
+        items: List[Tuple[VlobID, int, bytes, Dict[SequesterServiceID, bytes] | None]],
+    ) -> None:
+        assert self._user_component is not None
+
+        self._check_realm_write_access(
+            organization_id, realm_id, author.user_id, encryption_revision, timestamp
+        )
+
+        # Check all the items before modifying anything, so the batch is atomic
+        org_vlobs = self._vlobs[organization_id]
+        if len({vlob_id for vlob_id, _, _, _ in items}) != len(items):
+            raise VlobVersionError()
+        for vlob_id, version, _, _ in items:
+            if version == 1:
+                if vlob_id in org_vlobs:
+                    raise VlobAlreadyExistsError()
+            else:
+                vlob = self._get_vlob(organization_id, vlob_id)
+                if vlob.realm_id != realm_id:
+                    raise VlobNotFoundError(f"Vlob `{vlob_id.hex}` doesn't exist")
+                if version - 1 != vlob.current_version:
+                    raise VlobVersionError()
+                if timestamp < vlob.data[vlob.current_version - 1][2]:
+                    raise VlobRequireGreaterTimestampError(vlob.data[vlob.current_version - 1][2])
+
+        for _, _, _, sequester_blob in items:
+            self._check_sequestered_organization(
+                organization_id=organization_id,
+                expect_sequestered_organization=sequester_blob is not None,
+                expect_active_sequester_services=(
+                    sequester_blob.keys() if sequester_blob is not None else set()
+                ),
+            )
+
+        # Webhooks are only called once the whole batch is known to be valid
+        sequestered_datas = [
+            await self._extract_sequestered_data_and_proceed_webhook(
+                organization_id=organization_id,
+                author=author,
+                encryption_revision=encryption_revision,
+                vlob_id=vlob_id,
+                timestamp=timestamp,
+                sequester_blob=sequester_blob,
+            )
+            for vlob_id, _, _, sequester_blob in items
+        ]
+
+        certificate_index = self._user_component.get_current_certificate_index(organization_id)
+        for (vlob_id, version, blob, _), sequestered_data in zip(items, sequestered_datas):
+            if version == 1:
+                org_vlobs[vlob_id] = Vlob(
+                    realm_id,
+                    [(blob, author, timestamp, certificate_index)],
+                    None if sequestered_data is None else [sequestered_data],
+                )
+            else:
+                vlob = org_vlobs[vlob_id]
+                vlob.append(blob, author, timestamp, certificate_index)
+                if sequestered_data is not None:  # /!\ We want to accept empty dicts !
+                    assert vlob.sequestered_data is not None
+                    vlob.sequestered_data.append(sequestered_data)
+
+            await self._update_changes(
+                organization_id, author, realm_id, vlob_id, timestamp, version
+            )
+
     async def poll_changes(
         self, organization_id: OrganizationID, author: DeviceID, realm_id: RealmID, checkpoint: int
     ) -> Tuple[int, Dict[VlobID, int]]:
         self._check_realm_read_access(organization_id, realm_id, author.user_id, None, None)
 
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         changes_since_checkpoint = {
             src_id: src_version
             for src_id, (_, change_checkpoint, src_version) in changes.changes.items()
@@ -585,7 +709,7 @@ class MemoryVlobComponent(BaseVlobComponent):
             organization_id, realm_id, author.user_id, encryption_revision
         )
 
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         assert changes.reencryption
 
         return changes.reencryption.get_batch(size)
@@ -602,7 +726,7 @@ class MemoryVlobComponent(BaseVlobComponent):
             organization_id, realm_id, author.user_id, encryption_revision
         )
 
-        changes = self._per_realm_changes[(organization_id, realm_id)]
+        changes = self._per_realm_changes[organization_id][realm_id]
         assert changes.reencryption
 
         total, done = changes.reencryption.save_batch(batch)
@@ -610,29 +734,9 @@ class MemoryVlobComponent(BaseVlobComponent):
         return total, done
 
     def test_duplicate_organization(self, id: OrganizationID, new_id: OrganizationID) -> None:
-        self._vlobs.update(
-            {
-                (new_id, vlob_id): deepcopy(vlob)
-                for (candidate_org_id, vlob_id), vlob in self._vlobs.items()
-                if candidate_org_id == id
-            }
-        )
-        self._per_realm_changes.update(
-            {
-                (new_id, realm_id): deepcopy(changes)
-                for (candidate_org_id, realm_id), changes in self._per_realm_changes.items()
-                if candidate_org_id == id
-            }
-        )
+        self._vlobs[new_id] = deepcopy(self._vlobs[id])
+        self._per_realm_changes[new_id] = deepcopy(self._per_realm_changes[id])
 
     def test_drop_organization(self, id: OrganizationID) -> None:
-        self._vlobs = {
-            (candidate_org_id, vlob_id): vlob
-            for (candidate_org_id, vlob_id), vlob in self._vlobs.items()
-            if candidate_org_id != id
-        }
-        self._per_realm_changes = {
-            (candidate_org_id, realm_id): changes
-            for (candidate_org_id, realm_id), changes in self._per_realm_changes.items()
-            if candidate_org_id != id
-        }
+        self._vlobs.pop(id, None)
+        self._per_realm_changes.pop(id, None)
@@ -55,7 +55,9 @@ async def components_factory(  # type: ignore[misc]
     block = PGBlockComponent(dbh=dbh, blockstore_component=blockstore)
     pki = PGPkiEnrollmentComponent(dbh)
     sequester = PGPSequesterComponent(dbh)
-    events = EventsComponent(realm_component=realm, send_event=_send_event)
+    events = EventsComponent(
+        realm_component=realm, send_event=_send_event, sse_keepalive=config.sse_keepalive
+    )
 
     components = {
         "events": events,
@@ -79,8 +81,10 @@ async def components_factory(  # type: ignore[misc]
 
     async with open_service_nursery() as nursery:
         await dbh.init(nursery=nursery, events_component=events)
+        nursery.start_soon(events.sse_keepalive_scheduler.run)
         try:
             yield components
 
         finally:
             await dbh.teardown()
+            nursery.cancel_scope.cancel()
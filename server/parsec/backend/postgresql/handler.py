@@ -264,28 +264,67 @@ class PGHandler:
     def _on_notification(
         self, conn: triopg._triopg.TrioConnectionProxy, pid: int, channel: str, payload: str
     ) -> None:
-        try:
-            event_id, raw_event = payload.split(":")
-            event = BackendEvent.load(b64decode(raw_event.encode("ascii")))
-        except ValueError as exc:
-            logger.warning(
-                "Invalid notif received", pid=pid, channel=channel, payload=payload, exc_info=exc
-            )
-            return
+        # A single notification can contain multiple events (see `send_signals`)
+        for raw_item in payload.split(";"):
+            try:
+                event_id, raw_event = raw_item.split(":")
+                event = BackendEvent.load(b64decode(raw_event.encode("ascii")))
+            except ValueError as exc:
+                logger.warning(
+                    "Invalid notif received",
+                    pid=pid,
+                    channel=channel,
+                    payload=raw_item,
+                    exc_info=exc,
+                )
+                # Other events packed in the same notification are still valid
+                continue
 
-        if self._events_component:
-            self._events_component.add_event_to_cache(event_id, event)
-        self.event_bus.send(type(event), event_id=event_id, payload=event)
+            if self._events_component:
+                self._events_component.add_event_to_cache(event_id, event)
+            self.event_bus.send(type(event), event_id=event_id, payload=event)
 
     async def teardown(self) -> None:
         if self._task_status:
             await self._task_status.cancel_and_join()
 
 
-async def send_signal(conn: triopg._triopg.TrioConnectionProxy, event: BackendEvent) -> None:
+def _dump_signal(event: BackendEvent) -> str:
     # PostgreSQL's NOTIFY only accept string as payload, hence we must
     # use base64 on our payload...
     raw_event = b64encode(event.dump()).decode("ascii")
     event_id = uuid4().hex
-    payload = f"{event_id}:{raw_event}"
-    await conn.execute("SELECT pg_notify($1, $2)", "app_notification", payload)
+    return f"{event_id}:{raw_event}"
+
+
+async def send_signal(conn: triopg._triopg.TrioConnectionProxy, event: BackendEvent) -> None:
+    await conn.execute("SELECT pg_notify($1, $2)", "app_notification", _dump_signal(event))
+
+
+# PostgreSQL's NOTIFY payload must be shorter than 8000 bytes
+NOTIFY_PAYLOAD_MAX_SIZE = 7900
+
+
+async def send_signals(
+    conn: triopg._triopg.TrioConnectionProxy, events: Iterable[BackendEvent]
+) -> None:
+    """
+    Send multiple events with as few notifications as possible
+    """
+    payloads: List[str] = []
+    current: List[str] = []
+    current_size = 0
+    for event in events:
+        item = _dump_signal(event)
+        # `+ 1` for the `;` separator
+        if current and current_size + len(item) + 1 > NOTIFY_PAYLOAD_MAX_SIZE:
+            payloads.append(";".join(current))
+            current = []
+            current_size = 0
+        current.append(item)
+        current_size += len(item) + 1
+    if current:
+        payloads.append(";".join(current))
+
+    for payload in payloads:
+        await conn.execute("SELECT pg_notify($1, $2)", "app_notification", payload)
@@ -0,0 +1,17 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+-------------------------------------------------------
+--  Migration
+-------------------------------------------------------
+
+-- `human_find` does case insensitive substring search (i.e. `ILIKE '%foo%bar%'`)
+-- on human label/email and on user ID for non-human users. A B-tree index
+-- cannot be used for this kind of pattern, but a trigram one can.
+-- Note `pg_trgm` is a trusted extension (PostgreSQL>=13) so it can be created
+-- by the database owner without superuser privileges.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX human_label_trgm_idx ON human USING GIN (label gin_trgm_ops);
+CREATE INDEX human_email_trgm_idx ON human USING GIN (email gin_trgm_ops);
+CREATE INDEX user_user_id_trgm_idx ON user_ USING GIN (user_id gin_trgm_ops);
@@ -0,0 +1,22 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+-------------------------------------------------------
+--  Migration
+-------------------------------------------------------
+
+-- `vlob_list_versions` and `vlob_update` look for the versions of a vlob given
+-- its organization and ID, which the `(vlob_encryption_revision, vlob_id, version)`
+-- unique constraint cannot serve. Including the returned columns in the index
+-- allows index-only scans instead of fetching the (large) vlob atoms rows.
+
+CREATE INDEX vlob_atom_organization_vlob_id_version_idx
+ON vlob_atom (organization, vlob_id, version DESC) INCLUDE (author, created_on);
+
+-- `vlob_poll_changes` walks the realm's updates past a checkpoint, then joins the
+-- vlob atoms only to retrieve their vlob ID and version. The `(realm, index)`
+-- unique constraint is replaced by an equivalent unique index also covering
+-- the joined vlob atom.
+
+CREATE UNIQUE INDEX realm_vlob_update_realm_index_idx
+ON realm_vlob_update (realm, index) INCLUDE (vlob_atom);
+ALTER TABLE realm_vlob_update DROP CONSTRAINT realm_vlob_update_realm_index_key;
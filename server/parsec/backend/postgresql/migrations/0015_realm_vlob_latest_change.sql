@@ -0,0 +1,34 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+-------------------------------------------------------
+--  Migration
+-------------------------------------------------------
+
+-- `vlob_poll_changes` only returns the last version of each vlob changed since
+-- the checkpoint. Instead of going through all the realm's updates (i.e. one per
+-- vlob version) we keep track of the last change of each vlob, so polling goes
+-- through at most one row per vlob.
+
+CREATE TABLE realm_vlob_latest_change (
+    _id SERIAL PRIMARY KEY,
+    realm INTEGER REFERENCES realm (_id) NOT NULL,
+    vlob_id UUID NOT NULL,
+    version INTEGER NOT NULL,
+    -- `realm_vlob_update.index` of the change
+    index INTEGER NOT NULL,
+
+    UNIQUE(realm, vlob_id)
+);
+
+CREATE INDEX realm_vlob_latest_change_realm_index_idx
+ON realm_vlob_latest_change (realm, index) INCLUDE (vlob_id, version);
+
+INSERT INTO realm_vlob_latest_change (realm, vlob_id, version, index)
+SELECT DISTINCT ON (realm_vlob_update.realm, vlob_atom.vlob_id)
+    realm_vlob_update.realm,
+    vlob_atom.vlob_id,
+    vlob_atom.version,
+    realm_vlob_update.index
+FROM realm_vlob_update
+INNER JOIN vlob_atom ON realm_vlob_update.vlob_atom = vlob_atom._id
+ORDER BY realm_vlob_update.realm, vlob_atom.vlob_id, realm_vlob_update.index DESC;
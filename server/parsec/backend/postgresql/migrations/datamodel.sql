@@ -110,6 +110,13 @@ ALTER TABLE user_
 ADD CONSTRAINT FK_user_device_revoked_user_certifier FOREIGN KEY (revoked_user_certifier) REFERENCES device (_id);
 
 
+-- Trigram indexes used by `human_find` substring search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX human_label_trgm_idx ON human USING GIN (label gin_trgm_ops);
+CREATE INDEX human_email_trgm_idx ON human USING GIN (email gin_trgm_ops);
+CREATE INDEX user_user_id_trgm_idx ON user_ USING GIN (user_id gin_trgm_ops);
+
+
 CREATE TYPE invitation_type AS ENUM ('USER', 'DEVICE');
 CREATE TYPE invitation_deleted_reason AS ENUM ('FINISHED', 'CANCELLED', 'ROTTEN');
 CREATE TYPE invitation_conduit_state AS ENUM (
@@ -292,16 +299,38 @@ CREATE TABLE vlob_atom (
     UNIQUE(vlob_encryption_revision, vlob_id, version)
 );
 
+-- Covering index used by `vlob_list_versions` and `vlob_update`
+CREATE INDEX vlob_atom_organization_vlob_id_version_idx
+ON vlob_atom (organization, vlob_id, version DESC) INCLUDE (author, created_on);
+
 
 CREATE TABLE realm_vlob_update (
     _id SERIAL PRIMARY KEY,
     realm INTEGER REFERENCES realm (_id) NOT NULL,
     index INTEGER NOT NULL,
-    vlob_atom INTEGER REFERENCES vlob_atom (_id) NOT NULL,
+    vlob_atom INTEGER REFERENCES vlob_atom (_id) NOT NULL
+);
+
+CREATE UNIQUE INDEX realm_vlob_update_realm_index_idx
+ON realm_vlob_update (realm, index) INCLUDE (vlob_atom);
+
 
-    UNIQUE(realm, index)
+-- Last change of each vlob, so that `vlob_poll_changes` doesn't have to go
+-- through every version changed since the checkpoint
+CREATE TABLE realm_vlob_latest_change (
+    _id SERIAL PRIMARY KEY,
+    realm INTEGER REFERENCES realm (_id) NOT NULL,
+    vlob_id UUID NOT NULL,
+    version INTEGER NOT NULL,
+    -- `realm_vlob_update.index` of the change
+    index INTEGER NOT NULL,
+
+    UNIQUE(realm, vlob_id)
 );
 
+CREATE INDEX realm_vlob_latest_change_realm_index_idx
+ON realm_vlob_latest_change (realm, index) INCLUDE (vlob_id, version);
+
 
 CREATE TABLE sequester_service_vlob_atom(
     _id SERIAL PRIMARY KEY,
@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List
 
 from parsec._parsec import DateTime, DeviceID, OrganizationID, RealmID, RealmRole, UserID
 from parsec.backend.postgresql.handler import PGHandler
@@ -10,6 +10,7 @@ from parsec.backend.postgresql.realm_queries import (
     query_dump_realms_granted_roles,
     query_finish_reencryption_maintenance,
     query_get_current_roles,
+    query_get_organization_realms_granted_roles_batch,
     query_get_realms_for_user,
     query_get_role_certificates,
     query_get_stats,
@@ -106,3 +107,21 @@ class PGRealmComponent(BaseRealmComponent):
     ) -> List[RealmGrantedRole]:
         async with self.dbh.pool.acquire() as conn:
             return await query_dump_realms_granted_roles(conn, organization_id)
+
+    async def iter_realms_granted_roles(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[RealmGrantedRole]]:
+        batch_offset_marker = 0
+        while True:
+            # Connection is only held during the fetch of a batch, not while
+            # the caller is processing it
+            async with self.dbh.pool.acquire() as conn:
+                (
+                    batch,
+                    batch_offset_marker,
+                ) = await query_get_organization_realms_granted_roles_batch(
+                    conn, organization_id, batch_offset_marker, batch_size
+                )
+            if not batch:
+                return
+            yield batch
@@ -5,6 +5,7 @@ from parsec.backend.postgresql.realm_queries.create import query_create
 from parsec.backend.postgresql.realm_queries.get import (
     query_dump_realms_granted_roles,
     query_get_current_roles,
+    query_get_organization_realms_granted_roles_batch,
     query_get_realms_for_user,
     query_get_role_certificates,
     query_get_stats,
@@ -24,6 +25,7 @@ __all__ = (
     "query_get_role_certificates",
     "query_get_realms_for_user",
     "query_dump_realms_granted_roles",
+    "query_get_organization_realms_granted_roles_batch",
     "query_update_roles",
     "query_start_reencryption_maintenance",
     "query_finish_reencryption_maintenance",
@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import triopg
 
@@ -112,6 +112,7 @@ ORDER BY realm, certified_on DESC
 _q_get_organization_realms_granted_roles = Q(
     f"""
 SELECT
+    realm_user_role._id,
     realm.realm_id,
     { q_user(_id="realm_user_role.user_", select="user_id") } as user_id,
     role,
@@ -123,6 +124,9 @@ INNER JOIN realm
 ON realm_user_role.realm = realm._id
 WHERE
     realm.organization = { q_organization_internal_id("$organization_id") }
+    AND realm_user_role._id > $batch_offset_marker
+ORDER BY realm_user_role._id
+LIMIT $batch_size
 """
 )
 
@@ -245,25 +249,50 @@ async def query_get_realms_for_user(
     }
 
 
+@query()
+async def query_get_organization_realms_granted_roles_batch(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    batch_offset_marker: int = 0,
+    batch_size: int = 1000,
+) -> Tuple[List[RealmGrantedRole], int]:
+    """
+    Returns a batch of granted roles and the marker to provide to fetch the next batch.
+    """
+    rows = await conn.fetch(
+        *_q_get_organization_realms_granted_roles(
+            organization_id=organization_id.str,
+            batch_offset_marker=batch_offset_marker,
+            batch_size=batch_size,
+        )
+    )
+    granted_roles = [
+        RealmGrantedRole(
+            certificate=row["certificate"],
+            realm_id=RealmID.from_hex(row["realm_id"]),
+            user_id=UserID(row["user_id"]),
+            role=RealmRole.from_str(row["role"]) if row["role"] is not None else None,
+            granted_by=DeviceID(row["granted_by"]),
+            granted_on=row["granted_on"],
+        )
+        for row in rows
+    ]
+    return granted_roles, rows[-1]["_id"] if rows else batch_offset_marker
+
+
 @query()
 async def query_dump_realms_granted_roles(
     conn: triopg._triopg.TrioConnectionProxy, organization_id: OrganizationID
 ) -> List[RealmGrantedRole]:
-    granted_roles = []
-    rows = await conn.fetch(
-        *_q_get_organization_realms_granted_roles(organization_id=organization_id.str)
-    )
+    granted_roles: List[RealmGrantedRole] = []
 
-    for row in rows:
-        granted_roles.append(
-            RealmGrantedRole(
-                certificate=row["certificate"],
-                realm_id=RealmID.from_hex(row["realm_id"]),
-                user_id=UserID(row["user_id"]),
-                role=RealmRole.from_str(row["role"]),
-                granted_by=DeviceID(row["granted_by"]),
-                granted_on=row["granted_on"],
-            )
+    batch_offset_marker = 0
+    while True:
+        batch, batch_offset_marker = await query_get_organization_realms_granted_roles_batch(
+            conn, organization_id, batch_offset_marker
         )
+        if not batch:
+            break
+        granted_roles += batch
 
     return granted_roles
@@ -1,15 +1,25 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Any, List, Tuple
+from typing import Any, AsyncIterator, List, Tuple, Type
 
-from parsec._parsec import DateTime, DeviceID, OrganizationID, UserID
+from parsec._parsec import (
+    BackendEvent,
+    BackendEventUserUpdatedOrRevoked,
+    DateTime,
+    DeviceID,
+    OrganizationID,
+    UserID,
+)
 from parsec.backend.postgresql.handler import PGHandler
 from parsec.backend.postgresql.user_queries import (
+    TrustchainCache,
     query_create_device,
     query_create_user,
     query_dump_users,
     query_find_humans,
+    query_get_organization_devices_batch,
+    query_get_organization_users_batch,
     query_get_user,
     query_get_user_with_device,
     query_get_user_with_device_and_trustchain,
@@ -31,6 +41,18 @@ class PGUserComponent(BaseUserComponent):
     def __init__(self, dbh: PGHandler, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self.dbh = dbh
+        self._trustchain_cache = TrustchainCache()
+
+        def _on_user_updated_or_revoked(
+            event: Type[BackendEvent], event_id: str, payload: BackendEventUserUpdatedOrRevoked
+        ) -> None:
+            # Revocation is the only change that can alter a trustchain
+            self._trustchain_cache.invalidate(payload.organization_id)
+
+        self._event_bus.connect(
+            BackendEventUserUpdatedOrRevoked,
+            _on_user_updated_or_revoked,  # type: ignore[arg-type]
+        )
 
     async def create_user(
         self, organization_id: OrganizationID, user: User, first_device: Device
@@ -52,20 +74,28 @@ class PGUserComponent(BaseUserComponent):
         self, organization_id: OrganizationID, user_id: UserID
     ) -> Tuple[User, Trustchain]:
         async with self.dbh.pool.acquire() as conn:
-            return await query_get_user_with_trustchain(conn, organization_id, user_id)
+            return await query_get_user_with_trustchain(
+                conn, organization_id, user_id, trustchain_cache=self._trustchain_cache
+            )
 
     async def get_user_with_device_and_trustchain(
         self, organization_id: OrganizationID, device_id: DeviceID
     ) -> Tuple[User, Device, Trustchain]:
         async with self.dbh.pool.acquire() as conn:
-            return await query_get_user_with_device_and_trustchain(conn, organization_id, device_id)
+            return await query_get_user_with_device_and_trustchain(
+                conn, organization_id, device_id, trustchain_cache=self._trustchain_cache
+            )
 
     async def get_user_with_devices_and_trustchain(
         self, organization_id: OrganizationID, user_id: UserID, redacted: bool = False
     ) -> GetUserAndDevicesResult:
         async with self.dbh.pool.acquire() as conn:
             return await query_get_user_with_devices_and_trustchain(
-                conn, organization_id, user_id, redacted=redacted
+                conn,
+                organization_id,
+                user_id,
+                redacted=redacted,
+                trustchain_cache=self._trustchain_cache,
             )
 
     async def get_user_with_device(
@@ -82,6 +112,7 @@ class PGUserComponent(BaseUserComponent):
         per_page: int = 100,
         omit_revoked: bool = False,
         omit_non_human: bool = False,
+        estimate_total: bool = False,
     ) -> Tuple[List[HumanFindResultItem], int]:
         async with self.dbh.pool.acquire() as conn:
             return await query_find_humans(
@@ -92,6 +123,7 @@ class PGUserComponent(BaseUserComponent):
                 per_page=per_page,
                 omit_revoked=omit_revoked,
                 omit_non_human=omit_non_human,
+                estimate_total=estimate_total,
             )
 
     async def revoke_user(
@@ -115,3 +147,31 @@ class PGUserComponent(BaseUserComponent):
     async def dump_users(self, organization_id: OrganizationID) -> Tuple[List[User], List[Device]]:
         async with self.dbh.pool.acquire() as conn:
             return await query_dump_users(conn, organization_id)
+
+    async def iter_users(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[User]]:
+        batch_offset_marker = 0
+        while True:
+            # Connection is only held during the fetch of a batch, not while
+            # the caller is processing it
+            async with self.dbh.pool.acquire() as conn:
+                batch, batch_offset_marker = await query_get_organization_users_batch(
+                    conn, organization_id, batch_offset_marker, batch_size
+                )
+            if not batch:
+                return
+            yield batch
+
+    async def iter_devices(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[Device]]:
+        batch_offset_marker = 0
+        while True:
+            async with self.dbh.pool.acquire() as conn:
+                batch, batch_offset_marker = await query_get_organization_devices_batch(
+                    conn, organization_id, batch_offset_marker, batch_size
+                )
+            if not batch:
+                return
+            yield batch
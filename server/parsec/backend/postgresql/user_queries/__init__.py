@@ -4,7 +4,10 @@ from __future__ import annotations
 from parsec.backend.postgresql.user_queries.create import query_create_device, query_create_user
 from parsec.backend.postgresql.user_queries.find import query_find_humans
 from parsec.backend.postgresql.user_queries.get import (
+    TrustchainCache,
     query_dump_users,
+    query_get_organization_devices_batch,
+    query_get_organization_users_batch,
     query_get_user,
     query_get_user_with_device,
     query_get_user_with_device_and_trustchain,
@@ -23,5 +26,8 @@ __all__ = (
     "query_get_user_with_devices_and_trustchain",
     "query_get_user_with_device",
     "query_dump_users",
+    "query_get_organization_users_batch",
+    "query_get_organization_devices_batch",
     "query_revoke_user",
+    "TrustchainCache",
 )
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import triopg
 
@@ -37,8 +37,35 @@ LIMIT 1
 )
 
 
-@lru_cache
-def _q_human_factory(with_query: bool, omit_revoked: bool, omit_non_human: bool) -> Q:
+# Each branch of the union is a plain `ILIKE` on a single column so that the
+# trigram indexes (see migration 0013) can be used
+_q_users_matching_query = f"""
+SELECT user_._id
+FROM user_ INNER JOIN human ON user_.human = human._id
+WHERE
+    human.organization = { q_organization_internal_id("$organization_id") }
+    AND human.label ILIKE $query
+UNION
+SELECT user_._id
+FROM user_ INNER JOIN human ON user_.human = human._id
+WHERE
+    human.organization = { q_organization_internal_id("$organization_id") }
+    AND human.email ILIKE $query
+UNION
+SELECT _id
+FROM user_
+WHERE
+    organization = { q_organization_internal_id("$organization_id") }
+    AND human IS NULL
+    AND user_id ILIKE $query
+"""
+
+
+# Above this number of results, the estimated total stops being counted
+HUMAN_FIND_MAX_COUNTED_TOTAL = 1000
+
+
+def _human_conditions(with_query: bool, omit_revoked: bool, omit_non_human: bool) -> str:
     conditions = []
     if omit_revoked:
         conditions.append("AND (user_.revoked_on IS NULL OR user_.revoked_on > $now)")
@@ -46,8 +73,52 @@ def _q_human_factory(with_query: bool, omit_revoked: bool, omit_non_human: bool)
     if omit_non_human:
         conditions.append("AND user_.human IS NOT NULL")
     if with_query:
-        conditions.append(
-            "AND (((COALESCE(human.label,'') ILIKE $query) OR (COALESCE(human.email,'') ILIKE $query)) OR (human.label is NULL AND user_.user_id ILIKE $query))"
+        conditions.append(f"AND user_._id IN ({_q_users_matching_query})")
+    return " ".join(conditions)
+
+
+@lru_cache
+def _q_human_capped_count_factory(with_query: bool, omit_revoked: bool, omit_non_human: bool) -> Q:
+    # The `LIMIT` in the sub-query allows to stop going through the results early
+    return Q(
+        f"""
+SELECT count(*)
+FROM (
+    SELECT 1
+    FROM user_ LEFT JOIN human ON user_.human=human._id
+    WHERE
+        user_.organization = { q_organization_internal_id("$organization_id") }
+        { _human_conditions(with_query, omit_revoked, omit_non_human) }
+    LIMIT $max_total
+) AS capped_results
+"""
+    )
+
+
+@lru_cache
+def _q_human_factory(
+    with_query: bool, omit_revoked: bool, omit_non_human: bool, estimate_total: bool
+) -> Q:
+    conditions = _human_conditions(with_query, omit_revoked, omit_non_human)
+
+    if estimate_total:
+        # No total count here: we retrieve one more row than needed to know
+        # if there is a next page, the total being counted separately only if needed.
+        return Q(
+            f"""
+SELECT
+    user_.user_id AS user_id,
+    human.email AS email,
+    human.label AS label,
+    user_.revoked_on IS NOT NULL AND user_.revoked_on <= $now AS is_revoked
+FROM user_ LEFT JOIN human ON user_.human=human._id
+WHERE
+    user_.organization = { q_organization_internal_id("$organization_id") }
+    { conditions }
+ORDER BY LOWER(human.label) NULLS LAST
+LIMIT $limit + 1
+OFFSET $offset
+"""
         )
 
     # Query with pagination & total result not trivial in SQL:
@@ -71,7 +142,7 @@ WITH full_results AS (
     FROM user_ LEFT JOIN human ON user_.human=human._id
     WHERE
         user_.organization = { q_organization_internal_id("$organization_id") }
-        { " ".join(conditions) }
+        { conditions }
     ORDER BY LOWER(human.label) NULLS LAST
 )
 (
@@ -127,14 +198,24 @@ async def query_find_humans(
     page: int = 1,
     per_page: int = 100,
     query: str | None = None,
+    estimate_total: bool = False,
 ) -> Tuple[List[HumanFindResultItem], int]:
+    """
+    If `estimate_total` is set, the total is only counted up to
+    `HUMAN_FIND_MAX_COUNTED_TOTAL` results (instead of going through all of them):
+    above that, it is exact on the last page, otherwise it only guarantees there
+    is at least one more page.
+    """
     if page >= 1:
         offset = (page - 1) * per_page
     else:
         return ([], 0)
 
     q = _q_human_factory(
-        with_query=bool(query), omit_revoked=omit_revoked, omit_non_human=omit_non_human
+        with_query=bool(query),
+        omit_revoked=omit_revoked,
+        omit_non_human=omit_non_human,
+        estimate_total=estimate_total,
     )
     if query:
         args = q(
@@ -153,6 +234,37 @@ async def query_find_humans(
         )
 
     raw_results = await conn.fetch(*args)
+
+    if estimate_total:
+        results = [
+            HumanFindResultItem(
+                user_id=UserID(user_id),
+                human_handle=HumanHandle(email=email, label=label) if email else None,
+                revoked=is_revoked,
+            )
+            for user_id, email, label, is_revoked in raw_results[:per_page]
+        ]
+        if 0 < len(raw_results) <= per_page:
+            # Last page, the total is known without counting
+            return results, offset + len(raw_results)
+
+        q = _q_human_capped_count_factory(
+            with_query=bool(query), omit_revoked=omit_revoked, omit_non_human=omit_non_human
+        )
+        # Unlike the results query, `$now` is only needed to omit revoked users
+        count_kwargs: Dict[str, Any] = {
+            "organization_id": organization_id.str,
+            "max_total": HUMAN_FIND_MAX_COUNTED_TOTAL,
+        }
+        if query:
+            count_kwargs["query"] = _escape_sql_like_arg(query)
+        if omit_revoked:
+            count_kwargs["now"] = DateTime.now()
+        total = await conn.fetchval(*q(**count_kwargs))
+        if total >= HUMAN_FIND_MAX_COUNTED_TOTAL:
+            total = max(total, offset + len(raw_results))
+        return results, total
+
     total = raw_results[0]["total"]
     results = [
         HumanFindResultItem(
@@ -1,7 +1,8 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import List, Tuple
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Tuple
 
 import triopg
 
@@ -26,6 +27,7 @@ from parsec.backend.user import Device, GetUserAndDevicesResult, Trustchain, Use
 _q_get_organization_users = Q(
     f"""
 SELECT
+    _id,
     user_id,
     { q_human(_id="user_.human", select="email") } as human_email,
     { q_human(_id="user_.human", select="label") } as human_label,
@@ -40,6 +42,9 @@ SELECT
 FROM user_
 WHERE
     organization = { q_organization_internal_id("$organization_id") }
+    AND _id > $batch_offset_marker
+ORDER BY _id
+LIMIT $batch_size
 """
 )
 
@@ -68,6 +73,7 @@ WHERE
 _q_get_organization_devices = Q(
     f"""
 SELECT
+    _id,
     device_id,
     device_label,
     device_certificate,
@@ -77,6 +83,9 @@ SELECT
 FROM device
 WHERE
     organization = { q_organization_internal_id("$organization_id") }
+    AND _id > $batch_offset_marker
+ORDER BY _id
+LIMIT $batch_size
 """
 )
 
@@ -262,29 +271,134 @@ async def _get_device(
     )
 
 
-async def _get_trustchain(
+# Trustchain of a single device: user, revoked user and device certificates
+# reachable from it, indexed by internal ids to merge chains without duplicates
+_DeviceTrustchain = Tuple[Dict[int, bytes], Dict[int, bytes], Dict[int, bytes]]
+
+TRUSTCHAIN_CACHE_MAX_SIZE = 10000
+
+
+class TrustchainCache:
+    """
+    Memoize the trustchain of devices so that the hot user lookup path doesn't
+    have to run the recursive trustchain query each time.
+
+    Certificates are immutable, so the only thing that can alter a trustchain
+    is the revocation of a user in it: the cache is then invalidated for the
+    whole organization (see `invalidate`, which should be connected to
+    `BackendEventUserUpdatedOrRevoked`).
+    """
+
+    def __init__(self, max_size: int = TRUSTCHAIN_CACHE_MAX_SIZE) -> None:
+        self._max_size = max_size
+        self._entries: OrderedDict[
+            Tuple[OrganizationID, DeviceID, bool], _DeviceTrustchain
+        ] = OrderedDict()
+        # Incremented on each invalidation, this allows to detect a trustchain
+        # fetched while a revocation was taking place, so it doesn't get cached
+        self._generations: Dict[OrganizationID, int] = defaultdict(int)
+
+    def generation(self, organization_id: OrganizationID) -> int:
+        return self._generations[organization_id]
+
+    def get(
+        self, organization_id: OrganizationID, device_id: DeviceID, redacted: bool
+    ) -> _DeviceTrustchain | None:
+        key = (organization_id, device_id, redacted)
+        trustchain = self._entries.get(key)
+        if trustchain is not None:
+            self._entries.move_to_end(key)
+        return trustchain
+
+    def set(
+        self,
+        organization_id: OrganizationID,
+        device_id: DeviceID,
+        redacted: bool,
+        trustchain: _DeviceTrustchain,
+        generation: int,
+    ) -> None:
+        if self._generations[organization_id] != generation:
+            return
+        self._entries[(organization_id, device_id, redacted)] = trustchain
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, organization_id: OrganizationID) -> None:
+        self._generations[organization_id] += 1
+        for key in [key for key in self._entries if key[0] == organization_id]:
+            del self._entries[key]
+
+
+async def _fetch_device_trustchain(
     conn: triopg._triopg.TrioConnectionProxy,
     organization_id: OrganizationID,
-    *device_ids: DeviceID | None,
-    redacted: bool = False,
-) -> Trustchain:
+    device_ids: List[DeviceID],
+) -> Tuple[_DeviceTrustchain, _DeviceTrustchain]:
+    """
+    Returns the trustchain of the given devices, both non-redacted and redacted
+    """
     rows = await conn.fetch(
         *_q_get_trustchain(
             organization_id=organization_id.str,
-            device_ids=[d.str for d in device_ids if d is not None],
+            device_ids=[d.str for d in device_ids],
         )
     )
-    user_certif_field = "redacted_user_certificate" if redacted else "user_certificate"
-    device_certif_field = "redacted_device_certificate" if redacted else "device_certificate"
 
-    users = {}
-    revoked_users = {}
-    devices = {}
+    users: Dict[int, bytes] = {}
+    redacted_users: Dict[int, bytes] = {}
+    revoked_users: Dict[int, bytes] = {}
+    devices: Dict[int, bytes] = {}
+    redacted_devices: Dict[int, bytes] = {}
     for row in rows:
-        users[row["_uid"]] = row[user_certif_field]
+        users[row["_uid"]] = row["user_certificate"]
+        redacted_users[row["_uid"]] = row["redacted_user_certificate"]
         if row["revoked_user_certificate"] is not None:
             revoked_users[row["_uid"]] = row["revoked_user_certificate"]
-        devices[row["_did"]] = row[device_certif_field]
+        devices[row["_did"]] = row["device_certificate"]
+        redacted_devices[row["_did"]] = row["redacted_device_certificate"]
+
+    return (users, revoked_users, devices), (redacted_users, revoked_users, redacted_devices)
+
+
+async def _get_trustchain(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    *device_ids: DeviceID | None,
+    redacted: bool = False,
+    trustchain_cache: TrustchainCache | None = None,
+) -> Trustchain:
+    unique_device_ids = list(dict.fromkeys(d for d in device_ids if d is not None))
+
+    chains: List[_DeviceTrustchain] = []
+    if trustchain_cache is None:
+        trustchain, redacted_trustchain = await _fetch_device_trustchain(
+            conn, organization_id, unique_device_ids
+        )
+        chains.append(redacted_trustchain if redacted else trustchain)
+
+    else:
+        for device_id in unique_device_ids:
+            cached = trustchain_cache.get(organization_id, device_id, redacted)
+            if cached is None:
+                generation = trustchain_cache.generation(organization_id)
+                trustchain, redacted_trustchain = await _fetch_device_trustchain(
+                    conn, organization_id, [device_id]
+                )
+                trustchain_cache.set(organization_id, device_id, False, trustchain, generation)
+                trustchain_cache.set(
+                    organization_id, device_id, True, redacted_trustchain, generation
+                )
+                cached = redacted_trustchain if redacted else trustchain
+            chains.append(cached)
+
+    users: Dict[int, bytes] = {}
+    revoked_users: Dict[int, bytes] = {}
+    devices: Dict[int, bytes] = {}
+    for chain_users, chain_revoked_users, chain_devices in chains:
+        users.update(chain_users)
+        revoked_users.update(chain_revoked_users)
+        devices.update(chain_devices)
 
     return Trustchain(
         users=list(users.values()),
@@ -322,16 +436,24 @@ async def query_get_user(
 
 @query(in_transaction=True)
 async def query_get_user_with_trustchain(
-    conn: triopg._triopg.TrioConnectionProxy, organization_id: OrganizationID, user_id: UserID
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    user_id: UserID,
+    trustchain_cache: TrustchainCache | None = None,
 ) -> Tuple[User, Trustchain]:
     user = await _get_user(conn, organization_id, user_id)
-    trustchain = await _get_trustchain(conn, organization_id, user.user_certifier)
+    trustchain = await _get_trustchain(
+        conn, organization_id, user.user_certifier, trustchain_cache=trustchain_cache
+    )
     return user, trustchain
 
 
 @query(in_transaction=True)
 async def query_get_user_with_device_and_trustchain(
-    conn: triopg._triopg.TrioConnectionProxy, organization_id: OrganizationID, device_id: DeviceID
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    device_id: DeviceID,
+    trustchain_cache: TrustchainCache | None = None,
 ) -> Tuple[User, Device, Trustchain]:
     user = await _get_user(conn, organization_id, device_id.user_id)
     user_device = await _get_device(conn, organization_id, device_id)
@@ -341,6 +463,7 @@ async def query_get_user_with_device_and_trustchain(
         user.user_certifier,
         user.revoked_user_certifier,
         user_device.device_certifier,
+        trustchain_cache=trustchain_cache,
     )
     return user, user_device, trustchain
 
@@ -351,6 +474,7 @@ async def query_get_user_with_devices_and_trustchain(
     organization_id: OrganizationID,
     user_id: UserID,
     redacted: bool = False,
+    trustchain_cache: TrustchainCache | None = None,
 ) -> GetUserAndDevicesResult:
     user = await _get_user(conn, organization_id, user_id)
     user_devices = await _get_user_devices(conn, organization_id, user_id)
@@ -361,6 +485,7 @@ async def query_get_user_with_devices_and_trustchain(
         user.revoked_user_certifier,
         *[device.device_certifier for device in user_devices],
         redacted=redacted,
+        trustchain_cache=trustchain_cache,
     )
     return GetUserAndDevicesResult(
         user_certificate=user.redacted_user_certificate if redacted else user.user_certificate,
@@ -417,45 +542,99 @@ async def query_get_user_with_device(
     return user, device
 
 
+@query()
+async def query_get_organization_users_batch(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    batch_offset_marker: int = 0,
+    batch_size: int = 1000,
+) -> Tuple[List[User], int]:
+    """
+    Returns a batch of users and the marker to provide to fetch the next batch.
+    """
+    rows = await conn.fetch(
+        *_q_get_organization_users(
+            organization_id=organization_id.str,
+            batch_offset_marker=batch_offset_marker,
+            batch_size=batch_size,
+        )
+    )
+    users = [
+        User(
+            user_id=UserID(row["user_id"]),
+            human_handle=HumanHandle(email=row["human_email"], label=row["human_label"])
+            if row["human_email"]
+            else None,
+            initial_profile=UserProfile.from_str(row["profile"]),
+            user_certificate=row["user_certificate"],
+            redacted_user_certificate=row["redacted_user_certificate"],
+            user_certifier=DeviceID(row["user_certifier"]) if row["user_certifier"] else None,
+            created_on=row["created_on"],
+            revoked_on=row["revoked_on"],
+            revoked_user_certificate=row["revoked_user_certificate"],
+            revoked_user_certifier=DeviceID(row["revoked_user_certifier"])
+            if row["revoked_user_certifier"]
+            else None,
+        )
+        for row in rows
+    ]
+    return users, rows[-1]["_id"] if rows else batch_offset_marker
+
+
+@query()
+async def query_get_organization_devices_batch(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    batch_offset_marker: int = 0,
+    batch_size: int = 1000,
+) -> Tuple[List[Device], int]:
+    """
+    Returns a batch of devices and the marker to provide to fetch the next batch.
+    """
+    rows = await conn.fetch(
+        *_q_get_organization_devices(
+            organization_id=organization_id.str,
+            batch_offset_marker=batch_offset_marker,
+            batch_size=batch_size,
+        )
+    )
+    devices = [
+        Device(
+            device_id=DeviceID(row["device_id"]),
+            device_label=DeviceLabel(row["device_label"]) if row["device_label"] else None,
+            device_certificate=row["device_certificate"],
+            redacted_device_certificate=row["redacted_device_certificate"],
+            device_certifier=DeviceID(row["device_certifier"]) if row["device_certifier"] else None,
+            created_on=row["created_on"],
+        )
+        for row in rows
+    ]
+    return devices, rows[-1]["_id"] if rows else batch_offset_marker
+
+
 @query()
 async def query_dump_users(
     conn: triopg._triopg.TrioConnectionProxy, organization_id: OrganizationID
 ) -> Tuple[List[User], List[Device]]:
-    users = []
-    devices = []
+    users: List[User] = []
+    devices: List[Device] = []
 
-    rows = await conn.fetch(*_q_get_organization_users(organization_id=organization_id.str))
-    for row in rows:
-        users.append(
-            User(
-                user_id=UserID(row["user_id"]),
-                human_handle=HumanHandle(email=row["human_email"], label=row["human_label"]),
-                initial_profile=UserProfile.from_str(row["profile"]),
-                user_certificate=row["user_certificate"],
-                redacted_user_certificate=row["redacted_user_certificate"],
-                user_certifier=DeviceID(row["user_certifier"]) if row["user_certifier"] else None,
-                created_on=row["created_on"],
-                revoked_on=row["revoked_on"],
-                revoked_user_certificate=row["revoked_user_certificate"],
-                revoked_user_certifier=DeviceID(row["revoked_user_certifier"])
-                if row["revoked_user_certifier"]
-                else None,
-            )
+    batch_offset_marker = 0
+    while True:
+        batch, batch_offset_marker = await query_get_organization_users_batch(
+            conn, organization_id, batch_offset_marker
         )
-
-    rows = await conn.fetch(*_q_get_organization_devices(organization_id=organization_id.str))
-    for row in rows:
-        devices.append(
-            Device(
-                device_id=DeviceID(row["device_id"]),
-                device_label=DeviceLabel(row["device_label"]),
-                device_certificate=row["device_certificate"],
-                redacted_device_certificate=row["redacted_device_certificate"],
-                device_certifier=DeviceID(row["device_certifier"])
-                if row["device_certifier"]
-                else None,
-                created_on=row["created_on"],
-            )
+        if not batch:
+            break
+        users += batch
+
+    batch_offset_marker = 0
+    while True:
+        batch_devices, batch_offset_marker = await query_get_organization_devices_batch(
+            conn, organization_id, batch_offset_marker
         )
+        if not batch_devices:
+            break
+        devices += batch_devices
 
     return users, devices
@@ -10,12 +10,14 @@ from parsec.backend.organization import SequesterAuthority
 from parsec.backend.postgresql.handler import PGHandler, retry_on_unique_violation
 from parsec.backend.postgresql.sequester import get_sequester_authority, get_sequester_services
 from parsec.backend.postgresql.vlob_queries import (
+    query_check_write_batch,
     query_create,
     query_list_versions,
     query_maintenance_get_reencryption_batch,
     query_maintenance_save_reencryption_batch,
     query_poll_changes,
     query_update,
+    query_write_batch,
 )
 from parsec.backend.sequester import BaseSequesterService, SequesterDisabledError
 from parsec.backend.vlob import (
@@ -45,6 +47,16 @@ async def _check_sequestered_organization(
             conn=conn, organization_id=organization_id, with_disabled=False
         )
     }
+    _check_sequester_blob(sequester_authority, configured_services, sequester_blob)
+
+    return configured_services
+
+
+def _check_sequester_blob(
+    sequester_authority: SequesterAuthority,
+    configured_services: Dict[SequesterServiceID, BaseSequesterService],
+    sequester_blob: Dict[SequesterServiceID, bytes] | None,
+) -> None:
     requested_sequester_services = sequester_blob.keys() if sequester_blob is not None else set()
 
     if configured_services.keys() != requested_sequester_services:
@@ -55,8 +67,6 @@ async def _check_sequestered_organization(
             ],
         )
 
-    return configured_services
-
 
 class PGVlobComponent(BaseVlobComponent):
     def __init__(self, dbh: PGHandler):
@@ -202,6 +212,97 @@ class PGVlobComponent(BaseVlobComponent):
                 sequester_blob,
             )
 
+    async def write_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: RealmID,
+        encryption_revision: int,
+        timestamp: DateTime,
+        items: List[Tuple[VlobID, int, bytes, Dict[SequesterServiceID, bytes] | None]],
+    ) -> None:
+        async with self.dbh.pool.acquire() as conn:
+            await query_check_write_batch(
+                conn,
+                organization_id,
+                author,
+                realm_id,
+                encryption_revision,
+                timestamp,
+                items,
+            )
+
+            # Sequester configuration is fetched once and checked against every item
+            sequester_authority = await self._get_sequester_organization_authority(
+                conn, organization_id
+            )
+            services: Dict[SequesterServiceID, BaseSequesterService] | None = None
+            for _, _, _, sequester_blob in items:
+                if services is None:
+                    services = await _check_sequestered_organization(
+                        conn,
+                        organization_id=organization_id,
+                        sequester_authority=sequester_authority,
+                        sequester_blob=sequester_blob,
+                    )
+                else:
+                    assert sequester_authority is not None
+                    _check_sequester_blob(sequester_authority, services, sequester_blob)
+
+        # Webhooks are only called once the whole batch is known to be valid, and
+        # outside of any transaction given they can take a long time
+        sequestered_items = []
+        for vlob_id, version, blob, sequester_blob in items:
+            if sequester_blob and services:
+                sequester_blob = await extract_sequestered_data_and_proceed_webhook(
+                    services,
+                    organization_id,
+                    author,
+                    encryption_revision,
+                    vlob_id,
+                    timestamp,
+                    sequester_blob,
+                )
+            else:
+                sequester_blob = None
+            sequestered_items.append((vlob_id, version, blob, sequester_blob))
+
+        await self._write_batch(
+            organization_id, author, realm_id, encryption_revision, timestamp, sequestered_items
+        )
+
+    @retry_on_unique_violation
+    async def _write_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: RealmID,
+        encryption_revision: int,
+        timestamp: DateTime,
+        items: List[Tuple[VlobID, int, bytes, Dict[SequesterServiceID, bytes] | None]],
+    ) -> None:
+        # Retrying only the write means the webhooks are not called again, however
+        # the vlobs may have been modified since the first check
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
+            await query_check_write_batch(
+                conn,
+                organization_id,
+                author,
+                realm_id,
+                encryption_revision,
+                timestamp,
+                items,
+            )
+            await query_write_batch(
+                conn,
+                organization_id,
+                author,
+                realm_id,
+                encryption_revision,
+                timestamp,
+                items,
+            )
+
     async def poll_changes(
         self, organization_id: OrganizationID, author: DeviceID, realm_id: RealmID, checkpoint: int
     ) -> Tuple[int, Dict[VlobID, int]]:
@@ -9,15 +9,24 @@ from parsec.backend.postgresql.vlob_queries.read import (
     query_list_versions,
     query_poll_changes,
     query_read,
+    query_read_batch,
+)
+from parsec.backend.postgresql.vlob_queries.write import (
+    query_check_write_batch,
+    query_create,
+    query_update,
+    query_write_batch,
 )
-from parsec.backend.postgresql.vlob_queries.write import query_create, query_update
 
 __all__ = (
     "query_update",
     "query_maintenance_save_reencryption_batch",
     "query_maintenance_get_reencryption_batch",
     "query_read",
+    "query_read_batch",
     "query_poll_changes",
     "query_list_versions",
     "query_create",
+    "query_check_write_batch",
+    "query_write_batch",
 )
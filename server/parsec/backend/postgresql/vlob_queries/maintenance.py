@@ -53,6 +53,10 @@ LIMIT $size
 )
 
 
+# The whole batch is saved with a single statement. `DISTINCT ON` ensures only the
+# first occurrence of a duplicated `(vlob_id, version)` in the batch is taken into
+# account (and that a vlob atom present in multiple previous encryption revisions
+# is only reencrypted once).
 _q_maintenance_save_reencryption_batch = Q(
     f"""
 INSERT INTO vlob_atom(
@@ -66,8 +70,8 @@ INSERT INTO vlob_atom(
     created_on,
     deleted_on
 )
-SELECT
-    organization,
+SELECT DISTINCT ON (batch.vlob_id, batch.version)
+    vlob_atom.organization,
     {
         q_vlob_encryption_revision_internal_id(
             organization_id="$organization_id",
@@ -75,18 +79,21 @@ SELECT
             encryption_revision="$encryption_revision",
         )
     },
-    $vlob_id,
-    $version,
-    $blob,
-    $blob_len,
-    author,
-    created_on,
-    deleted_on
-FROM vlob_atom
-WHERE
-    organization = { q_organization_internal_id("$organization_id") }
-    AND vlob_id = $vlob_id
-    AND version = $version
+    batch.vlob_id,
+    batch.version,
+    batch.blob,
+    octet_length(batch.blob),
+    vlob_atom.author,
+    vlob_atom.created_on,
+    vlob_atom.deleted_on
+FROM UNNEST($vlob_ids::UUID[], $versions::INTEGER[], $blobs::BYTEA[])
+    WITH ORDINALITY AS batch(vlob_id, version, blob, position)
+INNER JOIN vlob_atom
+ON
+    vlob_atom.organization = { q_organization_internal_id("$organization_id") }
+    AND vlob_atom.vlob_id = batch.vlob_id
+    AND vlob_atom.version = batch.version
+ORDER BY batch.vlob_id, batch.version, batch.position
 ON CONFLICT DO NOTHING
 """
 )
@@ -169,16 +176,15 @@ async def query_maintenance_save_reencryption_batch(
     await _check_realm_and_maintenance_access(
         conn, organization_id, author, realm_id, encryption_revision
     )
-    for vlob_id, version, blob in batch:
+    if batch:
         await conn.execute(
             *_q_maintenance_save_reencryption_batch(
                 organization_id=organization_id.str,
                 realm_id=realm_id,
-                vlob_id=vlob_id,
-                version=version,
                 encryption_revision=encryption_revision,
-                blob=blob,
-                blob_len=len(blob),
+                vlob_ids=[vlob_id for vlob_id, _, _ in batch],
+                versions=[version for _, version, _ in batch],
+                blobs=[blob for _, _, blob in batch],
             )
         )
 
@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 import triopg
 
@@ -152,14 +152,99 @@ async def query_read(
     return version, blob, vlob_author, created_on, author_last_role_granted_on
 
 
+# Each item is looked up on its own (i.e. `LATERAL`) given it can be read either at
+# its last version, at a given version or at a given timestamp
+_q_read_data_batch = Q(
+    f"""
+SELECT
+    item.position,
+    atom.version,
+    atom.blob,
+    { q_device(_id="atom.author", select="device_id") } as author,
+    atom.created_on
+FROM UNNEST(
+    $vlob_ids::UUID[], $versions::INTEGER[], $timestamps::TIMESTAMPTZ[]
+) WITH ORDINALITY AS item(vlob_id, version, timestamp, position)
+LEFT JOIN LATERAL (
+    SELECT
+        version,
+        blob,
+        author,
+        created_on
+    FROM vlob_atom
+    WHERE
+        vlob_encryption_revision = {
+            q_vlob_encryption_revision_internal_id(
+                organization_id="$organization_id",
+                realm_id="$realm_id",
+                encryption_revision="$encryption_revision",
+            )
+        }
+        AND vlob_id = item.vlob_id
+        AND (item.version IS NULL OR version = item.version)
+        AND (item.timestamp IS NULL OR created_on <= item.timestamp)
+    ORDER BY version DESC
+    LIMIT 1
+) AS atom ON TRUE
+ORDER BY item.position
+"""
+)
+
+
+@query(in_transaction=True)
+async def query_read_batch(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    author: DeviceID,
+    realm_id: RealmID,
+    encryption_revision: int,
+    items: List[Tuple[VlobID, int | None, DateTime | None]],
+) -> List[Tuple[int, bytes, DeviceID, DateTime, DateTime]]:
+    await _check_realm_and_read_access(conn, organization_id, author, realm_id, encryption_revision)
+
+    rows = await conn.fetch(
+        *_q_read_data_batch(
+            organization_id=organization_id.str,
+            realm_id=realm_id,
+            encryption_revision=encryption_revision,
+            vlob_ids=[vlob_id for vlob_id, _, _ in items],
+            versions=[version for _, version, _ in items],
+            timestamps=[timestamp for _, _, timestamp in items],
+        )
+    )
+
+    results = []
+    authors_last_role_granted_on: Dict[DeviceID, DateTime] = {}
+    for (vlob_id, _, _), (_, version, blob, vlob_author, created_on) in zip(items, rows):
+        if version is None:
+            # Missing vlob or version ?
+            vlob_realm_id = await _get_realm_id_from_vlob_id(conn, organization_id, vlob_id)
+            if vlob_realm_id != realm_id:
+                raise VlobNotFoundError(f"Vlob `{vlob_id.hex}` doesn't exist")
+            raise VlobVersionError()
+
+        vlob_author = DeviceID(vlob_author)
+        try:
+            author_last_role_granted_on = authors_last_role_granted_on[vlob_author]
+        except KeyError:
+            author_last_role_granted_on = await _get_last_role_granted_on(
+                conn, organization_id, realm_id, vlob_author
+            )
+            assert isinstance(author_last_role_granted_on, DateTime)
+            authors_last_role_granted_on[vlob_author] = author_last_role_granted_on
+
+        results.append((version, blob, vlob_author, created_on, author_last_role_granted_on))
+
+    return results
+
+
 _q_poll_changes = Q(
     f"""
 SELECT
     index,
     vlob_id,
-    vlob_atom.version
-FROM realm_vlob_update
-LEFT JOIN vlob_atom ON realm_vlob_update.vlob_atom = vlob_atom._id
+    version
+FROM realm_vlob_latest_change
 WHERE
     realm = { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") }
     AND index > $checkpoint
@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Dict
+from typing import Dict, List, Tuple
 
 import triopg
 from triopg import UniqueViolationError
@@ -15,7 +15,7 @@ from parsec._parsec import (
     SequesterServiceID,
     VlobID,
 )
-from parsec.backend.postgresql.handler import send_signal
+from parsec.backend.postgresql.handler import send_signal, send_signals
 from parsec.backend.postgresql.utils import (
     Q,
     q_device_internal_id,
@@ -31,6 +31,7 @@ from parsec.backend.postgresql.vlob_queries.utils import (
 )
 from parsec.backend.vlob import (
     VlobAlreadyExistsError,
+    VlobError,
     VlobNotFoundError,
     VlobRequireGreaterTimestampError,
     VlobVersionError,
@@ -54,6 +55,21 @@ RETURNING index
 )
 
 
+_q_set_vlob_latest_change = Q(
+    f"""
+INSERT INTO realm_vlob_latest_change (realm, vlob_id, version, index)
+VALUES (
+    { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") },
+    $vlob_id,
+    $version,
+    $index
+)
+ON CONFLICT (realm, vlob_id)
+DO UPDATE SET version = EXCLUDED.version, index = EXCLUDED.index
+"""
+)
+
+
 _q_set_last_vlob_update = Q(
     f"""
 INSERT INTO realm_user_change(realm, user_, last_role_change, last_vlob_update)
@@ -93,6 +109,16 @@ async def _set_vlob_updated(
         )
     )
 
+    await conn.execute(
+        *_q_set_vlob_latest_change(
+            organization_id=organization_id.str,
+            realm_id=realm_id,
+            vlob_id=src_id,
+            version=src_version,
+            index=index,
+        )
+    )
+
     await conn.execute(
         *_q_set_last_vlob_update(
             organization_id=organization_id.str,
@@ -210,15 +236,14 @@ async def query_update(
         raise VlobVersionError()
 
     if sequester_blob:
-        for service_id, blob in sequester_blob.items():
-            await conn.fetchval(
-                *_q_create_sequester_blob(
-                    organization_id=organization_id.str,
-                    service_id=service_id,
-                    vlob_atom_internal_id=vlob_atom_internal_id,
-                    blob=blob,
-                )
-            )
+        await _create_sequester_blobs(
+            conn,
+            organization_id,
+            [
+                (vlob_atom_internal_id, service_id, service_blob)
+                for service_id, service_blob in sequester_blob.items()
+            ],
+        )
     await _set_vlob_updated(
         conn, vlob_atom_internal_id, organization_id, author, realm_id, vlob_id, timestamp, version
     )
@@ -256,22 +281,48 @@ RETURNING _id
 )
 
 
-_q_create_sequester_blob = Q(
+_q_create_sequester_blobs = Q(
     f"""
-    INSERT INTO sequester_service_vlob_atom(service, vlob_atom, blob)
-    SELECT
-        (SELECT _id
-            FROM sequester_service
-            WHERE
-                sequester_service.service_id=$service_id
-                AND sequester_service.organization={ q_organization_internal_id("$organization_id") }),
-        $vlob_atom_internal_id,
-        $blob
-    RETURNING _id
-    """
+INSERT INTO sequester_service_vlob_atom(service, vlob_atom, blob)
+SELECT
+    sequester_service._id,
+    item.vlob_atom,
+    item.blob
+FROM UNNEST(
+    $vlob_atom_internal_ids::INTEGER[], $service_ids::UUID[], $blobs::BYTEA[]
+) AS item(vlob_atom, service_id, blob)
+INNER JOIN sequester_service
+ON
+    sequester_service.service_id = item.service_id
+    AND sequester_service.organization = { q_organization_internal_id("$organization_id") }
+"""
 )
 
 
+async def _create_sequester_blobs(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    items: List[Tuple[int, SequesterServiceID, bytes]],
+) -> None:
+    """
+    Insert the sequester blobs of any number of vlob atoms in a single statement,
+    each item being `(vlob_atom_internal_id, service_id, blob)`
+    """
+    if not items:
+        return
+    result = await conn.execute(
+        *_q_create_sequester_blobs(
+            organization_id=organization_id.str,
+            vlob_atom_internal_ids=[vlob_atom_internal_id for vlob_atom_internal_id, _, _ in items],
+            service_ids=[service_id for _, service_id, _ in items],
+            blobs=[blob for _, _, blob in items],
+        )
+    )
+    # Services have been checked beforehand, so none of them should have been left out
+    if result != f"INSERT 0 {len(items)}":
+        raise VlobError(f"Insertion error: {result}")
+
+
 @query(in_transaction=True)
 async def query_create(
     conn: triopg._triopg.TrioConnectionProxy,
@@ -307,15 +358,234 @@ async def query_create(
         raise VlobAlreadyExistsError()
 
     if sequester_blob:
-        for service_id, blob in sequester_blob.items():
-            await conn.fetchval(
-                *_q_create_sequester_blob(
-                    organization_id=organization_id.str,
-                    service_id=service_id,
-                    vlob_atom_internal_id=vlob_atom_internal_id,
-                    blob=blob,
-                )
-            )
+        await _create_sequester_blobs(
+            conn,
+            organization_id,
+            [
+                (vlob_atom_internal_id, service_id, service_blob)
+                for service_id, service_blob in sequester_blob.items()
+            ],
+        )
     await _set_vlob_updated(
         conn, vlob_atom_internal_id, organization_id, author, realm_id, vlob_id, timestamp
     )
+
+
+_q_get_vlobs_last_version = Q(
+    f"""
+SELECT DISTINCT ON (vlob_atom.vlob_id)
+    vlob_atom.vlob_id,
+    vlob_atom.version,
+    vlob_atom.created_on,
+    realm.realm_id
+FROM vlob_atom
+INNER JOIN vlob_encryption_revision
+ON vlob_atom.vlob_encryption_revision = vlob_encryption_revision._id
+INNER JOIN realm
+ON vlob_encryption_revision.realm = realm._id
+WHERE
+    vlob_atom.organization = { q_organization_internal_id("$organization_id") }
+    AND vlob_atom.vlob_id = ANY($vlob_ids::UUID[])
+ORDER BY vlob_atom.vlob_id, vlob_atom.version DESC
+"""
+)
+
+
+_q_insert_vlob_atoms_batch = Q(
+    f"""
+INSERT INTO vlob_atom (
+    organization,
+    vlob_encryption_revision,
+    vlob_id,
+    version,
+    blob,
+    size,
+    author,
+    created_on
+)
+SELECT
+    { q_organization_internal_id(organization_id="$organization_id") },
+    {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision"
+        )
+    },
+    item.vlob_id,
+    item.version,
+    item.blob,
+    LENGTH(item.blob),
+    { q_device_internal_id(organization_id="$organization_id", device_id="$author") },
+    $timestamp
+FROM UNNEST($vlob_ids::UUID[], $versions::INTEGER[], $blobs::BYTEA[]) AS item(vlob_id, version, blob)
+RETURNING _id, vlob_id
+"""
+)
+
+
+# Allocate a range of consecutive checkpoints, one per vlob atom in the given order
+_q_vlobs_updated_batch = Q(
+    f"""
+INSERT INTO realm_vlob_update (
+realm, index, vlob_atom
+)
+SELECT
+{ q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") },
+(
+    SELECT COALESCE(MAX(index), 0)
+    FROM realm_vlob_update
+    WHERE realm = { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") }
+) + item.position,
+item.vlob_atom
+FROM UNNEST($vlob_atom_internal_ids::INTEGER[]) WITH ORDINALITY AS item(vlob_atom, position)
+RETURNING index, vlob_atom
+"""
+)
+
+
+_q_set_vlobs_latest_change_batch = Q(
+    f"""
+INSERT INTO realm_vlob_latest_change (realm, vlob_id, version, index)
+SELECT
+    { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") },
+    item.vlob_id,
+    item.version,
+    item.index
+FROM UNNEST($vlob_ids::UUID[], $versions::INTEGER[], $indexes::INTEGER[])
+    AS item(vlob_id, version, index)
+ON CONFLICT (realm, vlob_id)
+DO UPDATE SET version = EXCLUDED.version, index = EXCLUDED.index
+"""
+)
+
+
+# `query_check_write_batch` and `query_write_batch` are split so the sequester
+# webhooks can be called in between (i.e. only once the whole batch is known to be
+# valid), hence the caller is expected to run the check again along with the write
+# in a single transaction
+
+
+@query()
+async def query_check_write_batch(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    author: DeviceID,
+    realm_id: RealmID,
+    encryption_revision: int,
+    timestamp: DateTime,
+    items: List[Tuple[VlobID, int, bytes, Dict[SequesterServiceID, bytes] | None]],
+) -> None:
+    if not items:
+        return
+
+    await _check_realm_and_write_access(
+        conn, organization_id, author, realm_id, encryption_revision, timestamp
+    )
+
+    vlob_ids = [vlob_id for vlob_id, _, _, _ in items]
+    if len(set(vlob_ids)) != len(vlob_ids):
+        raise VlobVersionError()
+
+    rows = await conn.fetch(
+        *_q_get_vlobs_last_version(organization_id=organization_id.str, vlob_ids=vlob_ids)
+    )
+    previous_versions = {VlobID.from_hex(row["vlob_id"]): row for row in rows}
+    for vlob_id, version, _, _ in items:
+        previous = previous_versions.get(vlob_id)
+        if version == 1:
+            if previous:
+                raise VlobAlreadyExistsError()
+        elif not previous or RealmID.from_hex(previous["realm_id"]) != realm_id:
+            raise VlobNotFoundError(f"Vlob `{vlob_id.hex}` doesn't exist")
+        elif previous["version"] != version - 1:
+            raise VlobVersionError()
+        elif previous["created_on"] > timestamp:
+            raise VlobRequireGreaterTimestampError(previous["created_on"])
+
+
+@query()
+async def query_write_batch(
+    conn: triopg._triopg.TrioConnectionProxy,
+    organization_id: OrganizationID,
+    author: DeviceID,
+    realm_id: RealmID,
+    encryption_revision: int,
+    timestamp: DateTime,
+    items: List[Tuple[VlobID, int, bytes, Dict[SequesterServiceID, bytes] | None]],
+) -> None:
+    if not items:
+        return
+
+    vlob_ids = [vlob_id for vlob_id, _, _, _ in items]
+    try:
+        rows = await conn.fetch(
+            *_q_insert_vlob_atoms_batch(
+                organization_id=organization_id.str,
+                author=author.str,
+                realm_id=realm_id,
+                encryption_revision=encryption_revision,
+                vlob_ids=vlob_ids,
+                versions=[version for _, version, _, _ in items],
+                blobs=[blob for _, _, blob, _ in items],
+                timestamp=timestamp,
+            )
+        )
+
+    except UniqueViolationError:
+        # Should not occur in theory given we are in a transaction
+        raise VlobVersionError()
+
+    vlob_atom_internal_ids_per_vlob = {VlobID.from_hex(row["vlob_id"]): row["_id"] for row in rows}
+    vlob_atom_internal_ids = [vlob_atom_internal_ids_per_vlob[vlob_id] for vlob_id in vlob_ids]
+
+    sequester_items = [
+        (vlob_atom_internal_id, service_id, sequester_blob)
+        for vlob_atom_internal_id, (_, _, _, sequester_blobs) in zip(vlob_atom_internal_ids, items)
+        for service_id, sequester_blob in (sequester_blobs or {}).items()
+    ]
+    await _create_sequester_blobs(conn, organization_id, sequester_items)
+
+    rows = await conn.fetch(
+        *_q_vlobs_updated_batch(
+            organization_id=organization_id.str,
+            realm_id=realm_id,
+            vlob_atom_internal_ids=vlob_atom_internal_ids,
+        )
+    )
+    indexes_per_vlob_atom = {row["vlob_atom"]: row["index"] for row in rows}
+    indexes = [indexes_per_vlob_atom[vlob_atom_id] for vlob_atom_id in vlob_atom_internal_ids]
+
+    await conn.execute(
+        *_q_set_vlobs_latest_change_batch(
+            organization_id=organization_id.str,
+            realm_id=realm_id,
+            vlob_ids=vlob_ids,
+            versions=[version for _, version, _, _ in items],
+            indexes=indexes,
+        )
+    )
+
+    await conn.execute(
+        *_q_set_last_vlob_update(
+            organization_id=organization_id.str,
+            realm_id=realm_id,
+            user_id=author.user_id.str,
+            timestamp=timestamp,
+        )
+    )
+
+    await send_signals(
+        conn,
+        (
+            BackendEventRealmVlobsUpdated(
+                organization_id=organization_id,
+                author=author,
+                realm_id=realm_id,
+                checkpoint=index,
+                src_id=vlob_id,
+                src_version=version,
+            )
+            for (vlob_id, version, _, _), index in zip(items, indexes)
+        ),
+    )
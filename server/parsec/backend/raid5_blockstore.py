@@ -30,11 +30,15 @@ def split_block_in_chunks(block: bytes, nb_chunks: int) -> List[bytes]:
     chunk_len = payload_size // nb_chunks
     if nb_chunks * chunk_len < payload_size:
         chunk_len += 1
-    padding_len = chunk_len * nb_chunks - payload_size
 
-    payload = struct.pack("!I", len(block)) + block + b"\x00" * padding_len
+    # Build the payload in a single (zero-padded) buffer, then slice it without
+    # intermediary copies
+    payload = bytearray(chunk_len * nb_chunks)
+    struct.pack_into("!I", payload, 0, len(block))
+    payload[4 : 4 + len(block)] = block
+    view = memoryview(payload)
 
-    return [payload[chunk_len * i : chunk_len * (i + 1)] for i in range(nb_chunks)]
+    return [bytes(view[chunk_len * i : chunk_len * (i + 1)]) for i in range(nb_chunks)]
 
 
 def generate_checksum_chunk(chunks: List[bytes]) -> bytes:
@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List
 
 import attr
 
@@ -537,3 +537,14 @@ class BaseRealmComponent:
         Raises: Nothing !
         """
         raise NotImplementedError
+
+    def iter_realms_granted_roles(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[RealmGrantedRole]]:
+        """
+        Same as `dump_realms_granted_roles`, but yields the granted roles by
+        batches so that the whole organization doesn't have to fit in memory.
+
+        Raises: Nothing !
+        """
+        raise NotImplementedError
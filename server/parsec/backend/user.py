@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from typing import List, Tuple
+from typing import AsyncIterator, List, Tuple
 
 import attr
 
@@ -197,6 +197,8 @@ class BaseUserComponent:
             page=req.page,
             per_page=req.per_page,
             query=req.query,
+            # Counting all the users matching a search is what makes it costly
+            estimate_total=bool(req.query),
         )
         return authenticated_cmds.v3.human_find.RepOk(
             results=results,
@@ -412,8 +414,13 @@ class BaseUserComponent:
         per_page: int = 100,
         omit_revoked: bool = False,
         omit_non_human: bool = False,
+        estimate_total: bool = False,
     ) -> Tuple[List[HumanFindResultItem], int]:
         """
+        `estimate_total` allows the implementation to return an estimated total
+        for large results (exact on the last page, otherwise only guaranteeing
+        there is a next page) when computing the exact one is costly.
+
         Raises: Nothing !
         """
         raise NotImplementedError()
@@ -424,6 +431,28 @@ class BaseUserComponent:
         """
         raise NotImplementedError()
 
+    def iter_users(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[User]]:
+        """
+        Same as `dump_users`, but yields the users by batches so that the whole
+        organization doesn't have to fit in memory.
+
+        Raises: Nothing !
+        """
+        raise NotImplementedError()
+
+    def iter_devices(
+        self, organization_id: OrganizationID, batch_size: int = 1000
+    ) -> AsyncIterator[List[Device]]:
+        """
+        Same as `dump_users`, but yields the devices by batches so that the whole
+        organization doesn't have to fit in memory.
+
+        Raises: Nothing !
+        """
+        raise NotImplementedError()
+
     async def get_certificates(
         self, organization_id: OrganizationID, offset: int, redacted: bool
     ) -> list[bytes]:
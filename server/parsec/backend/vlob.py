@@ -614,6 +614,28 @@ class BaseVlobComponent:
         """
         raise NotImplementedError()
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: RealmID,
+        encryption_revision: int,
+        items: List[Tuple[VlobID, int | None, DateTime | None]],
+    ) -> List[Tuple[int, bytes, DeviceID, DateTime, DateTime, int]]:
+        """
+        Read multiple vlobs of a realm at once, each item being `(vlob_id, version, timestamp)`
+        with the same meaning as in `read`. Results are returned in the items' order.
+
+        Raises:
+            VlobAccessError
+            VlobVersionError
+            VlobNotFoundError: if any of the vlobs doesn't exist in the realm
+            VlobRealmNotFoundError
+            VlobEncryptionRevisionError: if encryption_revision mismatch
+            VlobInMaintenanceError
+        """
+        raise NotImplementedError()
+
     async def update(
         self,
         organization_id: OrganizationID,
@@ -638,6 +660,34 @@ class BaseVlobComponent:
         """
         raise NotImplementedError()
 
+    async def write_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: RealmID,
+        encryption_revision: int,
+        timestamp: DateTime,
+        items: List[Tuple[VlobID, int, bytes, Dict[SequesterServiceID, bytes] | None]],
+    ) -> None:
+        """
+        Create (version 1) or update (version > 1) multiple vlobs of a realm at once,
+        each item being `(vlob_id, version, blob, sequester_blob)`. A vlob can only
+        appear once per batch, and the whole batch is rejected if any item is.
+
+        Raises:
+            VlobAccessError
+            VlobAlreadyExistsError
+            VlobVersionError
+            VlobNotFoundError
+            VlobRealmNotFoundError
+            VlobEncryptionRevisionError: if encryption_revision mismatch
+            VlobInMaintenanceError
+            VlobRequireGreaterTimestampError
+            VlobSequesterDisabledError
+            VlobSequesterServiceInconsistencyError
+        """
+        raise NotImplementedError()
+
     async def poll_changes(
         self,
         organization_id: OrganizationID,
@@ -3,10 +3,12 @@ from __future__ import annotations
 
 import enum
 import sqlite3
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path, PurePath
-from typing import Dict, Iterator, List, Mapping, Tuple
+from typing import Deque, Dict, Iterator, List, Mapping, Sequence, Tuple
 
 from parsec._parsec import (
     CryptoError,
@@ -21,6 +23,7 @@ from parsec._parsec import (
     RealmID,
     RealmRoleCertificate,
     RevokedUserCertificate,
+    SecretKey,
     SequesterPrivateKeyDer,
     UserCertificate,
     VerifyKey,
@@ -31,6 +34,15 @@ from parsec.api.data.manifest import AnyRemoteManifest
 
 REALM_EXPORT_DB_MAGIC_NUMBER = 87947
 REALM_EXPORT_DB_VERSION = 1  # Only supported version so far
+# Blocks are fetched by batches to limit the number of queries (SQLite also limits
+# the number of host parameters in a single query)
+BLOCKS_FETCH_BATCH_SIZE = 64
+# Number of blocks submitted to the worker processes per job before waiting
+# for some of them to complete
+PENDING_BLOCKS_PER_JOB = 4
+# Upper bound of block data held in memory at any given time, half of it for the
+# blocks fetched from the database and half of it for the blocks being decrypted
+MAX_IN_FLIGHT_BYTES = 64 * 1024 * 1024
 
 
 class RealmExportProgress(enum.Enum):
@@ -172,6 +184,78 @@ class RealmExportDb:
                     f"Ignoring invalid realm role certificate { row[0] } ({ exc })",
                 )
 
+    def load_blocks(self, block_ids: Sequence[bytes]) -> Dict[bytes, bytes]:
+        """
+        Fetch the data of multiple blocks in a single query, missing blocks
+        are simply absent from the returned dict.
+        """
+        placeholders = ", ".join("?" * len(block_ids))
+        rows = self.con.execute(
+            f"SELECT block_id, data FROM block WHERE block_id IN ({placeholders})", block_ids
+        ).fetchall()
+        return dict(rows)
+
+    def load_blocks_size(self, block_ids: Sequence[bytes]) -> Dict[bytes, int]:
+        # SQLite's `length()` on a BLOB doesn't need to load the actual data
+        placeholders = ", ".join("?" * len(block_ids))
+        rows = self.con.execute(
+            f"SELECT block_id, length(data) FROM block WHERE block_id IN ({placeholders})",
+            block_ids,
+        ).fetchall()
+        return dict(rows)
+
+    def iter_blocks(
+        self, block_ids: Sequence[bytes], max_batch_bytes: int
+    ) -> Iterator[Tuple[bytes, bytes | None]]:
+        """
+        Yield the data of each block (or `None` if the block is missing) in the order
+        of `block_ids`, fetching them by batches never exceeding `max_batch_bytes`
+        (unless a single block is bigger than that).
+        """
+        for i in range(0, len(block_ids), BLOCKS_FETCH_BATCH_SIZE):
+            ids = block_ids[i : i + BLOCKS_FETCH_BATCH_SIZE]
+            sizes = self.load_blocks_size(ids)
+
+            start = 0
+            while start < len(ids):
+                end = start
+                batch_bytes = 0
+                while end < len(ids):
+                    size = sizes.get(ids[end], 0)
+                    if end > start and batch_bytes + size > max_batch_bytes:
+                        break
+                    batch_bytes += size
+                    end += 1
+
+                batch = ids[start:end]
+                data = self.load_blocks([block_id for block_id in batch if block_id in sizes])
+                for block_id in batch:
+                    yield (block_id, data.pop(block_id, None))
+                start = end
+
+
+def _decrypt_and_write_block(
+    output: Path, offset: int, size: int, key: bytes, ciphered: bytes
+) -> Tuple[RealmExportProgress, str] | None:
+    """
+    Run in a worker process, hence errors are returned as a progress event
+    (exceptions from the Rust bindings are not guaranteed to be picklable).
+    """
+    try:
+        clear_data = SecretKey(key).decrypt(ciphered)
+    except CryptoError as exc:
+        return (RealmExportProgress.INCONSISTENT_BLOCK, str(exc))
+
+    try:
+        with open(output, "r+b") as fd:
+            fd.seek(offset)
+            # `size` should be equal to len(clear_data), but better safe than sorry
+            fd.write(memoryview(clear_data)[:size])
+    except OSError as exc:
+        return (RealmExportProgress.GENERIC_ERROR, f"Failed to write at offset {offset}: {exc}")
+
+    return None
+
 
 @dataclass
 class WorkspaceExport:
@@ -179,9 +263,18 @@ class WorkspaceExport:
     decryption_key: SequesterPrivateKeyDer
     devices_form_internal_id: Dict[int, Tuple[DeviceID, VerifyKey]]
     filter_on_date: DateTime
+    # If provided, blocks decryption and writing is offloaded to this executor
+    executor: Executor | None = None
+    max_pending_blocks: int = PENDING_BLOCKS_PER_JOB
+    max_in_flight_bytes: int = MAX_IN_FLIGHT_BYTES
+    _pending_blocks: Deque[
+        Tuple[PurePath, str, int, Future[Tuple[RealmExportProgress, str] | None]]
+    ] = field(default_factory=deque, init=False, repr=False)
+    _pending_bytes: int = field(default=0, init=False, repr=False)
 
     def load_manifest(self, manifest_id: EntryID) -> AnyRemoteManifest:
         # Convert datetime to integer timestamp with us precision (format used in sqlite dump).
+        # Note the `UNIQUE(vlob_id, version)` constraint provides the index used by this query.
         filter_timestamp = int(self.filter_on_date.timestamp() * 1000000)
         row = self.db.con.execute(
             "SELECT version, blob, author, timestamp FROM vlob_atom WHERE vlob_id = ? and timestamp <= ? ORDER BY version DESC LIMIT 1",
@@ -291,19 +384,34 @@ class WorkspaceExport:
                 RealmExportProgress.GENERIC_ERROR,
                 f"Failed to create file {output}: {exc}",
             )
+            return
+
+        try:
+            fd.truncate(manifest.size)
+            if self.executor is not None:
+                # Workers reopen the file on their own, so it must be fully created beforehand
+                fd.close()
+        except OSError as exc:
+            fd.close()
+            yield (
+                fs_path,
+                RealmExportProgress.GENERIC_ERROR,
+                f"Failed to create file {output}: {exc}",
+            )
+            return
 
-        fd.truncate(manifest.size)
-        for i, block in enumerate(manifest.blocks):
+        blocks_data = self.db.iter_blocks(
+            [block.id.bytes for block in manifest.blocks],
+            max_batch_bytes=self.max_in_flight_bytes // 2,
+        )
+        for i, (block, (_, ciphered)) in enumerate(zip(manifest.blocks, blocks_data)):
             yield (
                 fs_path,
                 RealmExportProgress.EXTRACT_IN_PROGRESS,
                 f"Extracting blocks {i+1}/{len(manifest.blocks)}",
             )
 
-            row = self.db.con.execute(
-                "SELECT data FROM block WHERE block_id = ?", (block.id.bytes,)
-            ).fetchone()
-            if not row:
+            if ciphered is None:
                 yield (
                     fs_path,
                     RealmExportProgress.INCONSISTENT_BLOCK,
@@ -311,8 +419,25 @@ class WorkspaceExport:
                 )
                 continue
 
+            if self.executor is not None:
+                yield from self._wait_pending_blocks(
+                    max_pending=self.max_pending_blocks - 1,
+                    max_pending_bytes=self.max_in_flight_bytes // 2 - len(ciphered),
+                )
+                future = self.executor.submit(
+                    _decrypt_and_write_block,
+                    output,
+                    block.offset,
+                    block.size,
+                    block.key.secret,
+                    ciphered,
+                )
+                self._pending_blocks.append((fs_path, block.id.hex, len(ciphered), future))
+                self._pending_bytes += len(ciphered)
+                continue
+
             try:
-                clear_data = block.key.decrypt(row[0])
+                clear_data = block.key.decrypt(ciphered)
 
             except CryptoError as exc:
                 yield (
@@ -325,11 +450,9 @@ class WorkspaceExport:
             try:
                 if fd.tell() != block.offset:
                     fd.seek(block.offset)
-                if block.size < len(clear_data):
-                    # Shouldn't happen, block.size should be equal to len(clear_data)
-                    fd.write(clear_data[: block.size])
-                else:
-                    fd.write(clear_data)
+                # Shouldn't be needed, block.size should be equal to len(clear_data),
+                # slicing a memoryview is cheap anyway given it doesn't copy the data
+                fd.write(memoryview(clear_data)[: block.size])
             except OSError as exc:
                 yield (
                     fs_path,
@@ -338,6 +461,9 @@ class WorkspaceExport:
                 )
                 continue
 
+        if self.executor is not None:
+            return
+
         try:
             fd.close()
         except OSError as exc:
@@ -347,6 +473,27 @@ class WorkspaceExport:
                 f"Failed to close file {output}: {exc}",
             )
 
+    def _wait_pending_blocks(
+        self, max_pending: int = 0, max_pending_bytes: int = 0
+    ) -> Iterator[Tuple[PurePath | None, RealmExportProgress, str]]:
+        """
+        Wait for the oldest blocks submitted to the executor until at most `max_pending`
+        blocks (totaling at most `max_pending_bytes` of ciphered data) remain.
+        """
+        while self._pending_blocks and (
+            len(self._pending_blocks) > max_pending or self._pending_bytes > max_pending_bytes
+        ):
+            fs_path, block_id_hex, size, future = self._pending_blocks.popleft()
+            self._pending_bytes -= size
+            try:
+                error = future.result()
+            except Exception as exc:
+                # Worker process crashed or cannot be started
+                error = (RealmExportProgress.GENERIC_ERROR, str(exc))
+            if error is not None:
+                event_type, msg = error
+                yield (fs_path, event_type, f"Block {block_id_hex}: {msg}")
+
     def extract_workspace(
         self, output: Path
     ) -> Iterator[Tuple[PurePath | None, RealmExportProgress, str]]:
@@ -371,10 +518,52 @@ class WorkspaceExport:
         yield from self.extract_children(
             output=output, fs_path=fs_path, children=workspace_manifest.children
         )
+        yield from self._wait_pending_blocks()
 
 
 def extract_workspace(
-    output: Path, export_db: Path, decryption_key: SequesterPrivateKeyDer, filter_on_date: DateTime
+    output: Path,
+    export_db: Path,
+    decryption_key: SequesterPrivateKeyDer,
+    filter_on_date: DateTime,
+    jobs: int = 1,
+    max_in_flight_bytes: int = MAX_IN_FLIGHT_BYTES,
+) -> Iterator[Tuple[PurePath | None, RealmExportProgress, str]]:
+    """
+    `jobs` is the number of worker processes used to decrypt and write the blocks,
+    with `jobs=1` everything is done in the current process.
+    `max_in_flight_bytes` bounds the amount of block data kept in memory, so memory
+    usage doesn't depend on the size of the realm.
+    """
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield from _extract_workspace(
+                output=output,
+                export_db=export_db,
+                decryption_key=decryption_key,
+                filter_on_date=filter_on_date,
+                executor=executor,
+                max_pending_blocks=jobs * PENDING_BLOCKS_PER_JOB,
+                max_in_flight_bytes=max_in_flight_bytes,
+            )
+    else:
+        yield from _extract_workspace(
+            output=output,
+            export_db=export_db,
+            decryption_key=decryption_key,
+            filter_on_date=filter_on_date,
+            max_in_flight_bytes=max_in_flight_bytes,
+        )
+
+
+def _extract_workspace(
+    output: Path,
+    export_db: Path,
+    decryption_key: SequesterPrivateKeyDer,
+    filter_on_date: DateTime,
+    executor: Executor | None = None,
+    max_pending_blocks: int = PENDING_BLOCKS_PER_JOB,
+    max_in_flight_bytes: int = MAX_IN_FLIGHT_BYTES,
 ) -> Iterator[Tuple[PurePath | None, RealmExportProgress, str]]:
     with RealmExportDb.open(export_db) as db:
         out_certificates: list[Tuple[int, DeviceCertificate]] = []
@@ -387,5 +576,8 @@ def extract_workspace(
             decryption_key=decryption_key,
             devices_form_internal_id=devices_form_internal_id,
             filter_on_date=filter_on_date,
+            executor=executor,
+            max_pending_blocks=max_pending_blocks,
+            max_in_flight_bytes=max_in_flight_bytes,
         )
         yield from wksp.extract_workspace(output=output)
@@ -3,10 +3,10 @@ from __future__ import annotations
 
 import pytest
 
-from parsec._parsec import DateTime, UsersPerProfileDetailItem
+from parsec._parsec import DateTime, OrganizationID, UsersPerProfileDetailItem
 from parsec.api.protocol import BlockID, OrganizationStatsRepOk, UserProfile, VlobID
 from tests.backend.common import organization_stats
-from tests.common import customize_fixtures
+from tests.common import bench_elapsed, bench_report, customize_fixtures
 
 
 @pytest.mark.trio
@@ -185,3 +185,43 @@ async def test_organization_stats_users(
         metadata_size=0,
         realms=0,
     )
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_memory_organization_stats_scaling_bench(backend, coolorg, realm, alice):
+    if backend.config.db_type != "MOCKED":
+        pytest.skip("Memory backend only")
+
+    for i in range(10):
+        await backend.vlob.create(
+            organization_id=coolorg.organization_id,
+            author=alice.device_id,
+            realm_id=realm,
+            encryption_revision=1,
+            vlob_id=VlobID.new(),
+            timestamp=DateTime.now(),
+            blob=b"1234",
+        )
+
+    expected_stats = await backend.organization.stats(coolorg.organization_id)
+    organizations_count = 0
+    for target_count in (10, 100, 1000):
+        while organizations_count < target_count:
+            organizations_count += 1
+            backend.test_duplicate_organization(
+                coolorg.organization_id, OrganizationID(f"Org{organizations_count}")
+            )
+
+        with bench_elapsed() as duration:
+            for _ in range(100):
+                stats = await backend.organization.stats(coolorg.organization_id)
+                await backend.user.get_certificates(
+                    coolorg.organization_id, offset=0, redacted=False
+                )
+        # Other organizations don't leak into the stats
+        assert stats == expected_stats
+        bench_report(
+            f"stats + certificates with {organizations_count} other organizations:"
+            f" {duration.value * 10:.2f}ms per call"
+        )
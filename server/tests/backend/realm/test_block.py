@@ -33,7 +33,7 @@ from parsec.backend.raid5_blockstore import (
 )
 from parsec.backend.realm import RealmGrantedRole
 from tests.backend.common import block_create, block_read
-from tests.common import customize_fixtures
+from tests.common import bench_allocated, bench_report, customize_fixtures
 
 BLOCK_ID = BlockID.from_hex("00000000000000000000000000000001")
 VLOB_ID = VlobID.from_hex("00000000000000000000000000000002")
@@ -478,3 +478,26 @@ def test_split_block(block, nb_blockstores):
         partial_chunks[missing] = None
         rebuilt = rebuild_block_from_chunks(partial_chunks, checksum_chunk)
         assert rebuilt == block
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_concurrent_block_uploads_memory_bench(alice_rpc, realm):
+    uploads_count = 16
+    # Biggest block fitting into the max HTTP body size once serialized
+    block_size = 1024**2 - 1024
+    blocks = [bytes([i]) * block_size for i in range(uploads_count)]
+
+    async def _upload(block: bytes) -> None:
+        rep = await block_create(alice_rpc, BlockID.new(), realm, block)
+        assert isinstance(rep, BlockCreateRepOk)
+
+    with bench_allocated(peak=True) as peak:
+        async with trio.open_nursery() as nursery:
+            for block in blocks:
+                nursery.start_soon(_upload, block)
+
+    bench_report(
+        f"{uploads_count} concurrent uploads of {block_size // 1024}KiB blocks:"
+        f" {peak.value / uploads_count / 1024**2:.2f}MiB peak memory per upload"
+    )
@@ -70,7 +70,7 @@ from tests.backend.common import (
     vlob_poll_changes,
     vlob_update,
 )
-from tests.common import freeze_time, real_clock_timeout
+from tests.common import bench_elapsed, bench_report, freeze_time, real_clock_timeout
 
 
 @pytest.mark.trio
@@ -729,3 +729,57 @@ async def test_reencryption_events(backend, alice_ws, alice2_ws, realm, alice, v
     # Sanity check
     rep = await apiv2v3_events_listen_nowait(alice_ws)
     assert rep == ApiV2V3_EventsListenRepNoEvents()
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_reencryption_bench(backend, alice, realm):
+    vlobs_count = 10000
+    batch_size = 1000
+
+    for i in range(vlobs_count):
+        await backend.vlob.create(
+            organization_id=alice.organization_id,
+            author=alice.device_id,
+            realm_id=realm,
+            encryption_revision=1,
+            vlob_id=VlobID.new(),
+            timestamp=DateTime.now(),
+            blob=b"<blob %i>" % i,
+        )
+
+    await backend.realm.start_reencryption_maintenance(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        realm_id=realm,
+        encryption_revision=2,
+        per_participant_message={alice.user_id: b"foo"},
+        timestamp=DateTime.now(),
+    )
+
+    with bench_elapsed() as elapsed:
+        while True:
+            batch = await backend.vlob.maintenance_get_reencryption_batch(
+                organization_id=alice.organization_id,
+                author=alice.device_id,
+                realm_id=realm,
+                encryption_revision=2,
+                size=batch_size,
+            )
+            if not batch:
+                break
+            total, done = await backend.vlob.maintenance_save_reencryption_batch(
+                organization_id=alice.organization_id,
+                author=alice.device_id,
+                realm_id=realm,
+                encryption_revision=2,
+                batch=[
+                    (vlob_id, version, blob + b" reencrypted") for vlob_id, version, blob in batch
+                ],
+            )
+
+    assert (total, done) == (vlobs_count, vlobs_count)
+    bench_report(
+        f"Reencrypted {vlobs_count} vlobs in {elapsed.value:.2f}s"
+        f" ({vlobs_count / elapsed.value:.0f} vlobs/s)"
+    )
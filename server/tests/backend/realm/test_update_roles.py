@@ -23,6 +23,7 @@ from parsec.api.protocol import (
     VlobCreateRepOk,
     VlobID,
 )
+from parsec.backend.memory.realm import Realm
 from parsec.backend.realm import RealmGrantedRole
 from tests.backend.common import realm_update_roles, vlob_create
 from tests.common import customize_fixtures, freeze_time
@@ -475,3 +476,37 @@ async def test_update_roles_for_revoked_user(
         alice_ws, alice, realm, bob.user_id, None, next_timestamp()
     )
     assert isinstance(rep, RealmUpdateRolesRepUserRevoked)
+
+
+def test_memory_realm_roles_views(alice, bob):
+    def _role(user_id, role, day):
+        return RealmGrantedRole(
+            certificate=b"<dummy>",
+            realm_id=REALM_ID,
+            user_id=user_id,
+            role=role,
+            granted_by=alice.device_id,
+            granted_on=DateTime(2000, 1, day),
+        )
+
+    realm = Realm(granted_roles=[_role(alice.user_id, RealmRole.OWNER, 2)])
+    assert realm.created_on == DateTime(2000, 1, 2)
+    assert realm.roles == {alice.user_id: RealmRole.OWNER}
+    assert realm.get_last_role(bob.user_id) is None
+
+    bob_reader = _role(bob.user_id, RealmRole.READER, 3)
+    realm.add_granted_role(bob_reader)
+    assert realm.roles == {alice.user_id: RealmRole.OWNER, bob.user_id: RealmRole.READER}
+    assert realm.get_last_role(bob.user_id) == bob_reader
+
+    # Role older than the current one doesn't change the current view
+    realm.add_granted_role(_role(bob.user_id, RealmRole.MANAGER, 1))
+    assert realm.roles[bob.user_id] == RealmRole.READER
+    assert realm.get_last_role(bob.user_id) == bob_reader
+    assert realm.created_on == DateTime(2000, 1, 1)
+
+    bob_removed = _role(bob.user_id, None, 4)
+    realm.add_granted_role(bob_removed)
+    assert realm.roles == {alice.user_id: RealmRole.OWNER}
+    assert realm.get_last_role(bob.user_id) == bob_removed
+    assert len(realm.granted_roles) == 4
@@ -38,7 +38,15 @@ from parsec.api.protocol import (
     VlobUpdateRepRequireGreaterTimestamp,
     packb,
 )
+from parsec.backend.memory.vlob import Vlob
+from parsec.backend.postgresql.vlob_queries import query_read_batch
 from parsec.backend.realm import RealmGrantedRole
+from parsec.backend.vlob import (
+    VlobAccessError,
+    VlobAlreadyExistsError,
+    VlobNotFoundError,
+    VlobVersionError,
+)
 from parsec.utils import BALLPARK_CLIENT_EARLY_OFFSET, BALLPARK_CLIENT_LATE_OFFSET
 from tests.backend.common import apiv2v3_vlob_read, vlob_create, vlob_list_versions, vlob_update
 from tests.backend.realm.test_update_roles import realm_generate_certif_and_update_roles_or_fail
@@ -261,6 +269,153 @@ async def test_read_before_v1(alice_ws, vlobs):
     assert isinstance(rep, ApiV2V3_VlobReadRepBadVersion)
 
 
+@pytest.mark.trio
+async def test_read_batch(backend, alice, bob, realm, other_realm, vlobs):
+    if backend.config.db_type != "MOCKED":
+        pytest.skip("Memory backend only")
+
+    async def _read_batch(items, author=alice):
+        return await backend.vlob.read_batch(
+            alice.organization_id, author.device_id, realm, 1, items
+        )
+
+    results = await _read_batch(
+        [
+            (vlobs[1], None, None),
+            (vlobs[0], 1, None),
+            (vlobs[0], None, DateTime(2000, 1, 4)),
+            (vlobs[0], None, DateTime(2000, 1, 2, 10)),
+        ]
+    )
+    assert [(version, blob, author) for version, blob, author, *_ in results] == [
+        (1, b"r:A b:2 v:1", alice.device_id),
+        (1, b"r:A b:1 v:1", alice.device_id),
+        (2, b"r:A b:1 v:2", alice.device_id),
+        (1, b"r:A b:1 v:1", alice.device_id),
+    ]
+    assert await _read_batch([]) == []
+
+    with pytest.raises(VlobVersionError):
+        await _read_batch([(vlobs[1], None, None), (vlobs[0], 3, None)])
+    with pytest.raises(VlobVersionError):
+        await _read_batch([(vlobs[0], None, DateTime(2000, 1, 1))])
+    with pytest.raises(VlobNotFoundError):
+        await _read_batch([(VLOB_ID, None, None)])
+    with pytest.raises(VlobAccessError):
+        await _read_batch([(vlobs[0], None, None)], author=bob)
+
+    # Vlobs from another realm are not visible
+    await backend.vlob.create(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        realm_id=other_realm,
+        encryption_revision=1,
+        vlob_id=VLOB_ID,
+        timestamp=DateTime(2000, 1, 3),
+        blob=b"other realm",
+    )
+    with pytest.raises(VlobNotFoundError):
+        await _read_batch([(VLOB_ID, None, None)])
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_postgresql_query_read_batch(backend, alice, bob, realm, other_realm, vlobs):
+    # PostgreSQL has no certificate index yet, so only the query is available (not `read_batch`)
+    async def _read_batch(items, author=alice):
+        async with backend.vlob.dbh.pool.acquire() as conn:
+            return await query_read_batch(
+                conn, alice.organization_id, author.device_id, realm, 1, items
+            )
+
+    results = await _read_batch(
+        [
+            (vlobs[1], None, None),
+            (vlobs[0], 1, None),
+            (vlobs[0], None, DateTime(2000, 1, 4)),
+            (vlobs[0], None, DateTime(2000, 1, 2, 10)),
+        ]
+    )
+    assert [(version, blob, author) for version, blob, author, *_ in results] == [
+        (1, b"r:A b:2 v:1", alice.device_id),
+        (1, b"r:A b:1 v:1", alice.device_id),
+        (2, b"r:A b:1 v:2", alice.device_id),
+        (1, b"r:A b:1 v:1", alice.device_id),
+    ]
+    assert await _read_batch([]) == []
+
+    with pytest.raises(VlobVersionError):
+        await _read_batch([(vlobs[1], None, None), (vlobs[0], 3, None)])
+    with pytest.raises(VlobVersionError):
+        await _read_batch([(vlobs[0], None, DateTime(2000, 1, 1))])
+    with pytest.raises(VlobNotFoundError):
+        await _read_batch([(VLOB_ID, None, None)])
+    with pytest.raises(VlobAccessError):
+        await _read_batch([(vlobs[0], None, None)], author=bob)
+
+    # Vlobs from another realm are not visible
+    await backend.vlob.create(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        realm_id=other_realm,
+        encryption_revision=1,
+        vlob_id=VLOB_ID,
+        timestamp=DateTime(2000, 1, 3),
+        blob=b"other realm",
+    )
+    with pytest.raises(VlobNotFoundError):
+        await _read_batch([(VLOB_ID, None, None)])
+
+
+@pytest.mark.trio
+async def test_write_batch(backend, alice, bob, realm, vlobs):
+    new_vlob_id = VlobID.new()
+    timestamp = DateTime(2000, 1, 5)
+
+    async def _write_batch(items, author=alice):
+        await backend.vlob.write_batch(
+            alice.organization_id, author.device_id, realm, 1, timestamp, items
+        )
+
+    checkpoint, _ = await backend.vlob.poll_changes(
+        alice.organization_id, alice.device_id, realm, 0
+    )
+
+    # Batch is rejected as a whole
+    for bad_items, error in [
+        ([(new_vlob_id, 1, b"new", None), (vlobs[0], 2, b"v2 again", None)], VlobVersionError),
+        (
+            [(new_vlob_id, 1, b"new", None), (vlobs[1], 1, b"v1 again", None)],
+            VlobAlreadyExistsError,
+        ),
+        ([(new_vlob_id, 1, b"new", None), (VLOB_ID, 2, b"unknown", None)], VlobNotFoundError),
+        ([(new_vlob_id, 1, b"new", None), (new_vlob_id, 2, b"new v2", None)], VlobVersionError),
+    ]:
+        with pytest.raises(error):
+            await _write_batch(bad_items)
+    with pytest.raises(VlobAccessError):
+        await _write_batch([(new_vlob_id, 1, b"new", None)], author=bob)
+    assert await backend.vlob.poll_changes(
+        alice.organization_id, alice.device_id, realm, checkpoint
+    ) == (checkpoint, {})
+
+    await _write_batch(
+        [
+            (new_vlob_id, 1, b"new", None),
+            (vlobs[0], 3, b"r:A b:1 v:3", None),
+            (vlobs[1], 2, b"r:A b:2 v:2", None),
+        ]
+    )
+    assert await backend.vlob.poll_changes(
+        alice.organization_id, alice.device_id, realm, checkpoint
+    ) == (checkpoint + 3, {new_vlob_id: 1, vlobs[0]: 3, vlobs[1]: 2})
+    assert await backend.vlob.list_versions(alice.organization_id, alice.device_id, vlobs[0]) == {
+        1: (DateTime(2000, 1, 2, 1), alice.device_id),
+        2: (DateTime(2000, 1, 3), alice.device_id),
+        3: (timestamp, alice.device_id),
+    }
+
+
 @pytest.mark.trio
 async def test_read_check_access_rights(backend, alice, bob, bob_ws, realm, vlobs, next_timestamp):
     # Not part of the realm
@@ -663,3 +818,25 @@ async def test_vlob_updates_causality_checks(
         check_rep=False,
     )
     assert rep == VlobUpdateRepRequireGreaterTimestamp(ref)
+
+
+def test_memory_vlob_time_index(alice):
+    t1 = DateTime(2000, 1, 1)
+    t2 = DateTime(2000, 1, 2)
+    t3 = DateTime(2000, 1, 3)
+    vlob = Vlob(RealmID.new(), [(b"v1", alice.device_id, t1, 1)], None)
+    vlob.append(b"v2..", alice.device_id, t2, 1)
+    vlob.append(b"v3......", alice.device_id, t2, 2)
+
+    assert vlob.version_at(DateTime(1999, 1, 1)) == 0
+    assert vlob.version_at(t1) == 1
+    assert vlob.version_at(t2) == 3
+    assert vlob.version_at(t3) == 3
+    assert vlob.size_at(DateTime(1999, 1, 1)) == 0
+    assert vlob.size_at(t1) == 2
+    assert vlob.size_at(t3) == vlob.size == 14
+
+    # Index is rebuilt when the vlob is created from existing data (e.g. on reencryption)
+    rebuilt = Vlob(vlob.realm_id, list(vlob.data), None)
+    assert rebuilt.version_at(t1) == 1
+    assert rebuilt.size == 14
@@ -19,6 +19,7 @@ from parsec.api.protocol import (
     VlobUpdateRepOk,
 )
 from tests.backend.common import realm_update_roles, vlob_poll_changes, vlob_update
+from tests.common import bench_elapsed, bench_report
 
 NOW = DateTime(2000, 1, 3)
 VLOB_ID = VlobID.from_hex("00000000000000000000000000000001")
@@ -180,3 +181,53 @@ async def test_vlob_poll_changes_during_maintenance(backend, alice, alice_ws, re
     # It's ok to poll changes while the workspace is being reencrypted
     rep = await vlob_poll_changes(alice_ws, realm, 1)
     assert isinstance(rep, VlobPollChangesRepOk)
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_vlob_poll_changes_bench_hot_vlobs(backend, alice, realm):
+    vlobs_count = 500
+    hot_vlobs_count = 5
+    updates_count = 10000
+
+    vlob_ids = [VlobID.new() for _ in range(vlobs_count)]
+    for vlob_id in vlob_ids:
+        await backend.vlob.create(
+            organization_id=alice.organization_id,
+            author=alice.device_id,
+            realm_id=realm,
+            encryption_revision=1,
+            vlob_id=vlob_id,
+            timestamp=NOW,
+            blob=b"v1",
+        )
+    for i in range(updates_count):
+        await backend.vlob.update(
+            organization_id=alice.organization_id,
+            author=alice.device_id,
+            encryption_revision=1,
+            vlob_id=vlob_ids[i % hot_vlobs_count],
+            version=i // hot_vlobs_count + 2,
+            timestamp=NOW,
+            blob=b"vx",
+        )
+
+    expected_changes = {vlob_id: 1 for vlob_id in vlob_ids}
+    for vlob_id in vlob_ids[:hot_vlobs_count]:
+        expected_changes[vlob_id] = updates_count // hot_vlobs_count + 1
+    expected_checkpoint = vlobs_count + updates_count
+
+    for checkpoint in (0, vlobs_count, expected_checkpoint - hot_vlobs_count):
+        with bench_elapsed() as elapsed:
+            new_checkpoint, changes = await backend.vlob.poll_changes(
+                alice.organization_id, alice.device_id, realm, checkpoint
+            )
+        bench_report(
+            f"poll_changes from checkpoint {checkpoint}: {len(changes)} changed vlobs"
+            f" in {elapsed.value * 1000:.1f}ms"
+        )
+        assert new_checkpoint == expected_checkpoint
+        if checkpoint == 0:
+            assert changes == expected_changes
+        else:
+            assert changes.keys() == set(vlob_ids[:hot_vlobs_count])
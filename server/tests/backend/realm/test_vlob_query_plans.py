@@ -0,0 +1,145 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from parsec._parsec import RealmID, VlobID
+from parsec.backend.postgresql.vlob_queries.read import _q_list_versions, _q_poll_changes
+from parsec.backend.postgresql.vlob_queries.write import _q_get_vlob_version
+
+VLOBS_COUNT = 2000
+VERSIONS_PER_VLOB = 5
+
+
+def _plan_nodes(plan):
+    yield plan
+    for sub_plan in plan.get("Plans", ()):
+        yield from _plan_nodes(sub_plan)
+
+
+async def _explain(conn, q, **kwargs):
+    sql, *args = q(**kwargs)
+    raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args)
+    return list(_plan_nodes(json.loads(raw)[0]["Plan"]))
+
+
+@pytest.fixture
+async def seeded_realm(backend, alice):
+    realm_id = RealmID.from_entry_id(alice.user_manifest_id)
+    async with backend.vlob.dbh.pool.acquire() as conn:
+        await conn.execute(
+            """
+WITH rev AS (
+    SELECT vlob_encryption_revision._id, realm.organization
+    FROM vlob_encryption_revision
+    INNER JOIN realm ON vlob_encryption_revision.realm = realm._id
+    INNER JOIN organization ON realm.organization = organization._id
+    WHERE organization.organization_id = $1 AND realm.realm_id = $2
+),
+author AS (
+    SELECT device._id FROM device, rev
+    WHERE device.organization = rev.organization AND device.device_id = $3
+)
+INSERT INTO vlob_atom (
+    organization, vlob_encryption_revision, vlob_id, version, blob, size, author, created_on
+)
+SELECT rev.organization, rev._id, md5(i::TEXT)::UUID, v, '', 0, author._id, now()
+FROM rev, author, generate_series(1, $4::INTEGER) AS i, generate_series(1, $5::INTEGER) AS v
+""",
+            alice.organization_id.str,
+            realm_id,
+            alice.device_id.str,
+            VLOBS_COUNT,
+            VERSIONS_PER_VLOB,
+        )
+        await conn.execute(
+            """
+WITH realm_ AS (
+    SELECT realm._id FROM realm
+    INNER JOIN organization ON realm.organization = organization._id
+    WHERE organization.organization_id = $1 AND realm.realm_id = $2
+)
+INSERT INTO realm_vlob_update (realm, index, vlob_atom)
+SELECT
+    realm_._id,
+    (
+        SELECT COALESCE(MAX(index), 0) FROM realm_vlob_update WHERE realm = realm_._id
+    ) + ROW_NUMBER() OVER (ORDER BY vlob_atom._id),
+    vlob_atom._id
+FROM realm_, vlob_atom
+INNER JOIN vlob_encryption_revision
+    ON vlob_atom.vlob_encryption_revision = vlob_encryption_revision._id
+WHERE
+    vlob_encryption_revision.realm = realm_._id
+    AND NOT EXISTS (
+        SELECT 1 FROM realm_vlob_update WHERE realm_vlob_update.vlob_atom = vlob_atom._id
+    )
+""",
+            alice.organization_id.str,
+            realm_id,
+        )
+        await conn.execute(
+            """
+INSERT INTO realm_vlob_latest_change (realm, vlob_id, version, index)
+SELECT DISTINCT ON (realm_vlob_update.realm, vlob_atom.vlob_id)
+    realm_vlob_update.realm,
+    vlob_atom.vlob_id,
+    vlob_atom.version,
+    realm_vlob_update.index
+FROM realm_vlob_update
+INNER JOIN vlob_atom ON realm_vlob_update.vlob_atom = vlob_atom._id
+ORDER BY realm_vlob_update.realm, vlob_atom.vlob_id, realm_vlob_update.index DESC
+ON CONFLICT (realm, vlob_id) DO UPDATE SET version = EXCLUDED.version, index = EXCLUDED.index
+"""
+        )
+        # Vacuum also updates the visibility map, which makes index-only scans worth it
+        await conn.execute("VACUUM ANALYZE vlob_atom")
+        await conn.execute("VACUUM ANALYZE realm_vlob_update")
+        await conn.execute("VACUUM ANALYZE realm_vlob_latest_change")
+    return realm_id
+
+
+# Query plans regression tests: make sure the vlob queries keep relying on the
+# covering indexes instead of scanning the whole vlob history
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+@pytest.mark.parametrize("q", [_q_list_versions, _q_get_vlob_version])
+async def test_vlob_versions_query_plan(backend, alice, seeded_realm, q):
+    async with backend.vlob.dbh.pool.acquire() as conn:
+        nodes = await _explain(
+            conn,
+            q,
+            organization_id=alice.organization_id.str,
+            vlob_id=VlobID.from_hex("c4ca4238a0b923820dcc509a6f75849b"),  # md5('1')
+        )
+    vlob_atom_scans = [node for node in nodes if node.get("Relation Name") == "vlob_atom"]
+    assert [node.get("Index Name") for node in vlob_atom_scans] == [
+        "vlob_atom_organization_vlob_id_version_idx"
+    ]
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_vlob_poll_changes_query_plan(backend, alice, seeded_realm):
+    async with backend.vlob.dbh.pool.acquire() as conn:
+        nodes = await _explain(
+            conn,
+            _q_poll_changes,
+            organization_id=alice.organization_id.str,
+            realm_id=seeded_realm,
+            checkpoint=VLOBS_COUNT * VERSIONS_PER_VLOB - 10,
+        )
+    scans = [
+        node
+        for node in nodes
+        if node.get("Relation Name")
+        in ("realm_vlob_latest_change", "realm_vlob_update", "vlob_atom")
+    ]
+    # Only the latest changes are needed, not the whole realm's history
+    assert [(node["Relation Name"], node.get("Index Name")) for node in scans] == [
+        ("realm_vlob_latest_change", "realm_vlob_latest_change_realm_index_idx")
+    ]
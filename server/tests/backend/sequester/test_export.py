@@ -34,7 +34,7 @@ from parsec.backend.postgresql.sequester_export import (
     RealmExporterOutputDbError,
 )
 from parsec.backend.realm import RealmGrantedRole
-from parsec.sequester_export_reader import extract_workspace
+from parsec.sequester_export_reader import MAX_IN_FLIGHT_BYTES, extract_workspace
 from tests.common import OrganizationFullData, customize_fixtures, sequester_service_factory
 
 
@@ -426,7 +426,11 @@ async def test_sequester_export_full_run(
 
 
 @pytest.mark.trio
-async def test_export_reader_full_run(tmp_path, coolorg: OrganizationFullData, alice, bob, adam):
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("max_in_flight_bytes", [MAX_IN_FLIGHT_BYTES, 1], ids=["default", "tiny"])
+async def test_export_reader_full_run(
+    tmp_path, coolorg: OrganizationFullData, alice, bob, adam, jobs, max_in_flight_bytes
+):
     output_db_path = tmp_path / "export.sqlite"
     realm1 = RealmID.new()
     # Don't use such a small key size in real world, this is only for test !
@@ -813,6 +817,8 @@ async def test_export_reader_full_run(tmp_path, coolorg: OrganizationFullData, a
             export_db=output_db_path,
             decryption_key=service_decryption_key,
             filter_on_date=DateTime.now(),
+            jobs=jobs,
+            max_in_flight_bytes=max_in_flight_bytes,
         )
     )
 
@@ -832,6 +838,8 @@ async def test_export_reader_full_run(tmp_path, coolorg: OrganizationFullData, a
             export_db=output_db_path,
             decryption_key=service_decryption_key,
             filter_on_date=DateTime(2000, 3, 14),
+            jobs=jobs,
+            max_in_flight_bytes=max_in_flight_bytes,
         )
     )
     # Check the result
@@ -8,6 +8,7 @@ from urllib.parse import parse_qs, urlsplit
 
 import pytest
 
+from parsec._parsec import DateTime
 from parsec.api.protocol import (
     OrganizationID,
     SequesterServiceID,
@@ -26,6 +27,7 @@ from parsec.backend.sequester import (
     SequesterServiceNotFoundError,
     SequesterServiceType,
 )
+from parsec.backend.vlob import VlobNotFoundError, VlobSequesterServiceInconsistencyError
 from tests.backend.common import vlob_create, vlob_update
 from tests.common import OrganizationFullData, customize_fixtures, sequester_service_factory
 
@@ -187,6 +189,107 @@ async def test_vlob_create_update_and_sequester_access(
         )
 
 
+@customize_fixtures(coolorg_is_sequestered_organization=True)
+@pytest.mark.trio
+async def test_vlob_write_batch_sequester_blobs(
+    coolorg: OrganizationFullData, alice, realm, backend
+):
+    s1 = sequester_service_factory(
+        authority=coolorg.sequester_authority, label="Sequester service 1"
+    )
+    s2 = sequester_service_factory(
+        authority=coolorg.sequester_authority, label="Sequester service 2"
+    )
+    for service in (s1, s2):
+        await backend.sequester.create_service(
+            organization_id=coolorg.organization_id, service=service.backend_service
+        )
+
+    vlob_id1 = VlobID.from_hex("00000000000000000000000000000001")
+    vlob_id2 = VlobID.from_hex("00000000000000000000000000000002")
+    for version, timestamp in ((1, DateTime(2000, 1, 3)), (2, DateTime(2000, 1, 4))):
+        await backend.vlob.write_batch(
+            coolorg.organization_id,
+            alice.device_id,
+            realm,
+            1,
+            timestamp,
+            [
+                (
+                    vlob_id,
+                    version,
+                    b"<encrypted with workspace's key>",
+                    {
+                        s1.service_id: f"<{vlob_id.hex} v{version} for s1>".encode(),
+                        s2.service_id: f"<{vlob_id.hex} v{version} for s2>".encode(),
+                    },
+                )
+                for vlob_id in (vlob_id1, vlob_id2)
+            ],
+        )
+
+    for service, label in ((s1, "s1"), (s2, "s2")):
+        dump = await backend.sequester.dump_realm(
+            organization_id=coolorg.organization_id, service_id=service.service_id, realm_id=realm
+        )
+        assert len(dump) == 4
+        assert set(dump) == {
+            (vlob_id, version, f"<{vlob_id.hex} v{version} for {label}>".encode())
+            for vlob_id in (vlob_id1, vlob_id2)
+            for version in (1, 2)
+        }
+
+
+@customize_fixtures(coolorg_is_sequestered_organization=True)
+@pytest.mark.trio
+async def test_webhook_not_called_on_rejected_write_batch(
+    coolorg: OrganizationFullData, alice, realm, backend
+):
+    service = sequester_service_factory(
+        "TestWebhookService",
+        coolorg.sequester_authority,
+        service_type=SequesterServiceType.WEBHOOK,
+        webhook_url="http://somewhere.post",
+    )
+    await backend.sequester.create_service(
+        organization_id=coolorg.organization_id, service=service.backend_service
+    )
+
+    vlob_id1 = VlobID.from_hex("00000000000000000000000000000001")
+    vlob_id2 = VlobID.from_hex("00000000000000000000000000000002")
+    with patch("parsec.backend.http_utils.urllib.request") as mock:
+        # Second item updates an unknown vlob, so the whole batch is rejected...
+        with pytest.raises(VlobNotFoundError):
+            await backend.vlob.write_batch(
+                coolorg.organization_id,
+                alice.device_id,
+                realm,
+                1,
+                DateTime(2000, 1, 3),
+                [
+                    (vlob_id1, 1, b"<blob 1>", {service.service_id: b"<sequester blob 1>"}),
+                    (vlob_id2, 2, b"<blob 2>", {service.service_id: b"<sequester blob 2>"}),
+                ],
+            )
+        # ...before any data is sent to the webhook
+        mock.Request.assert_not_called()
+
+        # Same thing if only a later item is inconsistent with the sequester services
+        with pytest.raises(VlobSequesterServiceInconsistencyError):
+            await backend.vlob.write_batch(
+                coolorg.organization_id,
+                alice.device_id,
+                realm,
+                1,
+                DateTime(2000, 1, 3),
+                [
+                    (vlob_id1, 1, b"<blob 1>", {service.service_id: b"<sequester blob 1>"}),
+                    (vlob_id2, 1, b"<blob 2>", {}),
+                ],
+            )
+        mock.Request.assert_not_called()
+
+
 async def _register_service_and_create_vlob(
     coolorg, backend, alice_ws, realm, vlob_id, blob, sequester_blob, url
 ):
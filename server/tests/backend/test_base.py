@@ -6,7 +6,13 @@ from pathlib import Path
 
 import pytest
 
+from parsec._parsec import authenticated_cmds
 from parsec.api.protocol import packb, unpackb
+from parsec.backend.asgi.ws import (
+    WS_PIPELINED_MAX_CONCURRENT_CMDS,
+    WS_PIPELINED_REQUEST_ID_SIZE,
+)
+from tests.backend.common import authenticated_ping, real_clock_timeout
 
 
 @pytest.mark.trio
@@ -39,6 +45,63 @@ async def test_bad_msg_format(alice_ws, kind):
     assert unpackb(rep) == {"status": "invalid_msg_format", "reason": "Invalid message format"}
 
 
+@pytest.mark.trio
+async def test_pipelined_connection(backend_asgi_app, alice, backend_authenticated_ws_factory):
+    async with backend_authenticated_ws_factory(backend_asgi_app, alice, pipelined=True) as ws:
+        for i in range(1, 4):
+            request_id = i.to_bytes(WS_PIPELINED_REQUEST_ID_SIZE, "big")
+            await ws.send(request_id + packb({"cmd": "ping", "ping": str(i)}))
+        await ws.send(b"\x00" * WS_PIPELINED_REQUEST_ID_SIZE + packb({"cmd": "dummy"}))
+
+        reps = {}
+        for _ in range(4):
+            rep = await ws.receive()
+            request_id = int.from_bytes(rep[:WS_PIPELINED_REQUEST_ID_SIZE], "big")
+            reps[request_id] = unpackb(rep[WS_PIPELINED_REQUEST_ID_SIZE:])
+
+    assert reps == {
+        0: {"status": "invalid_msg_format", "reason": "Invalid message format"},
+        1: {"status": "ok", "pong": "1"},
+        2: {"status": "ok", "pong": "2"},
+        3: {"status": "ok", "pong": "3"},
+    }
+
+
+@pytest.mark.trio
+async def test_pipelined_connection_concurrent_events_listen(
+    backend_asgi_app, alice, alice2_ws, backend_authenticated_ws_factory
+):
+    async with backend_authenticated_ws_factory(backend_asgi_app, alice, pipelined=True) as ws:
+
+        async def _send(request_id: int, raw_req: bytes) -> None:
+            await ws.send(request_id.to_bytes(WS_PIPELINED_REQUEST_ID_SIZE, "big") + raw_req)
+
+        async def _receive() -> tuple[int, dict]:
+            rep = await ws.receive()
+            request_id = int.from_bytes(rep[:WS_PIPELINED_REQUEST_ID_SIZE], "big")
+            return request_id, unpackb(rep[WS_PIPELINED_REQUEST_ID_SIZE:])
+
+        await _send(0, authenticated_cmds.v3.events_subscribe.Req().dump())
+        async with real_clock_timeout():
+            assert await _receive() == (0, {"status": "ok"})
+
+        # Blocking commands don't hold a concurrency slot...
+        listen_ids = range(1, WS_PIPELINED_MAX_CONCURRENT_CMDS + 2)
+        for request_id in listen_ids:
+            await _send(request_id, authenticated_cmds.v3.events_listen.Req(wait=True).dump())
+        await _send(100, packb({"cmd": "ping", "ping": "42"}))
+        async with real_clock_timeout():
+            assert await _receive() == (100, {"status": "ok", "pong": "42"})
+
+        # ...and keep running while other requests are processed
+        for i in listen_ids:
+            await authenticated_ping(alice2_ws, f"event {i}")
+        async with real_clock_timeout():
+            reps = dict([await _receive() for _ in listen_ids])
+        assert reps.keys() == set(listen_ids)
+        assert {rep["status"] for rep in reps.values()} == {"ok"}
+
+
 @pytest.mark.trio
 async def test_all_api_cmds_implemented(backend):
     from parsec import _parsec
@@ -0,0 +1,94 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import pytest
+
+from parsec._parsec import ApiVersion
+from parsec.api.protocol import RealmID
+from parsec.backend.client_context import AuthenticatedClientContext, intern_realm_ids
+from tests.common import bench_allocated, bench_report
+
+
+def _client_ctx(device) -> AuthenticatedClientContext:
+    return AuthenticatedClientContext(
+        api_version=ApiVersion.API_LATEST_VERSION,
+        client_api_version=ApiVersion.API_LATEST_VERSION,
+        organization_id=device.organization_id,
+        device_id=device.device_id,
+        human_handle=device.human_handle,
+        device_label=device.device_label,
+        profile=device.profile,
+        public_key=device.public_key,
+        verify_key=device.verify_key,
+    )
+
+
+def test_authenticated_client_context_lazy_resources(alice):
+    client_ctx = _client_ctx(alice)
+    assert client_ctx._logger is None
+    assert client_ctx._conn_id is None
+    assert client_ctx._send_events_channel is None
+
+    assert client_ctx.logger is client_ctx.logger
+    assert client_ctx.send_events_channel is client_ctx.send_events_channel
+    client_ctx.send_events_channel.send_nowait(("event_id", "event"))
+    assert client_ctx.receive_events_channel.receive_nowait() == ("event_id", "event")
+
+
+def test_authenticated_client_context_shared_identity(alice, alice2, bob):
+    alice_ctx1 = _client_ctx(alice)
+    alice_ctx2 = _client_ctx(alice)
+    alice2_ctx = _client_ctx(alice2)
+    bob_ctx = _client_ctx(bob)
+
+    assert alice_ctx1.identity is alice_ctx2.identity
+    assert alice_ctx1.identity is not alice2_ctx.identity
+    assert alice_ctx1.identity is not bob_ctx.identity
+    assert alice_ctx1.device_id == alice.device_id
+    assert alice_ctx1.human_handle == alice.human_handle
+    assert alice_ctx1.verify_key.encode() == alice.verify_key.encode()
+
+
+def test_intern_realm_ids():
+    realm1 = RealmID.new()
+    realm2 = RealmID.new()
+
+    realms = intern_realm_ids([realm1, realm2])
+    assert realms == {realm1, realm2}
+    assert intern_realm_ids([realm2, realm1]) is realms
+    assert intern_realm_ids(realms - {realm2}) is intern_realm_ids([realm1])
+    assert intern_realm_ids([]) is intern_realm_ids(set())
+
+
+@pytest.mark.slow
+def test_authenticated_client_context_memory_bench(alice):
+    contexts_count = 10000
+    realms = [RealmID.new() for _ in range(10)]
+
+    def _measure(eager: bool) -> float:
+        with bench_allocated() as allocated:
+            contexts = []
+            for _ in range(contexts_count):
+                client_ctx = _client_ctx(alice)
+                if eager:
+                    # Mimic the previous layout: connection ID, bound logger, events
+                    # channel and mutable realms set allocated for each connection
+                    client_ctx.logger
+                    client_ctx.send_events_channel
+                    client_ctx.realms = set(realms)
+                else:
+                    client_ctx.realms = intern_realm_ids(realms)
+                contexts.append(client_ctx)
+        if not eager:
+            # Realms set is shared among all the contexts
+            assert all(client_ctx.realms is contexts[0].realms for client_ctx in contexts)
+        return allocated.value / contexts_count
+
+    eager_size = _measure(eager=True)
+    compact_size = _measure(eager=False)
+    ratio = eager_size / compact_size
+    bench_report(
+        f"{contexts_count} idle client contexts: {compact_size:.0f} bytes per context"
+        f" ({eager_size:.0f} bytes with eager allocation, {ratio:.1f}x)"
+    )
+    assert ratio >= 3
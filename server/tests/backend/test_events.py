@@ -1,20 +1,47 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+import time
+from contextlib import AsyncExitStack
+from uuid import uuid4
+
 import pytest
 import trio
 
-from parsec._parsec import BackendEventPinged
+from parsec._parsec import (
+    ApiVersion,
+    BackendEventPinged,
+    BackendEventRealmRolesUpdated,
+    BackendEventRealmVlobsUpdated,
+)
 from parsec.api.protocol import (
     APIEventPinged,
     EventsListenRepOk,
+    RealmID,
+    RealmRole,
+    VlobID,
 )
 from parsec.backend.asgi import app_factory
+from parsec.backend.client_context import (
+    AUTHENTICATED_CLIENT_CHANNEL_SIZE,
+    AuthenticatedClientContext,
+    intern_realm_ids,
+)
+from parsec.backend.events import (
+    SSE_KEEPALIVE_FRAME,
+    SSEKeepaliveScheduler,
+    internal_to_sse_frame,
+)
 from tests.backend.common import (
     authenticated_ping,
     real_clock_timeout,
 )
-from tests.common import AuthenticatedRpcApiClient
+from tests.common import (
+    AuthenticatedRpcApiClient,
+    bench_allocated,
+    bench_elapsed,
+    bench_report,
+)
 
 # TODO: also test connection is cancelled when the organization gets expired
 
@@ -219,3 +246,202 @@ async def test_sse_events_keepalive(frozen_clock, alice_rpc: AuthenticatedRpcApi
                 await frozen_clock.sleep_with_autojump(31)
                 raw = await sse_con.connection.receive()
                 assert raw == b":keepalive\n\n"
+
+
+@pytest.mark.trio
+async def test_sse_keepalive_scheduler(frozen_clock):
+    scheduler = SSEKeepaliveScheduler(keepalive=30)
+    channels = [trio.open_memory_channel[bytes](1) for _ in range(3)]
+
+    def _received_keepalive(index: int) -> bool:
+        try:
+            payload = channels[index][1].receive_nowait()
+        except trio.WouldBlock:
+            return False
+        assert payload == SSE_KEEPALIVE_FRAME
+        return True
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(scheduler.run)
+
+        scheduler.register(channels[0][0])
+        await frozen_clock.sleep_with_autojump(2)
+        scheduler.register(channels[1][0])
+        await frozen_clock.sleep_with_autojump(10)
+        scheduler.register(channels[2][0])
+        assert scheduler.stats()["connections"] == 3
+
+        # Connections idle at roughly the same time get their keepalive in the same tick
+        await frozen_clock.sleep_with_autojump(19)
+        assert _received_keepalive(0)
+        assert _received_keepalive(1)
+        assert not _received_keepalive(2)
+
+        # Active connection doesn't need keepalive
+        await frozen_clock.sleep_with_autojump(5)
+        scheduler.mark_active(channels[2][0])
+        await frozen_clock.sleep_with_autojump(10)
+        assert not _received_keepalive(2)
+
+        # Keepalive is skipped for busy connection
+        channels[0][0].send_nowait(b"data:busy\n\n")
+        await frozen_clock.sleep_with_autojump(20)
+        assert channels[0][1].receive_nowait() == b"data:busy\n\n"
+        assert not _received_keepalive(0)
+        assert _received_keepalive(1)
+
+        scheduler.unregister(channels[0][0])
+        scheduler.unregister(channels[1][0])
+        scheduler.unregister(channels[2][0])
+        assert scheduler.stats()["connections"] == 0
+
+        nursery.cancel_scope.cancel()
+
+
+@pytest.mark.trio
+async def test_slow_client_events_coalesced(backend, alice, bob):
+    client_ctx = AuthenticatedClientContext(
+        api_version=ApiVersion.API_LATEST_VERSION,
+        client_api_version=ApiVersion.API_LATEST_VERSION,
+        organization_id=alice.organization_id,
+        device_id=alice.device_id,
+        human_handle=alice.human_handle,
+        device_label=alice.device_label,
+        profile=alice.profile,
+        public_key=alice.public_key,
+        verify_key=alice.verify_key,
+    )
+    client_ctx.cancel_scope = trio.CancelScope()
+    realm_id = RealmID.new()
+    overflow_size = 10
+
+    def _send_event(event):
+        backend.event_bus.send(type(event), event_id=uuid4().hex, payload=event)
+
+    with backend.event_bus.connection_context() as client_ctx.event_bus_ctx:
+        await backend.events.connect_events(client_ctx)
+        client_ctx.realms = intern_realm_ids([realm_id])
+
+        # Client doesn't consume its events while a burst occurs...
+        for checkpoint in range(1, AUTHENTICATED_CLIENT_CHANNEL_SIZE + overflow_size + 1):
+            _send_event(
+                BackendEventRealmVlobsUpdated(
+                    organization_id=alice.organization_id,
+                    author=bob.device_id,
+                    realm_id=realm_id,
+                    checkpoint=checkpoint,
+                    src_id=VlobID.new(),
+                    src_version=1,
+                )
+            )
+        for i in range(3):
+            _send_event(
+                BackendEventPinged(
+                    organization_id=alice.organization_id, author=bob.device_id, ping=f"ping{i}"
+                )
+            )
+
+        # ...but it doesn't get disconnected
+        assert not client_ctx.cancel_scope.cancel_called
+
+        received = []
+        while True:
+            try:
+                _, event = backend.events._receive_client_event_nowait(client_ctx)
+            except trio.WouldBlock:
+                break
+            received.append(event)
+
+    # Overflowing events have been coalesced into the latest ones
+    assert [event.checkpoint for event in received[:-1]] == [
+        *range(1, AUTHENTICATED_CLIENT_CHANNEL_SIZE + 1),
+        AUTHENTICATED_CLIENT_CHANNEL_SIZE + overflow_size,
+    ]
+    assert received[-1].ping == "ping2"
+    assert client_ctx.events_overflow is None
+    assert backend.events.events_overflow_stats == {
+        "coalesced": overflow_size - 1,
+        "dropped": 2,
+        "disconnected": 0,
+    }
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_sse_idle_connections_memory_bench(backend, alice_rpc: AuthenticatedRpcApiClient):
+    connections_count = 200
+    async with real_clock_timeout():
+        async with AsyncExitStack() as stack:
+            with bench_allocated() as allocated:
+                for _ in range(connections_count):
+                    await stack.enter_async_context(alice_rpc.connect_sse_events())
+                await trio.testing.wait_all_tasks_blocked()
+
+            stats = backend.events.sse_keepalive_scheduler.stats()
+            assert stats["connections"] == connections_count
+            bench_report(
+                f"{connections_count} idle SSE connections:"
+                f" {allocated.value / connections_count / 1024:.1f}KiB per connection"
+                f" (including {stats['connections_bookkeeping_bytes'] / connections_count:.0f}"
+                " bytes of keepalive bookkeeping)"
+            )
+
+
+@pytest.mark.trio
+async def test_sse_frame_shared_between_clients(backend, alice, bob):
+    event = BackendEventRealmVlobsUpdated(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        realm_id=RealmID.new(),
+        checkpoint=1,
+        src_id=VlobID.new(),
+        src_version=1,
+    )
+    event_id = uuid4().hex
+
+    frame = backend.events.get_sse_frame(event_id, event)
+    assert frame == internal_to_sse_frame(event_id, event)
+    # Frame is only computed once
+    assert backend.events.get_sse_frame(event_id, event) is frame
+
+    # Events not part of the API have no frame
+    ignored_event = BackendEventRealmRolesUpdated(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        realm_id=RealmID.new(),
+        user=bob.user_id,
+        role=RealmRole.READER,
+    )
+    assert backend.events.get_sse_frame(uuid4().hex, ignored_event) is None
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_sse_frame_broadcast_bench(backend, alice):
+    clients_count = 2000
+    event = BackendEventRealmVlobsUpdated(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        realm_id=RealmID.new(),
+        checkpoint=1,
+        src_id=VlobID.new(),
+        src_version=1,
+    )
+
+    event_id = uuid4().hex
+    with bench_elapsed(clock=time.process_time) as per_client_encoding:
+        for _ in range(clients_count):
+            internal_to_sse_frame(event_id, event)
+
+    event_id = uuid4().hex
+    with bench_elapsed(clock=time.process_time) as shared_encoding:
+        shared_frames = [
+            backend.events.get_sse_frame(event_id, event) for _ in range(clients_count)
+        ]
+
+    # Frame is encoded once and then shared by all the clients
+    assert all(frame is shared_frames[0] for frame in shared_frames)
+    bench_report(
+        f"Broadcast to {clients_count} SSE clients: {per_client_encoding.value * 1000:.2f}ms"
+        f" of CPU with per-client encoding, {shared_encoding.value * 1000:.2f}ms with shared frame"
+    )
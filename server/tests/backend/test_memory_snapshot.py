@@ -0,0 +1,119 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from io import BytesIO
+
+import pytest
+
+from parsec._parsec import DateTime, RealmID, RealmRole
+from parsec.backend.memory.snapshot import (
+    MemorySnapshotError,
+    dump_memory_snapshot,
+    load_memory_snapshot,
+)
+
+
+@pytest.mark.trio
+async def test_memory_snapshot_restored_on_startup(tmp_path, backend_factory, alice, bob):
+    snapshot_path = tmp_path / "snapshot.pickle"
+    d1 = DateTime(2000, 1, 1)
+    alice_realm = RealmID.from_entry_id(alice.user_manifest_id)
+
+    async with backend_factory(config={"memory_snapshot_path": snapshot_path}) as backend:
+        if backend.config.db_type != "MOCKED":
+            pytest.skip("Memory backend only")
+        await backend.message.send(
+            bob.organization_id, bob.device_id, alice.user_id, d1, b"Hello from Bob !"
+        )
+        expected_user = await backend.user.get_user(alice.organization_id, alice.user_id)
+        expected_certificates = await backend.user.get_certificates(
+            alice.organization_id, offset=0, redacted=False
+        )
+        assert not snapshot_path.exists()
+
+    # Snapshot is saved on shutdown...
+    assert snapshot_path.exists()
+
+    # ...and restored on startup
+    async with backend_factory(
+        populated=False, config={"memory_snapshot_path": snapshot_path}
+    ) as backend:
+        assert await backend.user.get_user(alice.organization_id, alice.user_id) == expected_user
+        assert (
+            await backend.user.get_certificates(alice.organization_id, offset=0, redacted=False)
+            == expected_certificates
+        )
+        messages = await backend.message.get(alice.organization_id, alice.user_id, offset=0)
+        assert [(sender, timestamp, body) for sender, timestamp, body, _ in messages] == [
+            (bob.device_id, d1, b"Hello from Bob !")
+        ]
+        assert await backend.realm.get_current_roles(alice.organization_id, alice_realm) == {
+            alice.user_id: RealmRole.OWNER
+        }
+
+
+@pytest.mark.trio
+async def test_memory_snapshot_not_saved_on_crash(tmp_path, backend_factory, alice, bob):
+    snapshot_path = tmp_path / "snapshot.pickle"
+
+    async with backend_factory(config={"memory_snapshot_path": snapshot_path}) as backend:
+        if backend.config.db_type != "MOCKED":
+            pytest.skip("Memory backend only")
+    previous_snapshot = snapshot_path.read_bytes()
+
+    with pytest.raises(RuntimeError):
+        async with backend_factory(
+            populated=False, config={"memory_snapshot_path": snapshot_path}
+        ) as backend:
+            await backend.message.send(
+                bob.organization_id, bob.device_id, alice.user_id, DateTime(2000, 1, 1), b"Hello"
+            )
+            raise RuntimeError("D'oh !")
+
+    assert snapshot_path.read_bytes() == previous_snapshot
+
+
+@pytest.mark.trio
+async def test_memory_snapshot_save_error(tmp_path, backend_factory, caplog):
+    snapshot_path = tmp_path / "missing_dir" / "snapshot.pickle"
+
+    # Failing to save the snapshot doesn't break the teardown
+    async with backend_factory(config={"memory_snapshot_path": snapshot_path}) as backend:
+        if backend.config.db_type != "MOCKED":
+            pytest.skip("Memory backend only")
+
+    caplog.assert_occurred_once("[warning  ] Cannot save memory snapshot")
+    assert not snapshot_path.exists()
+
+
+@pytest.mark.trio
+async def test_memory_snapshot_bad_version(backend, monkeypatch):
+    if backend.config.db_type != "MOCKED":
+        pytest.skip("Memory backend only")
+
+    components = {
+        name: getattr(backend, name)
+        for name in (
+            "organization",
+            "user",
+            "invite",
+            "message",
+            "realm",
+            "vlob",
+            "block",
+            "blockstore",
+            "pki",
+            "sequester",
+        )
+    }
+    buff = BytesIO()
+    monkeypatch.setattr("parsec.backend.memory.snapshot.parsec_version", "0.0.0")
+    dump_memory_snapshot(components, buff)
+    monkeypatch.undo()
+
+    buff.seek(0)
+    with pytest.raises(MemorySnapshotError):
+        load_memory_snapshot(components, buff)
+
+    with pytest.raises(MemorySnapshotError):
+        load_memory_snapshot(components, BytesIO(b"<dummy>"))
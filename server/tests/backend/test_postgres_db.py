@@ -11,10 +11,16 @@ import pytest
 import trio
 import triopg
 
-from parsec._parsec import ActiveUsersLimit, DateTime, EntryID
+from parsec._parsec import ActiveUsersLimit, BackendEventPinged, DateTime, EntryID
 from parsec.backend.cli.run import RetryPolicy, _run_backend
 from parsec.backend.config import BackendConfig, PostgreSQLBlockStoreConfig
-from parsec.backend.postgresql.handler import handle_datetime, handle_integer, handle_uuid
+from parsec.backend.postgresql.handler import (
+    PGHandler,
+    _dump_signal,
+    handle_datetime,
+    handle_integer,
+    handle_uuid,
+)
 from tests.common import real_clock_timeout
 
 
@@ -35,6 +41,20 @@ async def test_postgresql_connection_ok(postgresql_url, backend_factory):
         pass
 
 
+def test_postgresql_notification_skip_invalid_event(caplog, event_bus, alice):
+    handler = PGHandler("", min_connections=1, max_connections=1, event_bus=event_bus)
+    event = BackendEventPinged(
+        organization_id=alice.organization_id, author=alice.device_id, ping="foo"
+    )
+
+    with event_bus.listen() as spy:
+        handler._on_notification(None, 42, "app_notification", f"<dummy>;{_dump_signal(event)}")
+
+    # The invalid event doesn't prevent the next ones from being dispatched
+    caplog.assert_occurred_once("[warning  ] Invalid notif received")
+    spy.assert_event_occurred(event)
+
+
 @pytest.mark.trio
 @pytest.mark.postgresql
 async def test_postgresql_notification_listener_terminated(postgresql_url, backend_factory):
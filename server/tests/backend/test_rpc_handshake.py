@@ -1,16 +1,24 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+import gzip
 import logging
 from base64 import b64encode
 from unittest.mock import patch
 
 import pytest
+from quart import Request
 
-from parsec._parsec import ApiVersion, DateTime, DeviceID, anonymous_cmds
+from parsec._parsec import ApiVersion, DateTime, DeviceID, anonymous_cmds, authenticated_cmds
 from parsec.backend import BackendApp
-from parsec.serde import packb
-from tests.common import AnonymousRpcApiClient, AuthenticatedRpcApiClient, LocalDevice
+from parsec.serde import packb, unpackb
+from tests.common import (
+    AnonymousRpcApiClient,
+    AuthenticatedRpcApiClient,
+    LocalDevice,
+    bench_elapsed,
+    bench_report,
+)
 from tests.common.rpc_api import InvitedRpcApiClient
 
 PING_RAW_REQ = packb({"cmd": "ping", "ping": "foo"})
@@ -335,6 +343,25 @@ async def test_handshake(
     await _test_invited_handshake_invitation_invalid_token(invited_rpc)
 
 
+@pytest.mark.trio
+async def test_authenticated_handshake_body_read_after_headers_check(
+    alice_rpc: AuthenticatedRpcApiClient,
+):
+    # Body should not be buffered for requests that are rejected based on their headers
+    with patch.object(Request, "get_data", autospec=True, side_effect=Request.get_data) as spy:
+        for expected_status_code, extra_headers in [
+            (401, {"Author": None}),
+            (415, {"Content-Type": "application/json"}),
+        ]:
+            rep = await alice_rpc.send(PING_RAW_REQ, extra_headers=extra_headers, check_rep=False)
+            assert rep.status_code == expected_status_code
+        spy.assert_not_called()
+
+        rep = await alice_rpc.send(PING_RAW_REQ, check_rep=False)
+        assert rep.status_code == 200
+        spy.assert_called_once()
+
+
 @pytest.mark.trio
 async def test_client_version_in_logs(
     alice_rpc: AuthenticatedRpcApiClient,
@@ -369,3 +396,60 @@ async def test_client_version_in_logs(
             f"Invited client successfully connected (client/server API version: {client_api_version}/{ApiVersion.API_LATEST_VERSION})"
             in caplog.text
         )
+
+
+@pytest.mark.trio
+async def test_rep_compression(alice_rpc: AuthenticatedRpcApiClient):
+    big_ping_raw_req = packb({"cmd": "ping", "ping": "foo" * 1000})
+
+    for accept_encoding in ["gzip", "deflate, gzip;q=0.5", "GZIP"]:
+        rep = await alice_rpc.send(
+            big_ping_raw_req, check_rep=False, extra_headers={"Accept-Encoding": accept_encoding}
+        )
+        assert rep.status_code == 200
+        assert rep.headers["Content-Encoding"] == "gzip"
+        rep_body = await rep.get_data()
+        assert unpackb(gzip.decompress(rep_body)) == {"status": "ok", "pong": "foo" * 1000}
+
+    # Client doesn't accept gzip
+    for accept_encoding in [None, "deflate", "gzip;q=0"]:
+        rep = await alice_rpc.send(
+            big_ping_raw_req, check_rep=False, extra_headers={"Accept-Encoding": accept_encoding}
+        )
+        assert rep.status_code == 200
+        assert "Content-Encoding" not in rep.headers
+        assert unpackb(await rep.get_data()) == {"status": "ok", "pong": "foo" * 1000}
+
+    # Small response are not worth compressing
+    rep = await alice_rpc.send(
+        PING_RAW_REQ, check_rep=False, extra_headers={"Accept-Encoding": "gzip"}
+    )
+    assert rep.status_code == 200
+    assert "Content-Encoding" not in rep.headers
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_rep_compression_bench(
+    alice_rpc: AuthenticatedRpcApiClient, alice, backend_data_binder, local_device_factory
+):
+    users_count = 200
+    for _ in range(users_count):
+        await backend_data_binder.bind_device(local_device_factory(), certifier=alice)
+    raw_req = authenticated_cmds.latest.certificate_get.Req(offset=0).dump()
+
+    rep_bodies = {}
+    for accept_encoding in [None, "gzip"]:
+        with bench_elapsed() as duration:
+            rep = await alice_rpc.send(
+                raw_req, check_rep=False, extra_headers={"Accept-Encoding": accept_encoding}
+            )
+        assert rep.status_code == 200
+        rep_bodies[accept_encoding] = await rep.get_data()
+        bench_report(
+            f"certificate_get with {users_count} users (Accept-Encoding: {accept_encoding}):"
+            f" {len(rep_bodies[accept_encoding]) // 1024}KiB in {duration.value * 1000:.2f}ms"
+        )
+
+    assert gzip.decompress(rep_bodies["gzip"]) == rep_bodies[None]
+    assert len(rep_bodies["gzip"]) < len(rep_bodies[None])
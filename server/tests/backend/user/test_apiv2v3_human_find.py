@@ -9,7 +9,7 @@ from parsec.api.protocol import (
 )
 from parsec.backend.asgi import app_factory
 from tests.backend.common import apiv2v3_human_find
-from tests.common import customize_fixtures, freeze_time
+from tests.common import bench_elapsed, bench_report, customize_fixtures, freeze_time
 
 HumanFindRepNotAllowed = authenticated_cmds.v3.human_find.RepNotAllowed
 HumanFindRep = authenticated_cmds.v3.human_find.Rep
@@ -515,3 +515,121 @@ async def test_no_query_users_with_and_without_human_label(access_testbed, local
         HumanFindResultItem(user_id=mike.user_id, revoked=False, human_handle=None),
         HumanFindResultItem(user_id=easy.user_id, revoked=False, human_handle=None),
     ]
+
+
+@pytest.mark.trio
+async def test_find_estimate_total(backend, alice, bob, adam):
+    all_results, total = await backend.user.find_humans(alice.organization_id, per_page=2)
+    assert total == 3
+
+    # Estimated total only guarantees there is a next page...
+    results, total = await backend.user.find_humans(
+        alice.organization_id, per_page=2, estimate_total=True
+    )
+    assert results == all_results
+    assert total > 2
+    # ...but is exact on the last page
+    _, total = await backend.user.find_humans(
+        alice.organization_id, page=2, per_page=2, estimate_total=True
+    )
+    assert total == 3
+
+    results, total = await backend.user.find_humans(
+        alice.organization_id, query=alice.human_handle.label, estimate_total=True
+    )
+    assert total == 1
+    assert [r.user_id for r in results] == [alice.user_id]
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_find_estimate_total_above_max_counted(backend, alice, bob, adam, monkeypatch):
+    monkeypatch.setattr(
+        "parsec.backend.postgresql.user_queries.find.HUMAN_FIND_MAX_COUNTED_TOTAL", 2
+    )
+    all_results, total = await backend.user.find_humans(alice.organization_id, per_page=1)
+    assert total == 3
+
+    # Counting stops at the max, but still guarantees there is a next page...
+    results, total = await backend.user.find_humans(
+        alice.organization_id, per_page=1, estimate_total=True
+    )
+    assert results == all_results
+    assert total == 2
+    _, total = await backend.user.find_humans(
+        alice.organization_id, page=2, per_page=1, estimate_total=True
+    )
+    assert total == 3
+    # ...and is exact on the last page
+    _, total = await backend.user.find_humans(
+        alice.organization_id, page=3, per_page=1, estimate_total=True
+    )
+    assert total == 3
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+@pytest.mark.parametrize("omit_revoked", [False, True])
+async def test_find_estimate_total_with_query(backend, alice, bob, adam, omit_revoked):
+    # More matches than `per_page`, so the total has to be counted
+    for page, expected_count in ((1, 2), (2, 1), (3, 0)):
+        results, total = await backend.user.find_humans(
+            alice.organization_id,
+            query="@example.com",
+            page=page,
+            per_page=2,
+            omit_revoked=omit_revoked,
+            estimate_total=True,
+        )
+        assert len(results) == expected_count
+        assert total == 3
+
+
+# Showcases the trigram indexes used by the search (hence the `--postgresql`)
+@pytest.mark.slow
+@pytest.mark.postgresql
+@pytest.mark.trio
+@pytest.mark.parametrize("estimate_total", [False, True])
+async def test_find_bench_large_organization(backend, alice, estimate_total):
+    users_count = 100000
+
+    async with backend.user.dbh.pool.acquire() as conn:
+        await conn.execute(
+            """
+WITH org AS (SELECT _id FROM organization WHERE organization_id = $1),
+new_humans AS (
+    INSERT INTO human (organization, email, label)
+    SELECT org._id, 'bench' || i || '@example.com', 'Bench User ' || md5(i::TEXT)
+    FROM org, generate_series(1, $2::INTEGER) AS i
+    RETURNING _id, organization
+)
+INSERT INTO user_ (
+    organization,
+    user_id,
+    user_certificate,
+    created_on,
+    human,
+    redacted_user_certificate,
+    profile
+)
+SELECT organization, 'bench' || _id, '', now(), _id, '', 'STANDARD'
+FROM new_humans
+""",
+            alice.organization_id.str,
+            users_count,
+        )
+        await conn.execute("ANALYZE human; ANALYZE user_")
+
+    for query in (None, "bench", "user 1234", "nomatch"):
+        with bench_elapsed() as elapsed:
+            _, total = await backend.user.find_humans(
+                alice.organization_id, query=query, estimate_total=estimate_total
+            )
+        if query == "nomatch":
+            assert total == 0
+        elif query == "bench" and not estimate_total:
+            assert total == users_count
+        bench_report(
+            f"human_find query={query!r} in {users_count} users: {total} results"
+            f" in {elapsed.value * 1000:.1f}ms"
+        )
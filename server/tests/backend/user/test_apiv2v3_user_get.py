@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import pytest
 
-from parsec._parsec import DateTime, authenticated_cmds
+from parsec._parsec import BackendEventUserUpdatedOrRevoked, DateTime, authenticated_cmds
 from parsec.api.protocol import (
     UserID,
     UserProfile,
@@ -153,6 +153,40 @@ async def test_api_user_get_ok_deep_trustchain(
     }
 
 
+@pytest.mark.trio
+async def test_api_user_get_trustchain_updated_on_revocation(
+    access_testbed, organization_factory, local_device_factory
+):
+    binder, org, godfrey1, sock = access_testbed
+    certificates_store = binder.certificates_store
+
+    roger1 = local_device_factory("roger@dev1", org)
+    mike1 = local_device_factory("mike@dev1", org)
+
+    # <root> --> godfrey@dev1 --> roger@dev1 --> mike@dev1
+    with freeze_time(DateTime(2000, 1, 1)):
+        await binder.bind_device(roger1, certifier=godfrey1)
+        await binder.bind_device(mike1, certifier=roger1)
+
+    rep = await apiv2v3_user_get(sock, mike1.user_id)
+    assert rep.trustchain.revoked_users == []
+
+    # Trustchain may have been cached, it must be refreshed by the revocation
+    with binder.backend.event_bus.listen() as spy:
+        with freeze_time(DateTime(2000, 1, 2)):
+            await binder.bind_revocation(roger1.user_id, certifier=godfrey1)
+        await spy.wait_with_timeout(BackendEventUserUpdatedOrRevoked)
+
+    rep = await apiv2v3_user_get(sock, mike1.user_id)
+    assert certificates_store.translate_certifs(rep.trustchain.revoked_users) == [
+        "<roger revoked user certif>"
+    ]
+    assert certificates_store.translate_certifs(rep.trustchain.users) == [
+        "<Godfrey user certif>",
+        "<roger user certif>",
+    ]
+
+
 @pytest.mark.parametrize("bad_msg", [{"user_id": 42}, {"user_id": None}, {}])
 @pytest.mark.trio
 async def test_api_user_get_bad_msg(alice_ws, bad_msg):
@@ -202,3 +236,24 @@ async def test_dump_users(backend, coolorg, alice, alice2, bob, adam):
             organization_id=coolorg.organization_id, device_id=device.device_id
         )
         assert device == expected_device
+
+
+@pytest.mark.trio
+async def test_iter_users_and_devices(backend, coolorg, alice, alice2, bob, adam):
+    expected_users, expected_devices = await backend.user.dump_users(coolorg.organization_id)
+
+    users = []
+    async for batch in backend.user.iter_users(coolorg.organization_id, batch_size=2):
+        assert 1 <= len(batch) <= 2
+        users += batch
+    assert sorted(users, key=lambda u: u.user_id.str) == sorted(
+        expected_users, key=lambda u: u.user_id.str
+    )
+
+    devices = []
+    async for batch in backend.user.iter_devices(coolorg.organization_id, batch_size=3):
+        assert 1 <= len(batch) <= 3
+        devices += batch
+    assert sorted(devices, key=lambda d: d.device_id.str) == sorted(
+        expected_devices, key=lambda d: d.device_id.str
+    )
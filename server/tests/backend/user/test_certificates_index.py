@@ -0,0 +1,54 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import pytest
+
+from parsec._parsec import DateTime
+from parsec.backend.memory.user import (
+    DEFAULT_CERTIFICATE_PRIORITY,
+    SEQUESTER_AUTHORITY_CERTIFICATE_PRIORITY,
+    USER_CERTIFICATE_PRIORITY,
+    CertificatesIndex,
+)
+
+
+def test_certificates_index_ordering():
+    index = CertificatesIndex()
+    t1 = DateTime(2000, 1, 1)
+    t2 = DateTime(2000, 1, 2)
+
+    # Added in the order the memory backend may see them during bootstrap
+    index.add(t1, USER_CERTIFICATE_PRIORITY, b"user", b"redacted user")
+    index.add(t1, DEFAULT_CERTIFICATE_PRIORITY, b"device", b"redacted device")
+    index.add(t1, SEQUESTER_AUTHORITY_CERTIFICATE_PRIORITY, b"authority")
+    index.add(t2, DEFAULT_CERTIFICATE_PRIORITY, b"realm role 1")
+    index.add(t2, DEFAULT_CERTIFICATE_PRIORITY, b"realm role 2")
+
+    assert index.get(offset=0, redacted=False) == [
+        b"authority",
+        b"user",
+        b"device",
+        b"realm role 1",
+        b"realm role 2",
+    ]
+    assert index.get(offset=1, redacted=True) == [
+        b"redacted user",
+        b"redacted device",
+        b"realm role 1",
+        b"realm role 2",
+    ]
+    assert index.get(offset=5, redacted=False) == []
+    assert len(index) == 5
+
+
+@pytest.mark.trio
+async def test_current_certificate_index_matches_certificates(backend, coolorg):
+    if backend.config.db_type != "MOCKED":
+        pytest.skip("Memory backend only")
+
+    certificates = await backend.user.get_certificates(
+        coolorg.organization_id, offset=0, redacted=False
+    )
+    # 3 users, 4 devices and the 3 user manifest realms' roles
+    assert len(certificates) == 10
+    assert backend.user.get_current_certificate_index(coolorg.organization_id) == 10
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 from .backend import *  # noqa
+from .bench import *  # noqa
 from .binder import *  # noqa
 from .event_bus_spy import *  # noqa
 from .fixtures_customisation import *  # noqa
@@ -0,0 +1,49 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import attr
+
+# Benchmarks are regular tests marked with `@pytest.mark.slow`, their measures are
+# reported with `bench_report` and can be seen with `pytest --runslow -s`
+
+
+@attr.s(slots=True, auto_attribs=True)
+class BenchMeasure:
+    # Seconds for `bench_elapsed`, bytes for `bench_allocated`
+    value: float = 0
+
+
+@contextmanager
+def bench_elapsed(clock: Callable[[], float] = time.perf_counter) -> Iterator[BenchMeasure]:
+    measure = BenchMeasure()
+    start = clock()
+    try:
+        yield measure
+    finally:
+        measure.value = clock() - start
+
+
+@contextmanager
+def bench_allocated(peak: bool = False) -> Iterator[BenchMeasure]:
+    """
+    Measure the memory allocated within the block (i.e. still allocated at the end
+    of it), or the peak memory usage if `peak` is set.
+    """
+    measure = BenchMeasure()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        yield measure
+        after, peak_allocated = tracemalloc.get_traced_memory()
+        measure.value = peak_allocated if peak else after - before
+    finally:
+        tracemalloc.stop()
+
+
+def bench_report(message: str) -> None:
+    print(f"[bench] {message}")
@@ -82,6 +82,7 @@ TRUNCATE TABLE
     vlob_encryption_revision,
     vlob_atom,
     realm_vlob_update,
+    realm_vlob_latest_change,
 
     block,
     block_data